@@ -187,6 +187,12 @@ DJMAIL_TEMPLATE_EXTENSION = "jinja"
 EVENTS_PUSH_BACKEND = "taiga.events.backends.postgresql.EventsPushBackend"
 # EVENTS_PUSH_BACKEND = "taiga.events.backends.rabbitmq.EventsPushBackend"
 # EVENTS_PUSH_BACKEND_OPTIONS = {"url": "//guest:guest@127.0.0.1/"}
+# Change events of a transaction are merged and split in messages of this max size
+# (PostgreSQL NOTIFY payloads must be shorter than 8000 bytes)
+EVENTS_PUSH_MAX_MESSAGE_SIZE = 7900
+# Send the events for several users (live notifications) in one message with the
+# list of recipients, only if the events consumer supports it
+EVENTS_PUSH_MULTICAST = False
 
 # Message System
 MESSAGE_STORAGE = "django.contrib.messages.storage.session.SessionStorage"
@@ -523,6 +529,17 @@ FEEDBACK_EMAIL = "support@taiga.io"
 # Stats module settings
 STATS_ENABLED = False
 STATS_CACHE_TIMEOUT = 60*60  # In second
+TIMELINE_VISIBILITY_CACHE_TIMEOUT = 60*60  # In second
+FILTERS_DATA_CACHE_TIMEOUT = 60*60  # In second
+USER_PERMISSIONS_CACHE_TIMEOUT = 60*60  # In second
+
+# Markdown render cache
+MDRENDER_CACHE_TIMEOUT = 24*60*60  # In second
+MDRENDER_LOCAL_CACHE_SIZE = 500  # Rendered texts cached by every process
+MDRENDER_LOCAL_CACHE_TIMEOUT = 5*60  # In second
+MDRENDER_LOCAL_VERSIONS_TIMEOUT = 10  # In second, how long a process may use outdated render versions
+MDRENDER_PROCESS_POOL_THRESHOLD = 1000  # render_many uses a pool of processes from this number of texts
+MDRENDER_PROCESSES = None  # None == number of cpus
 
 # 0 notifications will work in a synchronous way
 # >0 an external process will check the pending notifications and will send them
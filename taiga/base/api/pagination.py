@@ -31,6 +31,8 @@ from .settings import api_settings
 
 from urllib import parse as urlparse
 
+import base64
+import json
 import warnings
 
 
@@ -46,6 +48,29 @@ def replace_query_param(url, key, val):
     return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
 
 
+def encode_cursor(values:list) -> str:
+    """
+    Encode the sort key values of the last item of a page as an opaque
+    string for keyset (cursor) pagination.
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor:str) -> list:
+    """
+    Decode a cursor made by `encode_cursor`. Raise ValueError for
+    invalid cursors.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
 def strict_positive_int(integer_string, cutoff=None):
     """
     Cast a string to a strictly positive integer.
@@ -17,6 +17,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import re
+from decimal import Decimal
 
 from dateutil.parser import parse as parse_date
 
@@ -27,7 +29,10 @@ from django.utils.translation import ugettext as _
 
 from taiga.base import exceptions as exc
 from taiga.base.api.utils import get_object_or_404
+from taiga.base.utils.db import in_array
 from taiga.base.utils.db import to_tsquery
+from taiga.permissions.services import get_user_projects_ids_with_permission
+from taiga.projects.custom_attributes import choices as custom_attributes_choices
 
 logger = logging.getLogger(__name__)
 
@@ -38,18 +43,11 @@ def get_filter_expression_can_view_projects(user, project_id=None):
         return Q()
     elif user.is_authenticated():
         # authenticated user & project member
-        membership_model = apps.get_model("projects", "Membership")
-        memberships_qs = membership_model.objects.filter(user=user)
+        projects_list = get_user_projects_ids_with_permission(user, "view_project")
         if project_id:
-            memberships_qs = memberships_qs.filter(project_id=project_id)
-        memberships_qs = memberships_qs.filter(
-            Q(role__permissions__contains=['view_project']) |
-            Q(is_admin=True))
-
-        projects_list = [membership.project_id for membership in
-                         memberships_qs]
+            projects_list = [id for id in projects_list if id == project_id]
 
-        return (Q(id__in=projects_list) |
+        return (Q(id__in=in_array(projects_list)) |
                 Q(public_permissions__contains=["view_project"]))
     else:
         # external users / anonymous
@@ -175,16 +173,11 @@ class PermissionBasedFilterBackend(FilterBackend):
         if request.user.is_authenticated() and request.user.is_superuser:
             qs = qs
         elif request.user.is_authenticated():
-            membership_model = apps.get_model('projects', 'Membership')
-            memberships_qs = membership_model.objects.filter(user=request.user)
+            projects_list = get_user_projects_ids_with_permission(request.user, self.permission)
             if project_id:
-                memberships_qs = memberships_qs.filter(project_id=project_id)
-            memberships_qs = memberships_qs.filter(Q(role__permissions__contains=[self.permission]) |
-                                                   Q(is_admin=True))
+                projects_list = [id for id in projects_list if id == project_id]
 
-            projects_list = [membership.project_id for membership in memberships_qs]
-
-            qs = qs.filter(Q(project_id__in=projects_list) |
+            qs = qs.filter(Q(project_id__in=in_array(projects_list)) |
                            Q(project__public_permissions__contains=[self.permission]))
         else:
             qs = qs.filter(project__anon_permissions__contains=[self.permission])
@@ -284,14 +277,9 @@ class MembersFilterBackend(PermissionBasedFilterBackend):
         if request.user.is_authenticated() and request.user.is_superuser:
             qs = qs
         elif request.user.is_authenticated():
-            Membership = apps.get_model('projects', 'Membership')
-            memberships_qs = Membership.objects.filter(user=request.user)
+            projects_list = get_user_projects_ids_with_permission(request.user, self.permission)
             if project_id:
-                memberships_qs = memberships_qs.filter(project_id=project_id)
-            memberships_qs = memberships_qs.filter(Q(role__permissions__contains=[self.permission]) |
-                                                   Q(is_admin=True))
-
-            projects_list = [membership.project_id for membership in memberships_qs]
+                projects_list = [id for id in projects_list if id == project_id]
 
             if project:
                 is_member = project.id in projects_list
@@ -299,7 +287,7 @@ class MembersFilterBackend(PermissionBasedFilterBackend):
                 if not is_member and not has_project_public_view_permission:
                     qs = qs.none()
 
-            q = Q(memberships__project_id__in=projects_list) | Q(id=request.user.id)
+            q = Q(memberships__project_id__in=in_array(projects_list)) | Q(id=request.user.id)
 
             # If there is no selected project we want access to users from public projects
             if not project:
@@ -606,6 +594,80 @@ class MilestoneEstimatedFinishFilter(BaseDateFilter):
     filter_name_base = "milestone__estimated_finish"
 
 
+#####################################################################
+# Custom attributes filters
+#####################################################################
+
+class CustomAttributesFilter(FilterBackend):
+    """
+    Filter the items by the values of their custom attributes:
+
+      - `custom_attribute_<id>=<value>`: the value is exactly <value>.
+      - `custom_attribute_<id>__contains=<text>`: the value contains <text> (case insensitive).
+      - `custom_attribute_<id>__<lt|lte|gt|gte>=<value>`: the values of the date attributes
+        are compared as dates and the rest as numbers.
+    """
+    param_regex = re.compile(r"^custom_attribute_(\d+)(?:__(contains|lt|lte|gt|gte))?$")
+    operators = {"lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+    date_regex = r"^\d{4}-\d{2}-\d{2}"
+    number_regex = r"^\s*-?\d+(\.\d+)?\s*$"
+
+    def _get_constraints(self, params):
+        constraints = []
+        for param_name, raw_value in params.items():
+            match = self.param_regex.match(param_name)
+            if match and raw_value:
+                constraints.append((int(match.group(1)), match.group(2), raw_value))
+        return constraints
+
+    def _get_custom_attributes_types(self, model, constraints):
+        # UserStory -> UserStoryCustomAttribute, Task -> TaskCustomAttribute...
+        CustomAttribute = apps.get_model("custom_attributes", "{}CustomAttribute".format(model.__name__))
+        ids = set(id for id, operator, raw_value in constraints)
+        types = dict(CustomAttribute.objects.filter(id__in=ids).values_list("id", "type"))
+        if len(types) != len(ids):
+            raise exc.BadRequest(_("Error in filter params types."))
+        return types
+
+    def _filter_values(self, queryset, key, type, operator, raw_value):
+        if operator is None:
+            return queryset.filter(attributes_values__contains={key: raw_value})
+
+        value_sql = '("{}"."attributes_values" ->> %s)'.format(queryset.model._meta.db_table)
+        if operator == "contains":
+            pattern = re.sub(r"([\\%_])", r"\\\1", raw_value)
+            where = "{} ILIKE %s".format(value_sql)
+            return queryset.extra(where=[where], params=[key, "%{}%".format(pattern)])
+
+        if type == custom_attributes_choices.DATE_TYPE:
+            where = "{value} ~ %s AND LEFT({value}, 10) {operator} %s"
+            params = [key, self.date_regex, key, parse_date(raw_value).date().isoformat()]
+        else:
+            where = "CASE WHEN {value} ~ %s THEN {value}::numeric END {operator} %s"
+            params = [key, self.number_regex, key, Decimal(raw_value)]
+
+        where = where.format(value=value_sql, operator=self.operators[operator])
+        return queryset.extra(where=[where], params=params)
+
+    def filter_queryset(self, request, queryset, view):
+        constraints = self._get_constraints(request.QUERY_PARAMS)
+        if constraints:
+            types = self._get_custom_attributes_types(queryset.model, constraints)
+            relation = queryset.model._meta.get_field("custom_attributes_values")
+
+            values_queryset = relation.related_model.objects.order_by()
+            try:
+                for id, operator, raw_value in constraints:
+                    values_queryset = self._filter_values(values_queryset, str(id), types[id],
+                                                          operator, raw_value)
+            except (ValueError, OverflowError, ArithmeticError):
+                raise exc.BadRequest(_("Error in filter params types."))
+
+            queryset = queryset.filter(id__in=values_queryset.values(relation.field.attname))
+
+        return super().filter_queryset(request, queryset, view)
+
+
 #####################################################################
 # Text search filters
 #####################################################################
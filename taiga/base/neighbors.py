@@ -17,16 +17,22 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import operator
 from collections import namedtuple
+from functools import reduce
 
 from django.db import connection
-from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from django.db.models.sql.datastructures import EmptyResultSet
 from taiga.base.api import serializers
 from taiga.base.fields import Field, MethodField
 
 Neighbor = namedtuple("Neighbor", "left right")
 
+NEIGHBOR_FIELDS = ("id", "ref", "subject")
+
 
 def get_neighbors(obj, results_set=None):
     """Get the neighbors of a model instance.
@@ -45,14 +51,173 @@ def get_neighbors(obj, results_set=None):
     # Neighbors calculation is at least at project level
     results_set = results_set.filter(project_id=obj.project.id)
 
-    compiler = results_set.query.get_compiler('default')
     try:
-        base_sql, base_params = compiler.as_sql(with_col_aliases=True)
+        results_set.query.sql_with_params()
     except EmptyResultSet:
         # Generate a not empty queryset
         results_set = type(obj).objects.get_queryset().filter(project_id=obj.project.id)
-        compiler = results_set.query.get_compiler('default')
-        base_sql, base_params = compiler.as_sql(with_col_aliases=True)
+
+    keys = _get_ordering_keys(results_set)
+    if keys is None:
+        return _get_neighbors_by_position(obj, results_set)
+
+    return _get_neighbors_by_keyset(obj, results_set, keys)
+
+
+#####################################################
+# Keyset neighbors
+#####################################################
+
+def _resolve_ordering_name(opts, name, descending, already_seen=None):
+    """
+    Translate an ordering name to a list of `(field path, descending)` keys, expanding the
+    relations to the default ordering of the related model like Django does. Return None if
+    the ordering can't be used in a keyset filter.
+    """
+    pieces = name.split(LOOKUP_SEP)
+    field = None
+    path_opts = opts
+    for i, piece in enumerate(pieces):
+        if field is not None:
+            path_opts = field.related_model._meta
+        if piece == "pk":
+            piece = pieces[i] = path_opts.pk.name
+
+        try:
+            field = path_opts.get_field(piece)
+        except FieldDoesNotExist:
+            return None
+
+        if not field.concrete or field.many_to_many:
+            return None
+        if not field.is_relation and i < len(pieces) - 1:
+            return None
+
+    related_opts = field.related_model._meta if field.is_relation else None
+    if related_opts is None or not related_opts.ordering or field.attname == pieces[-1]:
+        return [(LOOKUP_SEP.join(pieces), descending)]
+
+    already_seen = already_seen or set()
+    if (path_opts.label, field.name) in already_seen:
+        return None
+    already_seen.add((path_opts.label, field.name))
+
+    keys = []
+    for item in related_opts.ordering:
+        if not isinstance(item, str) or item == "?":
+            return None
+        if item.lstrip("-") == "project":
+            # Statuses, priorities... belong to the project of the item
+            continue
+        related_keys = _resolve_ordering_name(related_opts, item.lstrip("-"),
+                                              descending != item.startswith("-"), already_seen)
+        if related_keys is None:
+            return None
+        keys += [(LOOKUP_SEP.join([name, path]), desc) for path, desc in related_keys]
+    return keys
+
+
+def _get_ordering_keys(results_set):
+    query = results_set.query
+    if query.extra_order_by:
+        return None
+
+    if query.order_by:
+        ordering = query.order_by
+    elif query.default_ordering:
+        ordering = results_set.model._meta.ordering
+    else:
+        ordering = []
+
+    keys = []
+    for item in ordering:
+        if not isinstance(item, str) or item == "?":
+            return None
+
+        name = item.lstrip("-")
+        if name in query.extra_select or name in query.annotations:
+            return None
+
+        # All the neighbors are in the same project
+        if name == "project" or name.startswith("project" + LOOKUP_SEP):
+            continue
+
+        item_keys = _resolve_ordering_name(results_set.model._meta, name, item.startswith("-"))
+        if item_keys is None:
+            return None
+        keys += [key for key in item_keys if key not in keys]
+
+    # The id breaks the ties, so every item has only one left and one right neighbor
+    if not any(path in ("id", "pk") for path, descending in keys):
+        keys.append(("id", False))
+
+    return keys
+
+
+def _get_keyset_filter(keys, values, forward):
+    """
+    Build the filter of the items placed after (`forward`) or before the item with the
+    `values` of the ordering `keys`. PostgreSQL sorts NULL values as the largest ones.
+    """
+    conditions = []
+    equal = Q()
+    for (path, descending), value in zip(keys, values):
+        if forward != descending:
+            if value is None:
+                step = None
+            else:
+                step = Q(**{path + "__gt": value}) | Q(**{path + "__isnull": True})
+        else:
+            if value is None:
+                step = Q(**{path + "__isnull": False})
+            else:
+                step = Q(**{path + "__lt": value})
+
+        if step is not None:
+            conditions.append(equal & step)
+
+        if value is None:
+            equal &= Q(**{path + "__isnull": True})
+        else:
+            equal &= Q(**{path: value})
+
+    if not conditions:
+        return None
+    return reduce(operator.or_, conditions)
+
+
+def _get_keyset_neighbor(results_set, keys, values, forward):
+    keyset_filter = _get_keyset_filter(keys, values, forward)
+    if keyset_filter is None:
+        return None
+
+    ordering = ["-" + path if descending == forward else path for path, descending in keys]
+    row = results_set.filter(keyset_filter).order_by(*ordering).values_list(*NEIGHBOR_FIELDS).first()
+    if row is None:
+        return None
+
+    return results_set.model.from_db(results_set.db, NEIGHBOR_FIELDS, row)
+
+
+def _get_neighbors_by_keyset(obj, results_set, keys):
+    paths = [path for path, descending in keys]
+    values = results_set.filter(id=obj.id).order_by().values_list(*paths).first()
+    if values is None:
+        return Neighbor(None, None)
+
+    left = _get_keyset_neighbor(results_set, keys, values, forward=False)
+    right = _get_keyset_neighbor(results_set, keys, values, forward=True)
+    return Neighbor(left, right)
+
+
+#####################################################
+# Positional neighbors
+#####################################################
+
+def _get_neighbors_by_position(obj, results_set):
+    # Used for orderings that are not model fields (extra selects, expressions...)
+    compiler = results_set.query.get_compiler('default')
+    base_sql, base_params = compiler.as_sql(with_col_aliases=True)
 
     query = """
         SELECT * FROM
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import uuid
+
+from django.core.cache import cache
+
+
+def make_version():
+    return uuid.uuid4().hex[:12]
+
+
+def bump_version(key):
+    """
+    Store a new version in `key`, invalidating the cached values whose keys
+    include the previous one.
+    """
+    cache.set(key, make_version(), timeout=None)
+
+
+def get_version(key):
+    """
+    Get the version stored in `key`, creating it if it doesn't exist yet.
+    When two processes create it at the same time both get the one added
+    first.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = make_version()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key) or version
+    return version
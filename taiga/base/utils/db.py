@@ -20,6 +20,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import connection
 from django.db import DatabaseError
 from django.db import transaction
+from django.db.models.expressions import RawSQL
 from django.shortcuts import _get_queryset
 
 from . import functions
@@ -166,6 +167,15 @@ def update_attr_in_bulk_for_ids(values, attr, model):
     transaction.on_commit(_run_sql)
 
 
+def in_array(values, db_type="integer"):
+    """
+    Return an expression to use as value of `__in` lookups that sends all
+    the values as only one array parameter instead of one parameter by
+    value, so the queries stay small for long lists of ids.
+    """
+    return RawSQL("SELECT unnest(%s::{}[])".format(db_type), [list(values)])
+
+
 def to_tsquery(term):
     """
     Based on: https://gist.github.com/wolever/1a5ccf6396f00229b2dc
@@ -19,12 +19,58 @@ import importlib
 from django.core.exceptions import ImproperlyConfigured
 from django.conf import settings
 
+from taiga.base.utils import json
+
 
 class BaseEventsPushBackend(object, metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
         pass
 
+    def emit_multicast_event(self, data:dict, *, routing_key:str, recipients:list, channel:str="events"):
+        """
+        Send the same event to several recipients.
+        """
+        for recipient_routing_key, message in get_multicast_messages(data, routing_key=routing_key,
+                                                                     recipients=recipients):
+            self.emit_event(message, routing_key=recipient_routing_key, channel=channel)
+
+
+def get_multicast_messages(data:dict, *, routing_key:str, recipients:list) -> list:
+    """
+    Get the (routing key, message) pairs to send an event to several
+    recipients.
+
+    If the events consumer supports it (EVENTS_PUSH_MULTICAST setting) the
+    event is sent once to "<routing_key>.multicast" with the list of
+    recipients (split to fit in EVENTS_PUSH_MAX_MESSAGE_SIZE). Otherwise it
+    is sent to "<routing_key>.<recipient>" for every recipient, serialized
+    only once.
+    """
+    if not getattr(settings, "EVENTS_PUSH_MULTICAST", False):
+        message = json.dumps(data)
+        return [("{}.{}".format(routing_key, recipient), message) for recipient in recipients]
+
+    max_size = getattr(settings, "EVENTS_PUSH_MAX_MESSAGE_SIZE", 7900)
+    base_size = len(json.dumps(dict(data, recipients=[])))
+    multicast_routing_key = "{}.multicast".format(routing_key)
+
+    messages = []
+    chunk = []
+    size = base_size
+    for recipient in recipients:
+        recipient_size = len(json.dumps(recipient)) + 2
+        if chunk and size + recipient_size > max_size:
+            messages.append((multicast_routing_key, json.dumps(dict(data, recipients=chunk))))
+            chunk = []
+            size = base_size
+        chunk.append(recipient)
+        size += recipient_size
+
+    if chunk:
+        messages.append((multicast_routing_key, json.dumps(dict(data, recipients=chunk))))
+    return messages
+
 
 def load_class(path):
     """
@@ -22,10 +22,18 @@ from . import base
 class EventsPushBackend(base.BaseEventsPushBackend):
     @transaction.atomic
     def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
-        routing_key = routing_key.replace(".", "__")
-        channel = "{channel}_{routing_key}".format(channel=channel,
-                                                   routing_key=routing_key)
-        sql = "NOTIFY {channel}, %s".format(channel=channel)
+        self._notify([(routing_key, message)], channel=channel)
+
+    @transaction.atomic
+    def emit_multicast_event(self, data:dict, *, routing_key:str, recipients:list, channel:str="events"):
+        messages = base.get_multicast_messages(data, routing_key=routing_key, recipients=recipients)
+        self._notify(messages, channel=channel)
+
+    def _notify(self, messages:list, *, channel:str):
         cursor = connection.cursor()
-        cursor.execute(sql, [message])
+        for routing_key, message in messages:
+            routing_key = routing_key.replace(".", "__")
+            sql = "NOTIFY {channel}_{routing_key}, %s".format(channel=channel,
+                                                              routing_key=routing_key)
+            cursor.execute(sql, [message])
         cursor.close()
@@ -13,8 +13,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import json
 import logging
+import os
+import queue
+import threading
+import time
 
 from amqp import Connection as AmqpConnection
 from amqp.exceptions import AccessRefused
@@ -26,7 +29,7 @@ from . import base
 log = logging.getLogger("tagia.events")
 
 
-def _make_rabbitmq_connection(url):
+def _make_rabbitmq_connection(url, **kwargs):
     parse_result = urlparse(url)
 
     # Parse host & user/password
@@ -42,17 +45,198 @@ def _make_rabbitmq_connection(url):
 
     vhost = parse_result.path
     return AmqpConnection(host=host, userid=user,
-                          password=password, virtual_host=vhost[1:])
+                          password=password, virtual_host=vhost[1:], **kwargs)
+
+
+class ReconnectBackoffError(ConnectionError):
+    pass
+
+
+class _PooledChannel(object):
+    """
+    An open amqp connection with the channel used to publish on it.
+    """
+
+    def __init__(self, connection, channel):
+        self.connection = connection
+        self.channel = channel
+
+    def close(self):
+        try:
+            self.channel.close()
+        except Exception:
+            pass
+
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class AmqpPublisher(object):
+    """
+    Long-lived publisher shared by every events backend of the current
+    process for the same url.
+
+    It keeps a small pool of open connections (one channel each, because
+    amqp channels are not thread safe), remembers the exchanges already
+    declared, publishes with confirms and reconnects transparently. When the
+    broker is unreachable it waits an exponentially growing delay before
+    trying to connect again, dropping the events meanwhile instead of
+    blocking the requests that emit them.
+    """
+
+    def __init__(self, url, *, pool_size:int=4, confirm_publish:bool=True,
+                 max_retries:int=1, min_backoff:float=0.5, max_backoff:float=30.0,
+                 connection_factory=None):
+        self.url = url
+        self.pool_size = pool_size
+        self.confirm_publish = confirm_publish
+        self.max_retries = max_retries
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connection_factory = connection_factory or _make_rabbitmq_connection
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._declared_exchanges = set()
+        self._backoff = 0
+        self._next_connect_at = 0
+
+    def _check_pid(self):
+        # Connections opened before a fork (gunicorn/celery prefork) can not
+        # be shared with the child processes.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._next_connect_at:
+            raise ReconnectBackoffError("Waiting {:.2f}s before reconnecting to {}".format(
+                                  self._next_connect_at - now, self.url))
+
+        connection = self.connection_factory(self.url, confirm_publish=self.confirm_publish)
+        try:
+            connection.connect()
+            channel = connection.channel()
+        except Exception:
+            with self._lock:
+                self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+                self._next_connect_at = time.monotonic() + self._backoff
+            try:
+                connection.close()
+            except Exception:
+                pass
+            raise
+
+        with self._lock:
+            self._backoff = 0
+            self._next_connect_at = 0
+        return _PooledChannel(connection, channel)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _release(self, pooled):
+        try:
+            self._pool.put_nowait(pooled)
+        except queue.Full:
+            pooled.close()
+
+    def _discard(self, pooled):
+        pooled.close()
+
+        # A broken channel can mean an auto deleted exchange, so they will
+        # be declared again.
+        with self._lock:
+            self._declared_exchanges.clear()
+
+    def _declare_exchange(self, pooled, exchange:str):
+        if exchange in self._declared_exchanges:
+            return
+
+        pooled.channel.exchange_declare(exchange=exchange, type="topic", auto_delete=True)
+        with self._lock:
+            self._declared_exchanges.add(exchange)
+
+    def publish(self, message:str, *, routing_key:str, exchange:str):
+        self.publish_many([(routing_key, message)], exchange=exchange)
+
+    def publish_many(self, messages:list, *, exchange:str):
+        """
+        Publish a list of (routing key, message) pairs with the same channel.
+        """
+        self._check_pid()
+
+        published = 0
+        for attempt in range(self.max_retries + 1):
+            pooled = self._acquire()
+            try:
+                self._declare_exchange(pooled, exchange)
+                for routing_key, message in messages[published:]:
+                    pooled.channel.basic_publish(AmqpMessage(message), routing_key=routing_key, exchange=exchange)
+                    published += 1
+            except Exception:
+                self._discard(pooled)
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self._release(pooled)
+                return
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+def get_publisher(url:str, **options) -> AmqpPublisher:
+    """
+    Get the process wide publisher for an url, creating it the first time.
+    """
+    key = (url, tuple(sorted(options.items())))
+    publisher = _publishers.get(key, None)
+    if publisher is None:
+        with _publishers_lock:
+            publisher = _publishers.get(key, None)
+            if publisher is None:
+                publisher = AmqpPublisher(url, **options)
+                _publishers[key] = publisher
+    return publisher
 
 
 class EventsPushBackend(base.BaseEventsPushBackend):
-    def __init__(self, url):
+    def __init__(self, url, **options):
         self.url = url
+        self.publisher = get_publisher(url, **options)
 
     def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
-        connection = _make_rabbitmq_connection(self.url)
+        self._publish([(routing_key, message)], channel=channel)
+
+    def emit_multicast_event(self, data:dict, *, routing_key:str, recipients:list, channel:str="events"):
+        messages = base.get_multicast_messages(data, routing_key=routing_key, recipients=recipients)
+        self._publish(messages, channel=channel)
+
+    def _publish(self, messages:list, *, channel:str):
         try:
-            connection.connect()
+            self.publisher.publish_many(messages, exchange=channel)
+        except ReconnectBackoffError as e:
+            log.warning("EventsPushBackend: Event discarded, %s", e)
         except ConnectionRefusedError:
             err_msg = "EventsPushBackend: Unable to connect with RabbitMQ (connection refused) at {}".format(
                                                                                                      self.url)
@@ -61,15 +245,5 @@ class EventsPushBackend(base.BaseEventsPushBackend):
             err_msg = "EventsPushBackend: Unable to connect with RabbitMQ (access refused) at {}".format(
                                                                                                  self.url)
             log.error(err_msg, exc_info=True)
-        else:
-            try:
-                message = AmqpMessage(message)
-                rchannel = connection.channel()
-
-                rchannel.exchange_declare(exchange=channel, type="topic", auto_delete=True)
-                rchannel.basic_publish(message, routing_key=routing_key, exchange=channel)
-                rchannel.close()
-            except Exception:
-                log.error("EventsPushBackend: Unhandled exception", exc_info=True)
-            finally:
-                connection.close()
+        except Exception:
+            log.error("EventsPushBackend: Unhandled exception", exc_info=True)
@@ -19,6 +19,7 @@
 
 import collections
 
+from django.conf import settings
 from django.db import connection
 from django.utils.translation import ugettext_lazy as _
 
@@ -61,6 +62,126 @@ def emit_event(data:dict, routing_key:str, *,
         backend_emit_event()
 
 
+def emit_multicast_event(data:dict, routing_key:str, recipients:list, *,
+                         sessionid:str=None, channel:str="events", on_commit:bool=True):
+    """
+    Sends the same event to several recipients (routed to
+    "<routing_key>.<recipient>") with a single backend call.
+    """
+    if not recipients:
+        return
+
+    if not sessionid:
+        sessionid = mw.get_current_session_id()
+
+    data = {"session_id": sessionid,
+            "data": data}
+
+    backend = backends.get_events_backend()
+
+    def backend_emit_multicast_event():
+        backend.emit_multicast_event(data, routing_key=routing_key, recipients=list(recipients),
+                                     channel=channel)
+
+    if on_commit:
+        connection.on_commit(backend_emit_multicast_event)
+    else:
+        backend_emit_multicast_event()
+
+
+class _ChangeEventsBuffer(object):
+    """
+    Change events emitted inside the same transaction (or savepoint), merged
+    by routing key and type into one message with the list of pks and sent
+    once on commit.
+    """
+
+    def __init__(self):
+        self.events = collections.OrderedDict()
+
+    def add(self, data:dict, routing_key:str, *, channel:str, sessionid:str, many:bool):
+        key = (channel, routing_key, sessionid, data["type"], data["matches"])
+        if key not in self.events:
+            self.events[key] = {"pks": collections.OrderedDict(), "many": many}
+
+        event = self.events[key]
+        event["many"] = event["many"] or many
+        for pk in (data["pk"] if many else [data["pk"]]):
+            event["pks"][pk] = None
+
+    def flush(self):
+        # The transaction is committed, the remaining buffers are either
+        # being flushed too or belong to rolled back savepoints.
+        _get_buffers().clear()
+
+        for (channel, routing_key, sessionid, type, matches), event in self.events.items():
+            pks = list(event["pks"])
+            if len(pks) == 1 and not event["many"]:
+                chunks = [pks[0]]
+            else:
+                chunks = _split_pks({"type": type, "matches": matches}, pks, sessionid)
+
+            for chunk in chunks:
+                emit_event({"type": type, "matches": matches, "pk": chunk}, routing_key,
+                           channel=channel, sessionid=sessionid, on_commit=False)
+
+
+def _split_pks(data:dict, pks:list, sessionid:str) -> list:
+    """
+    Split the list of pks in chunks so every message fits in the
+    backend payload limit (PostgreSQL NOTIFY payloads must be
+    shorter than 8000 bytes).
+    """
+    max_size = getattr(settings, "EVENTS_PUSH_MAX_MESSAGE_SIZE", 7900)
+    base_size = len(json.dumps({"session_id": sessionid, "data": dict(data, pk=[])}))
+
+    chunks = []
+    chunk = []
+    size = base_size
+    for pk in pks:
+        pk_size = len(json.dumps(pk)) + 2
+        if chunk and size + pk_size > max_size:
+            chunks.append(chunk)
+            chunk = []
+            size = base_size
+        chunk.append(pk)
+        size += pk_size
+
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _get_buffers() -> dict:
+    if not hasattr(connection, "_taiga_events_buffers"):
+        connection._taiga_events_buffers = {}
+    return connection._taiga_events_buffers
+
+
+def _emit_change_event(data:dict, routing_key:str, *, channel:str, sessionid:str, many:bool):
+    if not sessionid:
+        sessionid = mw.get_current_session_id()
+
+    if not connection.in_atomic_block:
+        buffer = _ChangeEventsBuffer()
+        buffer.add(data, routing_key, channel=channel, sessionid=sessionid, many=many)
+        buffer.flush()
+        return
+
+    # One buffer per savepoint, so a rolled back savepoint discards its own
+    # events. A buffer whose flush callback is no longer registered belongs
+    # to a rolled back transaction.
+    key = tuple(connection.savepoint_ids)
+    buffers = _get_buffers()
+    buffer = buffers.get(key, None)
+    if buffer is None or not any(func == buffer.flush for sids, func in connection.run_on_commit):
+        buffer = _ChangeEventsBuffer()
+        buffers[key] = buffer
+        connection.on_commit(buffer.flush)
+
+    buffer.add(data, routing_key, channel=channel, sessionid=sessionid, many=many)
+
+
 def emit_event_for_model(obj, *, type:str="change", channel:str="events",
                          content_type:str=None, sessionid:str=None):
     """
@@ -86,20 +207,13 @@ def emit_event_for_model(obj, *, type:str="change", channel:str="events",
             "matches": content_type,
             "pk": pk}
 
-    return emit_event(routing_key=routing_key,
-                      channel=channel,
-                      sessionid=sessionid,
-                      data=data)
-
-def emit_live_notification_for_model(obj, user, history, *, type:str="change", channel:str="events",
-                                     sessionid:str="not-existing"):
-    """
-    Sends a model live notification to users.
-    """
-
-    if obj._importing:
-        return None
+    return _emit_change_event(routing_key=routing_key,
+                              channel=channel,
+                              sessionid=sessionid,
+                              data=data,
+                              many=False)
 
+def _make_live_notification_data(obj, history) -> dict:
     content_type = get_typename_for_model_instance(obj)
     if content_type == "userstories.userstory":
         if history.type == HistoryType.create:
@@ -159,17 +273,47 @@ def emit_live_notification_for_model(obj, user, history, *, type:str="change", c
     else:
         return None
 
-    return emit_event(
-        {
-            "title": title,
-            "body": "Project: {}\n{}".format(obj.project.name, body),
-            "url": url,
-            "timeout": 10000,
-            "id": history.id
-        },
-        "live_notifications.{}".format(user.id),
-        sessionid=sessionid
-    )
+    return {
+        "title": title,
+        "body": "Project: {}\n{}".format(obj.project.name, body),
+        "url": url,
+        "timeout": 10000,
+        "id": history.id
+    }
+
+
+def emit_live_notification_for_model(obj, user, history, *, type:str="change", channel:str="events",
+                                     sessionid:str="not-existing"):
+    """
+    Sends a model live notification to users.
+    """
+
+    if obj._importing:
+        return None
+
+    data = _make_live_notification_data(obj, history)
+    if data is None:
+        return None
+
+    return emit_event(data, "live_notifications.{}".format(user.id), sessionid=sessionid)
+
+
+def emit_live_notifications_for_model(obj, users, history, *, type:str="change", channel:str="events",
+                                      sessionid:str="not-existing"):
+    """
+    Sends a model live notification to several users with one message
+    (see emit_multicast_event).
+    """
+
+    if obj._importing:
+        return None
+
+    data = _make_live_notification_data(obj, history)
+    if data is None:
+        return None
+
+    return emit_multicast_event(data, "live_notifications", [user.id for user in users],
+                                sessionid=sessionid)
 
 def emit_event_for_ids(ids, content_type:str, projectid:int, *,
                        type:str="change", channel:str="events", sessionid:str=None):
@@ -182,9 +326,10 @@ def emit_event_for_ids(ids, content_type:str, projectid:int, *,
 
     data = {"type": type,
             "matches": content_type,
-            "pk": ids}
+            "pk": list(ids)}
 
-    return emit_event(routing_key=routing_key,
-                      channel=channel,
-                      sessionid=sessionid,
-                      data=data)
+    return _emit_change_event(routing_key=routing_key,
+                              channel=channel,
+                              sessionid=sessionid,
+                              data=data,
+                              many=True)
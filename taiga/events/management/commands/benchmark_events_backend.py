@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from taiga.events.backends.rabbitmq import AmqpPublisher
+
+
+class _StandInChannel(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def exchange_declare(self, **kwargs):
+        self.connection.round_trip()
+
+    def basic_publish(self, message, **kwargs):
+        self.connection.published += 1
+        if self.connection.confirm_publish:
+            self.connection.round_trip()
+
+    def close(self):
+        self.connection.round_trip()
+
+
+class StandInAmqpConnection(object):
+    """
+    Local AMQP stand-in that costs one simulated network round trip per
+    synchronous method (the TCP + AMQP handshake costs three).
+    """
+
+    def __init__(self, latency:float, confirm_publish:bool=False):
+        self.latency = latency
+        self.confirm_publish = confirm_publish
+        self.published = 0
+
+    def round_trip(self):
+        time.sleep(self.latency)
+
+    def connect(self):
+        for i in range(3):
+            self.round_trip()
+
+    def channel(self):
+        self.round_trip()
+        return _StandInChannel(self)
+
+    def close(self):
+        self.round_trip()
+
+
+class Command(BaseCommand):
+    help = "Measure events/sec of the AMQP publisher against a local stand-in broker"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=1000,
+                            help="Number of events to publish on every run.")
+        parser.add_argument("--latency", type=float, default=0.2,
+                            help="Simulated network round trip in milliseconds.")
+        parser.add_argument("--no-confirm", action="store_true", dest="no_confirm",
+                            help="Disable publisher confirms.")
+
+    def _run(self, label, events, publish):
+        start = time.perf_counter()
+        for i in range(events):
+            publish("{}", routing_key="changes.project.1.userstories", exchange="events")
+        elapsed = time.perf_counter() - start
+        self.stdout.write("{:<30} {:>10.1f} events/sec".format(label, events / elapsed))
+
+    def handle(self, **options):
+        latency = options["latency"] / 1000
+        confirm_publish = not options["no_confirm"]
+
+        def connection_factory(url, **kwargs):
+            return StandInAmqpConnection(latency, **kwargs)
+
+        # The old backend behaviour: connect, declare, publish and close per event
+        def publish_once(message, *, routing_key, exchange):
+            connection = connection_factory(None, confirm_publish=confirm_publish)
+            connection.connect()
+            channel = connection.channel()
+            channel.exchange_declare(exchange=exchange, type="topic", auto_delete=True)
+            channel.basic_publish(message, routing_key=routing_key, exchange=exchange)
+            channel.close()
+            connection.close()
+
+        publisher = AmqpPublisher("//guest:guest@stand-in/", confirm_publish=confirm_publish,
+                                  connection_factory=connection_factory)
+
+        self._run("Connection per event", options["events"], publish_once)
+        self._run("Pooled publisher", options["events"], publisher.publish)
+        publisher.close()
@@ -29,12 +29,14 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.template.defaultfilters import slugify
 from django.utils.translation import ugettext as _
 
+from taiga.mdrender.service import render_many as mdrender_many
 from taiga.projects.history.services import make_key_from_model_object, take_snapshot
 from taiga.projects.models import Membership
 from taiga.projects.references import sequences as seq
 from taiga.projects.references import models as refs
 from taiga.projects.userstories.models import RolePoints
 from taiga.projects.services import find_invited_user
+from taiga.projects.services import rebuild_project_totals
 from taiga.timeline.service import build_project_namespace
 from taiga.users import services as users_service
 
@@ -155,8 +157,23 @@ def _store_attachment(project, obj, attachment):
     return validator
 
 
-def _store_history(project, obj, history, statuses={}):
-    validator = validators.HistoryExportValidator(data=history, context={"project": project, "statuses": statuses})
+def _render_history_comments(project, history_entries):
+    # Render all the comments of an object at once instead of one by one
+    # in the CommentField of every history entry
+    comments = [history.get("comment", None) or "" for history in history_entries]
+    return dict(zip(comments, mdrender_many(project, comments)))
+
+
+def _render_items_history_comments(project, items):
+    # Render the comments of a whole section of the dump (all the user
+    # stories, all the tasks...) in one batch
+    return _render_history_comments(project, [history for item in items for history in item.get("history", [])])
+
+
+def _store_history(project, obj, history, statuses={}, rendered_comments=None):
+    validator = validators.HistoryExportValidator(data=history, context={"project": project,
+                                                                         "statuses": statuses,
+                                                                         "rendered_comments": rendered_comments})
     if validator.is_valid():
         validator.object.key = make_key_from_model_object(obj)
         if validator.object.diff is None:
@@ -325,7 +342,7 @@ def _store_role_point(project, us, role_point):
     return None
 
 
-def store_user_story(project, data):
+def store_user_story(project, data, rendered_comments=None):
     if "status" not in data and project.default_us_status:
         data["status"] = project.default_us_status.name
 
@@ -361,8 +378,10 @@ def store_user_story(project, data):
 
         history_entries = data.get("history", [])
         statuses = {s.name: s.id for s in project.us_statuses.all()}
+        if rendered_comments is None:
+            rendered_comments = _render_history_comments(project, history_entries)
         for history in history_entries:
-            _store_history(project, validator.object, history, statuses)
+            _store_history(project, validator.object, history, statuses, rendered_comments)
 
         if not history_entries:
             take_snapshot(validator.object, user=validator.object.owner)
@@ -386,8 +405,9 @@ def store_user_story(project, data):
 
 def store_user_stories(project, data):
     results = []
+    rendered_comments = _render_items_history_comments(project, data.get("user_stories", []))
     for userstory in data.get("user_stories", []):
-        us = store_user_story(project, userstory)
+        us = store_user_story(project, userstory, rendered_comments=rendered_comments)
         results.append(us)
     return results
 
@@ -406,7 +426,7 @@ def _store_epic_related_user_story(project, epic, related_user_story):
     return None
 
 
-def store_epic(project, data):
+def store_epic(project, data, rendered_comments=None):
     if "status" not in data and project.default_epic_status:
         data["status"] = project.default_epic_status.name
 
@@ -438,8 +458,10 @@ def store_epic(project, data):
 
         history_entries = data.get("history", [])
         statuses = {s.name: s.id for s in project.epic_statuses.all()}
+        if rendered_comments is None:
+            rendered_comments = _render_history_comments(project, history_entries)
         for history in history_entries:
-            _store_history(project, validator.object, history, statuses)
+            _store_history(project, validator.object, history, statuses, rendered_comments)
 
         if not history_entries:
             take_snapshot(validator.object, user=validator.object.owner)
@@ -462,15 +484,16 @@ def store_epic(project, data):
 
 def store_epics(project, data):
     results = []
+    rendered_comments = _render_items_history_comments(project, data.get("epics", []))
     for epic in data.get("epics", []):
-        epic = store_epic(project, epic)
+        epic = store_epic(project, epic, rendered_comments=rendered_comments)
         results.append(epic)
     return results
 
 
 ## TASKS
 
-def store_task(project, data):
+def store_task(project, data, rendered_comments=None):
     if "status" not in data and project.default_task_status:
         data["status"] = project.default_task_status.name
 
@@ -499,8 +522,10 @@ def store_task(project, data):
 
         history_entries = data.get("history", [])
         statuses = {s.name: s.id for s in project.task_statuses.all()}
+        if rendered_comments is None:
+            rendered_comments = _render_history_comments(project, history_entries)
         for history in history_entries:
-            _store_history(project, validator.object, history, statuses)
+            _store_history(project, validator.object, history, statuses, rendered_comments)
 
         if not history_entries:
             take_snapshot(validator.object, user=validator.object.owner)
@@ -524,15 +549,16 @@ def store_task(project, data):
 
 def store_tasks(project, data):
     results = []
+    rendered_comments = _render_items_history_comments(project, data.get("tasks", []))
     for task in data.get("tasks", []):
-        task = store_task(project, task)
+        task = store_task(project, task, rendered_comments=rendered_comments)
         results.append(task)
     return results
 
 
 ## ISSUES
 
-def store_issue(project, data):
+def store_issue(project, data, rendered_comments=None):
     validator = validators.IssueExportValidator(data=data, context={"project": project})
 
     if "type" not in data and project.default_issue_type:
@@ -571,8 +597,10 @@ def store_issue(project, data):
 
         history_entries = data.get("history", [])
         statuses = {s.name: s.id for s in project.issue_statuses.all()}
+        if rendered_comments is None:
+            rendered_comments = _render_history_comments(project, history_entries)
         for history in history_entries:
-            _store_history(project, validator.object, history, statuses)
+            _store_history(project, validator.object, history, statuses, rendered_comments)
 
         if not history_entries:
             take_snapshot(validator.object, user=validator.object.owner)
@@ -595,14 +623,15 @@ def store_issue(project, data):
 
 def store_issues(project, data):
     issues = []
+    rendered_comments = _render_items_history_comments(project, data.get("issues", []))
     for issue in data.get("issues", []):
-        issues.append(store_issue(project, issue))
+        issues.append(store_issue(project, issue, rendered_comments=rendered_comments))
     return issues
 
 
 ## WIKI PAGES
 
-def store_wiki_page(project, wiki_page):
+def store_wiki_page(project, wiki_page, rendered_comments=None):
     wiki_page["slug"] = slugify(unidecode(wiki_page.get("slug", "")))
     validator = validators.WikiPageExportValidator(data=wiki_page)
     if validator.is_valid():
@@ -618,8 +647,10 @@ def store_wiki_page(project, wiki_page):
             _store_attachment(project, validator.object, attachment)
 
         history_entries = wiki_page.get("history", [])
+        if rendered_comments is None:
+            rendered_comments = _render_history_comments(project, history_entries)
         for history in history_entries:
-            _store_history(project, validator.object, history)
+            _store_history(project, validator.object, history, rendered_comments=rendered_comments)
 
         if not history_entries:
             take_snapshot(validator.object, user=validator.object.owner)
@@ -632,8 +663,9 @@ def store_wiki_page(project, wiki_page):
 
 def store_wiki_pages(project, data):
     results = []
+    rendered_comments = _render_items_history_comments(project, data.get("wiki_pages", []))
     for wiki_page in data.get("wiki_pages", []):
-        results.append(store_wiki_page(project, wiki_page))
+        results.append(store_wiki_page(project, wiki_page, rendered_comments=rendered_comments))
     return results
 
 
@@ -814,7 +846,7 @@ def _populate_project_object(project, data):
     check_if_there_is_some_error(_("error importing timelines"), project)
 
     # Regenerate stats
-    project.refresh_totals()
+    rebuild_project_totals(project)
 
 
 def store_project_from_dict(data, owner=None):
@@ -125,7 +125,13 @@ class CommentField(serializers.WritableField):
 
     def field_from_native(self, data, files, field_name, into):
         super().field_from_native(data, files, field_name, into)
-        into["comment_html"] = mdrender(self.context['project'], data.get("comment", ""))
+
+        comment = data.get("comment", "")
+        rendered_comments = self.context.get("rendered_comments", None) or {}
+        if comment in rendered_comments:
+            into["comment_html"] = rendered_comments[comment]
+        else:
+            into["comment_html"] = mdrender(self.context['project'], comment)
 
 
 class ProjectRelatedField(serializers.RelatedField):
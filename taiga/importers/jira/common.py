@@ -45,8 +45,8 @@ from taiga.projects.custom_attributes.models import (UserStoryCustomAttribute,
                                                      EpicCustomAttribute)
 from taiga.projects.history.models import HistoryEntry
 from taiga.projects.history.choices import HistoryType
-from taiga.mdrender.service import render as mdrender
 from taiga.importers import exceptions
+from taiga.importers import services as import_service
 from taiga.front.templatetags.functions import resolve as resolve_front_url
 
 EPIC_COLORS = {
@@ -452,15 +452,19 @@ class JiraImporterCommon:
 
     def _import_changelog(self, project, obj, issue, options):
         obj.cummulative_attachments = []
+        histories = []
         for history in sorted(issue['changelog']['histories'], key=lambda h: h['created']):
-            self._import_history(project, obj, history, options)
+            history_data = self._transform_history_data(project, obj, history, options)
+            if history_data is not None:
+                histories.append((history, history_data))
 
-    def _import_history(self, project, obj, history, options):
+        import_service.render_history_data(obj.project, [history_data for (_, history_data) in histories])
+        for (history, history_data) in histories:
+            self._import_history(project, obj, history, history_data)
+
+    def _import_history(self, project, obj, history, history_data):
         key = make_key_from_model_object(obj)
         typename = get_typename_for_model_class(obj.__class__)
-        history_data = self._transform_history_data(project, obj, history, options)
-        if history_data is None:
-            return
 
         change_old = history_data['change_old']
         change_new = history_data['change_new']
@@ -483,7 +487,7 @@ class JiraImporterCommon:
             diff=fdiff.diff,
             values=values,
             comment=comment,
-            comment_html=mdrender(obj.project, comment),
+            comment_html=history_data['comment_html'],
             is_hidden=False,
             is_snapshot=False,
         )
@@ -536,8 +540,6 @@ class JiraImporterCommon:
             elif history_item['field'] == "description":
                 result['change_old']["description"] = history_item['fromString']
                 result['change_new']["description"] = history_item['toString']
-                result['change_old']["description_html"] = mdrender(obj.project, history_item['fromString'] or "")
-                result['change_new']["description_html"] = mdrender(obj.project, history_item['toString'] or "")
                 has_data = True
             elif history_item['field'] == "Epic Link":
                 pass
@@ -37,7 +37,7 @@ from taiga.projects.history.services import (make_diff_from_dicts,
 from taiga.projects.history.models import HistoryEntry
 from taiga.projects.history.choices import HistoryType
 from taiga.projects.custom_attributes.models import UserStoryCustomAttribute
-from taiga.mdrender.service import render as mdrender
+from taiga.importers import services as import_service
 from taiga.timeline.rebuilder import rebuild_timeline
 from taiga.timeline.models import Timeline
 
@@ -517,8 +517,7 @@ class PivotalImporter:
                 {"envelope": "true", "limit": 300, "offset": offset}
             )
             offset += 300
-            for activity in activities['data']:
-                self._import_activity(us, activity, options)
+            self._import_activities(us, activities['data'], options)
 
             if len(activities['data']) < 300:
                 break
@@ -534,17 +533,23 @@ class PivotalImporter:
                 {"envelope": "true", "limit": 300, "offset": offset}
             )
             offset += 300
-            for activity in activities['data']:
-                self._import_activity(taiga_epic, activity, options)
+            self._import_activities(taiga_epic, activities['data'], options)
 
             if len(activities['data']) < 300:
                 break
 
-    def _import_activity(self, obj, activity, options):
-        activity_data = self._transform_activity_data(obj, activity, options)
-        if activity_data is None:
-            return
+    def _import_activities(self, obj, activities, options):
+        activities_data = []
+        for activity in activities:
+            activity_data = self._transform_activity_data(obj, activity, options)
+            if activity_data is not None:
+                activities_data.append((activity, activity_data))
 
+        import_service.render_history_data(obj.project, [activity_data for (_, activity_data) in activities_data])
+        for (activity, activity_data) in activities_data:
+            self._import_activity(obj, activity, activity_data)
+
+    def _import_activity(self, obj, activity, activity_data):
         change_old = activity_data['change_old']
         change_new = activity_data['change_new']
         hist_type = activity_data['hist_type']
@@ -566,7 +571,7 @@ class PivotalImporter:
             diff=fdiff.diff,
             values=make_diff_values(typename, fdiff),
             comment=comment,
-            comment_html=mdrender(obj.project, comment),
+            comment_html=activity_data['comment_html'],
             is_hidden=False,
             is_snapshot=False,
         )
@@ -612,8 +617,6 @@ class PivotalImporter:
                 if 'description' in change['new_values']:
                     result['change_old']["description"] = str(change['original_values']['description'])
                     result['change_new']["description"] = str(change['new_values']['description'])
-                    result['change_old']["description_html"] = mdrender(obj.project, str(change['original_values']['description']))
-                    result['change_new']["description_html"] = mdrender(obj.project, str(change['new_values']['description']))
 
                 if 'estimate' in change['new_values']:
                     old_points = None
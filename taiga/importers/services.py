@@ -18,6 +18,7 @@
 
 from taiga.users.models import User
 from taiga.projects.models import Membership
+from taiga.mdrender.service import render_many as mdrender_many
 
 
 def resolve_users_bindings(users_bindings):
@@ -50,3 +51,25 @@ def create_memberships(users_bindings, project, creator, role_name):
             is_admin=False,
             invited_by=creator,
         )
+
+
+def render_history_data(project, histories_data):
+    """
+    Render, with a single batch, the comments and the descriptions of the
+    transformed history entries of an importer. It sets comment_html and
+    the description_html of the changes.
+    """
+    texts = []
+    for history_data in histories_data:
+        texts.append(history_data['comment'])
+        for change in (history_data['change_old'], history_data['change_new']):
+            if "description" in change:
+                texts.append(change["description"] or "")
+
+    rendered = dict(zip(texts, mdrender_many(project, texts)))
+
+    for history_data in histories_data:
+        history_data['comment_html'] = rendered[history_data['comment']]
+        for change in (history_data['change_old'], history_data['change_new']):
+            if "description" in change:
+                change["description_html"] = rendered[change["description"] or ""]
@@ -40,7 +40,6 @@ from taiga.projects.history.services import (make_diff_from_dicts,
 from taiga.projects.history.models import HistoryEntry
 from taiga.projects.history.choices import HistoryType
 from taiga.projects.custom_attributes.models import UserStoryCustomAttribute
-from taiga.mdrender.service import render as mdrender
 from taiga.timeline.rebuilder import rebuild_timeline
 from taiga.timeline.models import Timeline
 from taiga.front.templatetags.functions import resolve as resolve_front_url
@@ -376,26 +375,30 @@ class TrelloImporter:
         )
 
         while actions:
+            actions_data = []
             for action in actions:
-                self._import_action(us, action, statuses, options)
+                action_data = self._transform_action_data(us, action, statuses, options)
+                if action_data is not None:
+                    actions_data.append((action, action_data))
+
+            import_service.render_history_data(us.project, [action_data for (_, action_data) in actions_data])
+            for (action, action_data) in actions_data:
+                self._import_action(us, action, action_data)
             actions = self._client.get(
                 "/card/{}/actions".format(card['id']),
                 {
                     "filter": ",".join(included_actions),
                     "limit": "1000",
                     "since": "lastView",
-                    "before": action['date'],
+                    "before": actions[-1]['date'],
                     "memberCreator": "true",
                     "memberCreator_fields": "fullName",
                 }
             )
 
-    def _import_action(self, us, action, statuses, options):
+    def _import_action(self, us, action, action_data):
         key = make_key_from_model_object(us)
         typename = get_typename_for_model_class(UserStory)
-        action_data = self._transform_action_data(us, action, statuses, options)
-        if action_data is None:
-            return
 
         change_old = action_data['change_old']
         change_new = action_data['change_new']
@@ -415,7 +418,7 @@ class TrelloImporter:
             diff=fdiff.diff,
             values=make_diff_values(typename, fdiff),
             comment=comment,
-            comment_html=mdrender(us.project, comment),
+            comment_html=action_data['comment_html'],
             is_hidden=False,
             is_snapshot=False,
         )
@@ -470,8 +473,6 @@ class TrelloImporter:
             if 'desc' in action['data']['old']:
                 result['change_old']["description"] = str(action['data']['old'].get('desc', ''))
                 result['change_new']["description"] = str(action['data']['card'].get('desc', ''))
-                result['change_old']["description_html"] = mdrender(us.project, str(action['data']['old'].get('desc', '')))
-                result['change_new']["description_html"] = mdrender(us.project, str(action['data']['card'].get('desc', '')))
             if 'idList' in action['data']['old']:
                 old_status_name = statuses[action['data']['old']['idList']]['name']
                 result['change_old']["status"] = us.project.us_statuses.get(name=old_status_name).id
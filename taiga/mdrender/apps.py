@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.apps import apps
+from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.db.models import signals
+
+
+class MdRenderAppConfig(AppConfig):
+    name = "taiga.mdrender"
+    verbose_name = "Markdown render"
+
+    def ready(self):
+        from . import signal_handlers as handlers
+
+        # The rendered texts are cached with a per project version of the
+        # referenced objects and a global version of the mentioned users.
+        reference_model = apps.get_model("references", "Reference")
+        signals.post_save.connect(handlers.on_reference_change, sender=reference_model,
+                                  dispatch_uid="mdrender_reference_save")
+        signals.post_delete.connect(handlers.on_reference_change, sender=reference_model,
+                                    dispatch_uid="mdrender_reference_delete")
+
+        for app_label, model_name in (("epics", "Epic"), ("userstories", "UserStory"),
+                                      ("tasks", "Task"), ("issues", "Issue")):
+            model = apps.get_model(app_label, model_name)
+            signals.post_save.connect(handlers.on_referenced_object_save, sender=model,
+                                      dispatch_uid="mdrender_{}_save".format(app_label))
+            signals.post_delete.connect(handlers.on_referenced_object_delete, sender=model,
+                                        dispatch_uid="mdrender_{}_delete".format(app_label))
+
+        signals.pre_save.connect(handlers.store_previous_mention_fields, sender=get_user_model(),
+                                 dispatch_uid="mdrender_user_pre_save")
+        signals.post_save.connect(handlers.on_user_save, sender=get_user_model(),
+                                  dispatch_uid="mdrender_user_save")
+        signals.post_delete.connect(handlers.on_user_delete, sender=get_user_model(),
+                                    dispatch_uid="mdrender_user_delete")
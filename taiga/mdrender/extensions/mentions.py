@@ -22,16 +22,16 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
-from django.contrib.auth import get_user_model
-
 from markdown.extensions import Extension
 from markdown.inlinepatterns import Pattern
 from markdown.util import etree, AtomicString
 
 
+MENTION_RE = r"(@)([\w.-]+)"
+
+
 class MentionsExtension(Extension):
     def extendMarkdown(self, md, md_globals):
-        MENTION_RE = r"(@)([\w.-]+)"
         mentionsPattern = MentionsPattern(MENTION_RE)
         mentionsPattern.md = md
         md.inlinePatterns.add("mentions", mentionsPattern, "_end")
@@ -41,9 +41,9 @@ class MentionsPattern(Pattern):
     def handleMatch(self, m):
         username = m.group(3)
 
-        try:
-            user = get_user_model().objects.get(username=username)
-        except get_user_model().DoesNotExist:
+        # Users are resolved before the conversion (see mdrender.service)
+        user = self.md.mentioned_users.get(username, None)
+        if user is None:
             return "@{}".format(username)
 
         url = "/profile/{}".format(username)
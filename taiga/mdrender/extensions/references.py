@@ -27,31 +27,25 @@ from markdown.extensions import Extension
 from markdown.inlinepatterns import Pattern
 from markdown.util import etree
 
-from taiga.projects.references.services import get_instance_by_ref
 from taiga.front.templatetags.functions import resolve
 
 
-class TaigaReferencesExtension(Extension):
-    def __init__(self, project, *args, **kwargs):
-        self.project = project
-        return super().__init__(*args, **kwargs)
+TAIGA_REFERENCE_RE = r'(?<=^|(?<=[^a-zA-Z0-9-\[]))#(\d+)'
+
 
+class TaigaReferencesExtension(Extension):
     def extendMarkdown(self, md, md_globals):
-        TAIGA_REFERENCE_RE = r'(?<=^|(?<=[^a-zA-Z0-9-\[]))#(\d+)'
-        referencesPattern = TaigaReferencesPattern(TAIGA_REFERENCE_RE, self.project)
+        referencesPattern = TaigaReferencesPattern(TAIGA_REFERENCE_RE)
         referencesPattern.md = md
         md.inlinePatterns.add('taiga-references', referencesPattern, '_begin')
 
 
 class TaigaReferencesPattern(Pattern):
-    def __init__(self, pattern, project):
-        self.project = project
-        super().__init__(pattern)
-
     def handleMatch(self, m):
         obj_ref = m.group(2)
 
-        instance = get_instance_by_ref(self.project.id, obj_ref)
+        # References are resolved before the conversion (see mdrender.service)
+        instance = self.md.referenced_objects.get(int(obj_ref), None)
         if instance is None or instance.content_object is None:
             return "#{}".format(obj_ref)
 
@@ -68,7 +62,7 @@ class TaigaReferencesPattern(Pattern):
         else:
             return "#{}".format(obj_ref)
 
-        url = resolve(instance.content_type.model, self.project.slug, obj_ref)
+        url = resolve(instance.content_type.model, self.md.project.slug, obj_ref)
 
         link_text = "&num;{}".format(obj_ref)
 
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+
+import bleach
+
+from django.core.management.base import BaseCommand
+
+from taiga.mdrender.service import _make_markdown, render
+
+
+SAMPLE_TEXT = """
+# Release notes
+
+Some **strong**, *emphasis* and ~~strikethrough~~ text with :smile: emojis,
+a [[Wiki page]], a [relative link](/project/test/) and http://example.com/.
+
+* First item
+* Second item with `inline code`
+
+| Column | Other column |
+|--------|--------------|
+| value  | other value  |
+
+```python
+def example():
+    return 42
+```
+"""
+
+
+class _StandInProject(object):
+    id = 0
+    slug = "benchmark"
+
+
+class Command(BaseCommand):
+    help = "Measure renders/sec of mdrender with and without reusing the Markdown instances"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=1000,
+                            help="Number of texts to render on every run.")
+
+    def _run(self, label, renders, render):
+        start = time.perf_counter()
+        for i in range(renders):
+            render(_StandInProject, SAMPLE_TEXT)
+        elapsed = time.perf_counter() - start
+        self.stdout.write("{:<30} {:>10.1f} renders/sec".format(label, renders / elapsed))
+
+    def handle(self, **options):
+        # The old behaviour: build a new Markdown instance for every text
+        def render_once(project, text):
+            md = _make_markdown()
+            md.project = project
+            md.extracted_data = {"mentions": [], "references": []}
+            md.mentioned_users = {}
+            md.referenced_objects = {}
+            return (bleach.clean(md.convert(text)), md.extracted_data)
+
+        self._run("Markdown instance per render", options["renders"], render_once)
+        # render() without its cache
+        self._run("Pooled Markdown instances", options["renders"], render.__wrapped__)
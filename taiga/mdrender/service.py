@@ -18,6 +18,10 @@
 
 import hashlib
 import functools
+import multiprocessing
+import re
+import threading
+import time
 import bleach
 
 # BEGIN PATCH
@@ -37,19 +41,27 @@ def _serialize(domtree):
 bleach._serialize = _serialize
 # END PATCH
 
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.utils.encoding import force_bytes
 
 from markdown import Markdown
 
+from taiga.base.utils import cache as cache_utils
+
 from .extensions.autolink import AutolinkExtension
 from .extensions.automail import AutomailExtension
 from .extensions.semi_sane_lists import SemiSaneListExtension
 from .extensions.strikethrough import StrikethroughExtension
 from .extensions.wikilinks import WikiLinkExtension
 from .extensions.emojify import EmojifyExtension
-from .extensions.mentions import MentionsExtension
-from .extensions.references import TaigaReferencesExtension
+from .extensions.mentions import MentionsExtension, MENTION_RE
+from .extensions.references import TaigaReferencesExtension, TAIGA_REFERENCE_RE
 from .extensions.target_link import TargetBlankLinkExtension
 
 # Bleach configuration
@@ -65,15 +77,15 @@ bleach.ALLOWED_ATTRIBUTES["img"] = ["alt", "src"]
 bleach.ALLOWED_ATTRIBUTES["*"] = ["class", "style", "id"]
 
 
-def _make_extensions_list(project=None):
+def _make_extensions_list():
     return [AutolinkExtension(),
             AutomailExtension(),
             SemiSaneListExtension(),
             StrikethroughExtension(),
-            WikiLinkExtension(project),
+            WikiLinkExtension(),
             EmojifyExtension(),
             MentionsExtension(),
-            TaigaReferencesExtension(project),
+            TaigaReferencesExtension(),
             TargetBlankLinkExtension(),
             "markdown.extensions.extra",
             "markdown.extensions.codehilite",
@@ -85,41 +97,343 @@ def _make_extensions_list(project=None):
 import diff_match_patch
 
 
+class _LocalCache(object):
+    """
+    Small in-process LRU cache, with a timeout for its entries, that sits
+    in front of the shared cache.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+
+            (expires, value) = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = _LocalCache(max_size=getattr(settings, "MDRENDER_LOCAL_CACHE_SIZE", 500),
+                           timeout=getattr(settings, "MDRENDER_LOCAL_CACHE_TIMEOUT", 5*60))
+
+# The versions of the rendered texts are kept a few seconds by every process
+# too, so most renders don't need to ask the shared cache for them.
+_local_versions = _LocalCache(max_size=getattr(settings, "MDRENDER_LOCAL_CACHE_SIZE", 500),
+                              timeout=getattr(settings, "MDRENDER_LOCAL_VERSIONS_TIMEOUT", 10))
+
+_MENTIONS_VERSION_KEY = "mdrender-mentions-version"
+
+
+def _get_references_version_key(project_id):
+    return "mdrender-references-version-{}".format(project_id)
+
+
+def bump_project_reference_version(project_id):
+    """
+    Invalidate the rendered texts of a project, because one of the objects
+    that can be referenced in them has been created, renamed or deleted.
+    """
+    key = _get_references_version_key(project_id)
+    version = cache_utils.make_version()
+    cache.set(key, version, timeout=None)
+    _local_versions.set(key, version)
+
+
+def bump_mentions_version():
+    """
+    Invalidate all the rendered texts, because one of the users that can be
+    mentioned in them has been created, renamed or deleted.
+    """
+    version = cache_utils.make_version()
+    cache.set(_MENTIONS_VERSION_KEY, version, timeout=None)
+    _local_versions.set(_MENTIONS_VERSION_KEY, version)
+
+
+def _get_cache_version(project_id):
+    keys = [_get_references_version_key(project_id), _MENTIONS_VERSION_KEY]
+    versions = {}
+    for key in keys:
+        version = _local_versions.get(key)
+        if version is not None:
+            versions[key] = version
+
+    missing_keys = [key for key in keys if key not in versions]
+    if missing_keys:
+        versions.update(cache.get_many(missing_keys))
+
+        for key in missing_keys:
+            if key not in versions:
+                versions[key] = cache_utils.get_version(key)
+            _local_versions.set(key, versions[key])
+
+    return "-".join(versions[key] for key in keys)
+
+
+def _make_cache_key(prefix, project, text, version=None):
+    if version is None:
+        version = _get_cache_version(project.id)
+
+    sha1_hash = hashlib.sha1(force_bytes(text)).hexdigest()
+    return "{}-{}-{}-{}".format(prefix, sha1_hash, project.id, version)
+
+
+def _cache_get(key):
+    value = _local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            _local_cache.set(key, value)
+    return value
+
+
+def _cache_get_many(keys):
+    values = {}
+    for key in keys:
+        value = _local_cache.get(key)
+        if value is not None:
+            values[key] = value
+
+    missing_keys = [key for key in keys if key not in values]
+    if missing_keys:
+        for key, value in cache.get_many(missing_keys).items():
+            _local_cache.set(key, value)
+            values[key] = value
+
+    return values
+
+
+def _cache_set(key, value):
+    _local_cache.set(key, value)
+    cache.set(key, value, timeout=getattr(settings, "MDRENDER_CACHE_TIMEOUT", 24*60*60))
+
+
+def _cache_set_many(values):
+    for key, value in values.items():
+        _local_cache.set(key, value)
+    cache.set_many(values, timeout=getattr(settings, "MDRENDER_CACHE_TIMEOUT", 24*60*60))
+
+
 def cache_by_sha(func):
     @functools.wraps(func)
     def _decorator(project, text):
-        sha1_hash = hashlib.sha1(force_bytes(text)).hexdigest()
-        key = "{}-{}".format(sha1_hash, project.id)
+        key = _make_cache_key(func.__name__, project, text)
 
         # Try to get it from the cache
-        cached = cache.get(key)
+        cached = _cache_get(key)
         if cached is not None:
             return cached
 
         returned_value = func(project, text)
-        cache.set(key, returned_value, timeout=None)
+        _cache_set(key, returned_value)
         return returned_value
 
     return _decorator
 
 
-def _get_markdown(project):
-    extensions = _make_extensions_list(project=project)
-    md = Markdown(extensions=extensions)
+def _get_users(usernames):
+    if not usernames:
+        return {}
+
+    return {user.username: user for user in get_user_model().objects.filter(username__in=usernames)}
+
+
+def _get_mentioned_users(text):
+    """
+    Get the users mentioned in a text, by username, with one query.
+    """
+    return _get_users(set(match.group(2) for match in re.finditer(MENTION_RE, text)))
+
+
+def _get_references(project, refs):
+    if not refs:
+        return {}
+
+    reference_model = apps.get_model("references", "Reference")
+    qs = (reference_model.objects.filter(project_id=project.id, ref__in=refs)
+                                 .select_related("content_type")
+                                 .prefetch_related("content_object"))
+    return {reference.ref: reference for reference in qs}
+
+
+def _get_referenced_objects(project, text):
+    """
+    Get the references of a text, by ref, with one query plus one query
+    per referenced object type (epics, user stories, tasks and issues).
+    """
+    return _get_references(project, set(int(match.group(1))
+                                        for match in re.finditer(TAIGA_REFERENCE_RE, text)))
+
+
+def _load_extracted_data(project, usernames, refs):
+    users = _get_users(set(usernames))
+    references = _get_references(project, set(refs))
+
+    return {
+        "mentions": [users[username] for username in usernames if username in users],
+        "references": [references[ref].content_object for ref in refs
+                       if ref in references and references[ref].content_object is not None],
+    }
+
+
+# Building a Markdown instance (extensions, inline patterns, regexes...) is
+# much more expensive than converting a text, so every thread keeps a pool of
+# configured instances that are reset between uses.
+_markdown_pool = threading.local()
+
+
+def _make_markdown():
+    return Markdown(extensions=_make_extensions_list())
+
+
+def _clean_abbreviations(md):
+    # The abbr extension (included in extra) adds an inline pattern for every
+    # abbreviation definition of a text and reset() doesn't remove them.
+    for key in [key for key in md.inlinePatterns.keys() if key.startswith("abbr-")]:
+        del md.inlinePatterns[key]
+
+
+@contextmanager
+def _get_markdown(project, text="", *, mentioned_users=None, referenced_objects=None):
+    pool = getattr(_markdown_pool, "instances", None)
+    if pool is None:
+        pool = _markdown_pool.instances = []
+
+    md = pool.pop() if pool else _make_markdown()
+    md.reset()
+
+    # Project-specific state, used by the wiki links and references extensions
+    md.project = project
     md.extracted_data = {"mentions": [], "references": []}
-    return md
+
+    # Resolve every mention and reference of the text at once instead of
+    # one by one in the inline patterns.
+    if mentioned_users is None:
+        mentioned_users = _get_mentioned_users(text)
+    if referenced_objects is None:
+        referenced_objects = _get_referenced_objects(project, text)
+
+    md.mentioned_users = mentioned_users
+    md.referenced_objects = referenced_objects
+
+    try:
+        yield md
+    finally:
+        md.project = None
+        md.extracted_data = None
+        md.mentioned_users = None
+        md.referenced_objects = None
+        _clean_abbreviations(md)
+        pool.append(md)
 
 
 @cache_by_sha
 def render(project, text):
-    md = _get_markdown(project)
-    return bleach.clean(md.convert(text))
+    with _get_markdown(project, text) as md:
+        return bleach.clean(md.convert(text))
 
 
 def render_and_extract(project, text):
-    md = _get_markdown(project)
-    result = bleach.clean(md.convert(text))
-    return (result, md.extracted_data)
+    key = _make_cache_key("render_and_extract", project, text)
+
+    # Only the usernames and refs of the extracted data are cached, the
+    # users and the referenced objects are always loaded again.
+    cached = _cache_get(key)
+    if cached is not None:
+        (result, usernames, refs) = cached
+        return (result, _load_extracted_data(project, usernames, refs))
+
+    with _get_markdown(project, text) as md:
+        result = bleach.clean(md.convert(text))
+        extracted_data = md.extracted_data
+        usernames = [username for username, user in md.mentioned_users.items()
+                     if user in extracted_data["mentions"]]
+        refs = [ref for ref, reference in md.referenced_objects.items()
+                if reference.content_object in extracted_data["references"]]
+
+    _cache_set(key, (result, usernames, refs))
+    return (result, extracted_data)
+
+
+def _render_text(project, text, mentioned_users, referenced_objects):
+    with _get_markdown(project, text, mentioned_users=mentioned_users,
+                       referenced_objects=referenced_objects) as md:
+        return bleach.clean(md.convert(text))
+
+
+# The render workers never touch the database, they receive the project and
+# the already resolved mentions and references of the whole batch.
+_render_worker_state = {}
+
+
+def _init_render_worker(project, mentioned_users, referenced_objects):
+    _render_worker_state.update(project=project,
+                                mentioned_users=mentioned_users,
+                                referenced_objects=referenced_objects)
+
+
+def _render_worker(text):
+    return _render_text(text=text, **_render_worker_state)
+
+
+def render_many(project, texts):
+    """
+    Render a batch of texts of a project, returning them in the same order.
+
+    Identical texts are rendered once, the mentions and references of the
+    whole batch are resolved at once and, for big batches, the texts are
+    rendered by a pool of processes (unless the current process is a
+    daemon, that can't have children).
+    """
+    texts = list(texts)
+    version = _get_cache_version(project.id)
+    keys = OrderedDict((text, _make_cache_key("render", project, text, version=version)) for text in texts)
+
+    cached = _cache_get_many(list(keys.values()))
+    rendered = {text: cached[key] for text, key in keys.items() if key in cached}
+
+    pending = [text for text in keys if text not in rendered]
+    if pending:
+        batch_text = "\n".join(pending)
+        mentioned_users = _get_mentioned_users(batch_text)
+        referenced_objects = _get_referenced_objects(project, batch_text)
+
+        # Daemonic processes (like the celery prefork workers) can't have children
+        if (len(pending) >= getattr(settings, "MDRENDER_PROCESS_POOL_THRESHOLD", 1000) and
+                not multiprocessing.current_process().daemon):
+            initargs = (project, mentioned_users, referenced_objects)
+            with multiprocessing.Pool(getattr(settings, "MDRENDER_PROCESSES", None),
+                                      initializer=_init_render_worker, initargs=initargs) as pool:
+                results = pool.map(_render_worker, pending, chunksize=50)
+        else:
+            results = [_render_text(project, text, mentioned_users, referenced_objects)
+                       for text in pending]
+
+        rendered.update(zip(pending, results))
+        _cache_set_many({keys[text]: rendered[text] for text in pending})
+
+    return [rendered[text] for text in texts]
 
 
 class DiffMatchPatch(diff_match_patch.diff_match_patch):
@@ -170,4 +484,4 @@ def get_diff_of_htmls(html1, html2):
     return diffutil.diff_pretty_html(diffs)
 
 
-__all__ = ["render", "get_diff_of_htmls", "render_and_extract"]
+__all__ = ["render", "render_many", "get_diff_of_htmls", "render_and_extract"]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from . import service
+
+
+def on_reference_change(sender, instance, **kwargs):
+    service.bump_project_reference_version(instance.project_id)
+
+
+def on_referenced_object_save(sender, instance, created, **kwargs):
+    # New objects are handled by the creation of their reference.
+    # prev_subject is stored by taiga.projects.references.models.store_previous_project
+    if not created and getattr(instance, "prev_subject", None) != instance.subject:
+        service.bump_project_reference_version(instance.project_id)
+
+
+def on_referenced_object_delete(sender, instance, **kwargs):
+    service.bump_project_reference_version(instance.project_id)
+
+
+_MENTION_FIELDS = ("username", "full_name")
+
+
+def store_previous_mention_fields(sender, instance, update_fields=None, **kwargs):
+    instance._prev_mention_fields = None
+    if instance.pk is None:
+        return
+
+    if update_fields is not None and not set(_MENTION_FIELDS) & set(update_fields):
+        return
+
+    instance._prev_mention_fields = sender.objects.filter(pk=instance.pk).values_list(*_MENTION_FIELDS).first()
+
+
+def on_user_save(sender, instance, created, **kwargs):
+    # Mentions are rendered with the username and the full name of the users
+    prev_fields = getattr(instance, "_prev_mention_fields", None)
+    if created or (prev_fields is not None and
+                   prev_fields != tuple(getattr(instance, field) for field in _MENTION_FIELDS)):
+        service.bump_mentions_version()
+
+
+def on_user_delete(sender, instance, **kwargs):
+    service.bump_mentions_version()
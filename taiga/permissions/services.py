@@ -17,9 +17,16 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+
 from .choices import ADMINS_PERMISSIONS, MEMBERS_PERMISSIONS, ANON_PERMISSIONS
 
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from taiga.base.utils import cache as cache_utils
 
 
 def _get_user_project_membership(user, project, cache="user"):
@@ -90,36 +97,41 @@ def _get_membership_permissions(membership):
     return []
 
 
-def calculate_permissions(is_authenticated=False, is_superuser=False, is_member=False,
-                          is_admin=False, role_permissions=[], anon_permissions=[],
-                          public_permissions=[]):
+_ADMINS_PERMISSIONS = frozenset(perm for perm, _ in ADMINS_PERMISSIONS)
+_MEMBERS_PERMISSIONS = frozenset(perm for perm, _ in MEMBERS_PERMISSIONS)
+_ANON_PERMISSIONS = frozenset(perm for perm, _ in ANON_PERMISSIONS)
+_SUPERUSER_PERMISSIONS = _ADMINS_PERMISSIONS | _MEMBERS_PERMISSIONS | _ANON_PERMISSIONS
+
+
+@functools.lru_cache(maxsize=1024)
+def _calculate_permissions(is_authenticated, is_superuser, is_member, is_admin, role_permissions,
+                           anon_permissions, public_permissions):
     if is_superuser:
-        admins_permissions = list(map(lambda perm: perm[0], ADMINS_PERMISSIONS))
-        members_permissions = list(map(lambda perm: perm[0], MEMBERS_PERMISSIONS))
-        public_permissions = []
-        anon_permissions = list(map(lambda perm: perm[0], ANON_PERMISSIONS))
-    elif is_member:
+        return _SUPERUSER_PERMISSIONS
+
+    if is_member:
         if is_admin:
-            admins_permissions = list(map(lambda perm: perm[0], ADMINS_PERMISSIONS))
-            members_permissions = list(map(lambda perm: perm[0], MEMBERS_PERMISSIONS))
-        else:
-            admins_permissions = []
-            members_permissions = []
-        members_permissions = members_permissions + role_permissions
-        public_permissions = public_permissions if public_permissions is not None else []
-        anon_permissions = anon_permissions if anon_permissions is not None else []
-    elif is_authenticated:
-        admins_permissions = []
-        members_permissions = []
-        public_permissions = public_permissions if public_permissions is not None else []
-        anon_permissions = anon_permissions if anon_permissions is not None else []
-    else:
-        admins_permissions = []
-        members_permissions = []
-        public_permissions = []
-        anon_permissions = anon_permissions if anon_permissions is not None else []
+            return (_ADMINS_PERMISSIONS | _MEMBERS_PERMISSIONS | role_permissions |
+                    public_permissions | anon_permissions)
+        return role_permissions | public_permissions | anon_permissions
+
+    if is_authenticated:
+        return public_permissions | anon_permissions
 
-    return set(admins_permissions + members_permissions + public_permissions + anon_permissions)
+    return anon_permissions
+
+
+def calculate_permissions(is_authenticated=False, is_superuser=False, is_member=False,
+                          is_admin=False, role_permissions=[], anon_permissions=[],
+                          public_permissions=[]):
+    """
+    Return a frozenset with the permissions of an user in a project. The
+    results are memoized by their arguments, so the same frozenset is
+    returned for every object of a project in a list response.
+    """
+    return _calculate_permissions(bool(is_authenticated), bool(is_superuser), bool(is_member),
+                                  bool(is_admin), frozenset(role_permissions or []),
+                                  frozenset(anon_permissions or []), frozenset(public_permissions or []))
 
 
 def get_user_project_permissions(user, project, cache="user"):
@@ -151,3 +163,82 @@ def set_base_permissions_for_project(project):
         anon_permissions = list(map(lambda perm: perm[0], ANON_PERMISSIONS))
         project.anon_permissions = list(set((project.anon_permissions or []) + anon_permissions))
         project.public_permissions = list(set((project.public_permissions or []) + anon_permissions))
+
+
+def _get_user_permissions_version_key(user_id):
+    return "user-permissions-version-{}".format(user_id)
+
+
+def bump_user_permissions_version(user_id):
+    """
+    Invalidate the cached memberships permissions of a user, because one of
+    its memberships, or the role of one of them, has changed.
+
+    The version is bumped again when the current transaction is committed,
+    so a request that cached the old memberships in the meantime doesn't
+    keep them under the new version.
+    """
+    key = _get_user_permissions_version_key(user_id)
+    cache_utils.bump_version(key)
+    transaction.on_commit(lambda: cache_utils.bump_version(key))
+
+
+def _get_user_permissions_version(user_id):
+    return cache_utils.get_version(_get_user_permissions_version_key(user_id))
+
+
+def get_user_memberships_permissions(user):
+    """
+    Return a dict {project id: (is admin, role permissions)} with all the
+    memberships of an user. The result is cached until one of its
+    memberships, or their roles, change.
+    """
+    if user.is_anonymous():
+        return {}
+
+    key = "user-memberships-permissions-{}-{}".format(user.id, _get_user_permissions_version(user.id))
+    memberships = cache.get(key)
+    if memberships is None:
+        Membership = apps.get_model("projects", "Membership")
+        memberships = {}
+        for project_id, is_admin, permissions in Membership.objects.filter(user=user)\
+                                                                   .values_list("project_id", "is_admin",
+                                                                                "role__permissions"):
+            memberships[project_id] = (is_admin, permissions or [])
+
+        cache.set(key, memberships, timeout=settings.USER_PERMISSIONS_CACHE_TIMEOUT)
+
+    return memberships
+
+
+def get_user_projects_ids_with_permission(user, permission):
+    """
+    Return the sorted ids of the projects where the user is admin or has
+    the permission by its role.
+    """
+    memberships = get_user_memberships_permissions(user)
+    return sorted(project_id for project_id, (is_admin, permissions) in memberships.items()
+                  if is_admin or permission in permissions)
+
+
+def get_user_permissions_for_projects(user, projects):
+    """
+    Return a dict {project id: permissions} with the permissions of an user
+    in many already loaded projects, with at most one query (for the
+    memberships of the user) for all of them.
+    """
+    memberships = get_user_memberships_permissions(user)
+
+    result = {}
+    for project in projects:
+        membership = memberships.get(project.id, None)
+        result[project.id] = calculate_permissions(
+            is_authenticated=user.is_authenticated(),
+            is_superuser=user.is_superuser,
+            is_member=membership is not None,
+            is_admin=membership is not None and membership[0],
+            role_permissions=membership[1] if membership is not None else [],
+            anon_permissions=project.anon_permissions,
+            public_permissions=project.public_permissions
+        )
+    return result
@@ -66,6 +66,51 @@ def disconnect_memberships_signals():
                                  dispatch_uid='create-notify-policy')
 
 
+## Permissions Signals
+
+def connect_permissions_signals():
+    from . import signals as handlers
+    # The projects where an user has a permission are cached until its
+    # memberships, or their roles, change.
+    signals.post_save.connect(handlers.update_user_permissions_version,
+                              sender=apps.get_model("projects", "Membership"),
+                              dispatch_uid="user_permissions_membership_post_save")
+    signals.post_delete.connect(handlers.update_user_permissions_version,
+                                sender=apps.get_model("projects", "Membership"),
+                                dispatch_uid="user_permissions_membership_post_delete")
+    signals.post_save.connect(handlers.update_project_members_permissions_version,
+                              sender=apps.get_model("users", "Role"),
+                              dispatch_uid="user_permissions_role_post_save")
+    signals.post_delete.connect(handlers.update_project_members_permissions_version,
+                                sender=apps.get_model("users", "Role"),
+                                dispatch_uid="user_permissions_role_post_delete")
+
+
+## Likes Signals
+
+def connect_likes_signals():
+    from . import signals as handlers
+    # Keep the project fans totals updated
+    signals.pre_save.connect(handlers.like_pre_save,
+                             sender=apps.get_model("likes", "Like"),
+                             dispatch_uid="like_pre_save")
+    signals.post_save.connect(handlers.like_post_save,
+                              sender=apps.get_model("likes", "Like"),
+                              dispatch_uid="like_post_save")
+    signals.post_delete.connect(handlers.like_post_delete,
+                                sender=apps.get_model("likes", "Like"),
+                                dispatch_uid="like_post_delete")
+
+
+def disconnect_likes_signals():
+    signals.pre_save.disconnect(sender=apps.get_model("likes", "Like"),
+                                dispatch_uid="like_pre_save")
+    signals.post_save.disconnect(sender=apps.get_model("likes", "Like"),
+                                 dispatch_uid="like_post_save")
+    signals.post_delete.disconnect(sender=apps.get_model("likes", "Like"),
+                                   dispatch_uid="like_post_delete")
+
+
 ## US Statuses Signals
 
 def connect_us_status_signals():
@@ -94,6 +139,68 @@ def disconnect_task_status_signals():
                                  dispatch_uid="try_to_close_or_open_user_stories_when_edit_task_status")
 
 
+## Filters data Signals
+
+FILTERS_DATA_MODELS = (("epics", "Epic"),
+                       ("userstories", "UserStory"),
+                       ("tasks", "Task"),
+                       ("issues", "Issue"),
+                       ("projects", "Membership"),
+                       ("custom_attributes", "EpicCustomAttribute"),
+                       ("custom_attributes", "UserStoryCustomAttribute"),
+                       ("custom_attributes", "TaskCustomAttribute"),
+                       ("custom_attributes", "IssueCustomAttribute"))
+
+FILTERS_DATA_CUSTOM_ATTRIBUTES_VALUES_MODELS = (("custom_attributes", "EpicCustomAttributesValues"),
+                                                ("custom_attributes", "UserStoryCustomAttributesValues"),
+                                                ("custom_attributes", "TaskCustomAttributesValues"),
+                                                ("custom_attributes", "IssueCustomAttributesValues"))
+
+FILTERS_DATA_CHOICES_MODELS = (("projects", "UserStoryStatus"),
+                               ("projects", "TaskStatus"),
+                               ("projects", "IssueStatus"),
+                               ("projects", "IssueType"),
+                               ("projects", "Priority"),
+                               ("projects", "Severity"),
+                               ("users", "Role"))
+
+
+def connect_filters_data_signals():
+    from . import signals as handlers
+    # The counters of the filters_data endpoints are cached until the items
+    # of the project, or the relations used to count them, change.
+    for app_label, model_name in FILTERS_DATA_MODELS:
+        signals.post_save.connect(handlers.update_filters_data_version,
+                                  sender=apps.get_model(app_label, model_name),
+                                  dispatch_uid="filters_data_{}_post_save".format(model_name.lower()))
+        signals.post_delete.connect(handlers.update_filters_data_version,
+                                    sender=apps.get_model(app_label, model_name),
+                                    dispatch_uid="filters_data_{}_post_delete".format(model_name.lower()))
+
+    # Deleting a choice moves its items to another one with a bulk update
+    for app_label, model_name in FILTERS_DATA_CHOICES_MODELS:
+        signals.post_delete.connect(handlers.update_filters_data_version,
+                                    sender=apps.get_model(app_label, model_name),
+                                    dispatch_uid="filters_data_{}_post_delete".format(model_name.lower()))
+
+    for app_label, model_name in FILTERS_DATA_CUSTOM_ATTRIBUTES_VALUES_MODELS:
+        signals.post_save.connect(handlers.update_filters_data_version_for_custom_attributes_values,
+                                  sender=apps.get_model(app_label, model_name),
+                                  dispatch_uid="filters_data_{}_post_save".format(model_name.lower()))
+
+    related_userstory_model = apps.get_model("epics", "RelatedUserStory")
+    signals.post_save.connect(handlers.update_filters_data_version_for_related_userstory,
+                              sender=related_userstory_model,
+                              dispatch_uid="filters_data_relateduserstory_post_save")
+    signals.post_delete.connect(handlers.update_filters_data_version_for_related_userstory,
+                                sender=related_userstory_model,
+                                dispatch_uid="filters_data_relateduserstory_post_delete")
+
+    signals.m2m_changed.connect(handlers.update_filters_data_version_for_assigned_users,
+                                sender=apps.get_model("userstories", "UserStory").assigned_users.through,
+                                dispatch_uid="filters_data_assigned_users_m2m_changed")
+
+
 class ProjectsAppConfig(AppConfig):
     name = "taiga.projects"
     verbose_name = "Projects"
@@ -101,5 +208,8 @@ class ProjectsAppConfig(AppConfig):
     def ready(self):
         connect_projects_signals()
         connect_memberships_signals()
+        connect_permissions_signals()
+        connect_likes_signals()
         connect_us_status_signals()
         connect_task_status_signals()
+        connect_filters_data_signals()
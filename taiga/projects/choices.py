@@ -37,3 +37,11 @@ BLOCKING_CODES = [
     (BLOCKED_BY_OWNER_LEAVING, _("This project is blocked because the owner left")),
     (BLOCKED_BY_DELETING, _("This project is blocked while it's deleted"))
 ]
+
+TOTALS_KIND_FANS = "fans"
+TOTALS_KIND_ACTIVITY = "activity"
+
+TOTALS_KINDS = [
+    (TOTALS_KIND_FANS, _("Fans")),
+    (TOTALS_KIND_ACTIVITY, _("Activity")),
+]
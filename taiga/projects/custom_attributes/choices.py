@@ -32,3 +32,6 @@ TYPES_CHOICES = (
     (DATE_TYPE, _("Date")),
     (URL_TYPE, _("Url"))
 )
+
+# The values of these types are counted in the filters_data endpoints
+FACETS_TYPES = (TEXT_TYPE, DATE_TYPE, URL_TYPE)
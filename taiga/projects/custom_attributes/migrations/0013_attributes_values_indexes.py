@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# NOTE: These indexes are needed by taiga.base.filters.CustomAttributesFilter
+#       (the "attributes_values @> ..." lookups of the equality filters).
+CREATE_INDEX = """
+    CREATE INDEX {table}_attributes_values_idx
+              ON {table}
+           USING gin(attributes_values jsonb_path_ops);
+"""
+
+DROP_INDEX = """
+    DROP INDEX IF EXISTS {table}_attributes_values_idx;
+"""
+
+
+def _attributes_values_index_operation(table):
+    return migrations.RunSQL([CREATE_INDEX.format(table=table)],
+                             [DROP_INDEX.format(table=table)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_attributes', '0012_auto_20161201_1628'),
+    ]
+
+    operations = [
+        _attributes_values_index_operation("custom_attributes_epiccustomattributesvalues"),
+        _attributes_values_index_operation("custom_attributes_userstorycustomattributesvalues"),
+        _attributes_values_index_operation("custom_attributes_taskcustomattributesvalues"),
+        _attributes_values_index_operation("custom_attributes_issuecustomattributesvalues"),
+    ]
@@ -59,7 +59,8 @@ class EpicViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
                        filters.WatchersFilter,
                        filters.QFilter,
                        filters.CreatedDateFilter,
-                       filters.ModifiedDateFilter)
+                       filters.ModifiedDateFilter,
+                       filters.CustomAttributesFilter)
     filter_fields = ["project",
                      "project__slug",
                      "assigned_to",
@@ -164,13 +165,18 @@ class EpicViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
         statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
         assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
         owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
+        # The custom attributes facet is counted without its own filter
+        common_filter_backends = (f for f in filter_backends if f != filters.CustomAttributesFilter)
 
         queryset = self.get_queryset()
         querysets = {
             "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
             "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
             "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset)
+            "tags": self.filter_queryset(queryset),
+            "common": self.filter_queryset(queryset, filter_backends=common_filter_backends),
+            "custom_attributes": self.filter_queryset(queryset, filter_backends=[filters.CustomAttributesFilter]),
+            "unfiltered": self.filter_queryset(queryset, filter_backends=[filters.FilterBackend]),
         }
         return response.Ok(services.get_epics_filters_data(project, querysets))
 
@@ -26,6 +26,7 @@ from django.db import connection
 from django.utils.translation import ugettext as _
 
 from taiga.base.utils import db, text
+from taiga.projects.services import facets
 from taiga.projects.epics.apps import connect_epics_signals
 from taiga.projects.epics.apps import disconnect_epics_signals
 from taiga.projects.services import apply_order_updates
@@ -418,16 +419,26 @@ def _get_epics_tags(project, queryset):
     return sorted(result, key=itemgetter("name"))
 
 
+EPICS_FACETS = (
+    facets.get_custom_attributes_facet("custom_attributes_epiccustomattributesvalues", "epic_id",
+                                       "custom_attributes_epiccustomattribute"),
+)
+
+
 def get_epics_filters_data(project, querysets):
     """
     Given a project and an epics queryset, return a simple data structure
     of all possible filters for the epics in the queryset.
     """
+    counts = facets.get_facets_counts(project, EPICS_FACETS, querysets)
+
     data = OrderedDict([
         ("statuses", _get_epics_statuses(project, querysets["statuses"])),
         ("assigned_to", _get_epics_assigned_to(project, querysets["assigned_to"])),
         ("owners", _get_epics_owners(project, querysets["owners"])),
         ("tags", _get_epics_tags(project, querysets["tags"])),
+        ("custom_attributes", facets.get_custom_attributes_facet_data(project.epiccustomattributes.all(),
+                                                                      counts["custom_attributes"])),
     ])
 
     return data
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.apps import apps
+from django.apps import AppConfig
+from django.db.models import signals
+
+
+class HistoryAppConfig(AppConfig):
+    name = "taiga.projects.history"
+    verbose_name = "History"
+
+    def ready(self):
+        from . import signal_handlers as handlers
+        from . import signals as history_signals
+        signals.post_save.connect(handlers.on_new_history_entry,
+                                  sender=apps.get_model("history", "HistoryEntry"),
+                                  dispatch_uid="history_values_diff_cache")
+        history_signals.history_entries_bulk_created.connect(handlers.on_new_history_entries_bulk,
+                                                             dispatch_uid="history_values_diff_cache_bulk")
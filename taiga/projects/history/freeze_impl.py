@@ -329,11 +329,8 @@ def epic_related_userstory_freezer(related_us) -> dict:
 
 
 def userstory_freezer(us) -> dict:
-    rp_cls = apps.get_model("userstories", "RolePoints")
-    rpqsd = rp_cls.objects.filter(user_story=us)
-
     points = {}
-    for rp in rpqsd:
+    for rp in us.role_points.all():
         points[str(rp.role_id)] = rp.points_id
 
     assigned_users = [u.id for u in us.assigned_users.all()]
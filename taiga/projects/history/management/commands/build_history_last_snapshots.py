@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.core.management.base import BaseCommand
+
+from taiga.projects.history.models import HistoryEntry, HistoryLastSnapshot
+from taiga.projects.history.services import build_last_snapshot_for_key
+
+
+class Command(BaseCommand):
+    help = "Build the last snapshot of the history keys that don't have it yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all",
+                            action="store_true",
+                            dest="all",
+                            default=False,
+                            help="Rebuild the last snapshots of every key, not only the missing ones")
+        parser.add_argument("--project",
+                            action="store",
+                            dest="project",
+                            default=None,
+                            help="Only build the keys of this project id")
+
+    def handle(self, *args, **options):
+        keys = HistoryEntry.objects.filter(is_snapshot=True)
+        if options["project"]:
+            keys = keys.filter(project_id=options["project"])
+
+        keys = keys.order_by("key").values_list("key", flat=True).distinct()
+        if not options["all"]:
+            existing_keys = set(HistoryLastSnapshot.objects.values_list("key", flat=True))
+        else:
+            existing_keys = set()
+
+        total = 0
+        for key in keys.iterator():
+            if key in existing_keys:
+                continue
+
+            build_last_snapshot_for_key(key)
+            total += 1
+            if total % 1000 == 0:
+                self.stdout.write("{} keys built".format(total))
+
+        self.stdout.write("{} keys built".format(total))
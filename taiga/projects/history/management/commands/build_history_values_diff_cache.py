@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.services import build_values_diff_cache
+
+
+def _init_worker():
+    # Never share the database connections inherited from the parent process
+    connections.close_all()
+
+
+def _build_values_diff_cache_worker(entry_ids):
+    return build_values_diff_cache(entry_ids)
+
+
+def _iter_batches(entry_ids, batch_size):
+    batch = []
+    for entry_id in entry_ids:
+        batch.append(entry_id)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Compute the values diff cache of the history entries that don't have it yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project",
+                            action="store",
+                            dest="project",
+                            default=None,
+                            help="Only build the entries of this project id")
+        parser.add_argument("--processes",
+                            action="store",
+                            dest="processes",
+                            type=int,
+                            default=None,
+                            help="Number of worker processes (default: number of cpus)")
+        parser.add_argument("--batch_size",
+                            action="store",
+                            dest="batch_size",
+                            type=int,
+                            default=500,
+                            help="Number of entries per worker task")
+
+    def handle(self, *args, **options):
+        qs = HistoryEntry.objects.filter(values_diff_cache__isnull=True)
+        if options["project"]:
+            qs = qs.filter(project_id=options["project"])
+
+        entry_ids = list(qs.order_by("created_at").values_list("id", flat=True))
+        batches = _iter_batches(entry_ids, options["batch_size"])
+
+        connections.close_all()
+        start = time.monotonic()
+        total = 0
+        with multiprocessing.Pool(options["processes"], initializer=_init_worker) as pool:
+            for updated in pool.imap_unordered(_build_values_diff_cache_worker, batches):
+                total += updated
+                elapsed = time.monotonic() - start
+                self.stdout.write("{}/{} entries - {:.1f} entries/sec".format(
+                    total, len(entry_ids), total / elapsed if elapsed else 0))
+
+        self.stdout.write("{} entries built".format(total))
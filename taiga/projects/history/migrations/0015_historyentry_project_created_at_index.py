@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0014_json_to_jsonb'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='historyentry',
+            index_together=set([('project', 'created_at', 'id')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import taiga.base.db.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0015_historyentry_project_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryLastSnapshot',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('entry_id', models.CharField(max_length=255)),
+                ('snapshot', taiga.base.db.models.fields.JSONField(blank=True, default=None, null=True)),
+                ('partial_diffs', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
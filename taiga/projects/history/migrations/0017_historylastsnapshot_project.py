@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# The project of every last snapshot is the one of its last entry. The last
+# snapshots of deleted objects, or without entries, are removed.
+POPULATE_PROJECT = """
+    UPDATE history_historylastsnapshot
+       SET project_id = history_historyentry.project_id
+      FROM history_historyentry
+     WHERE history_historyentry.id = history_historylastsnapshot.entry_id;
+
+    DELETE FROM history_historylastsnapshot
+          USING history_historyentry
+          WHERE history_historyentry.id = history_historylastsnapshot.entry_id
+            AND history_historyentry.type = 3;
+
+    DELETE FROM history_historylastsnapshot
+          WHERE project_id IS NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0048_auto_20160615_1508'),
+        ('history', '0016_historylastsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historylastsnapshot',
+            name='project',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='projects.Project'),
+        ),
+        migrations.RunSQL(POPULATE_PROJECT, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0017_historylastsnapshot_project'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historylastsnapshot',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='projects.Project'),
+        ),
+    ]
@@ -141,9 +141,12 @@ class HistoryEntry(models.Model):
 
     @property
     def values_diff(self):
-        if self.values_diff_cache is not None:
-            return self.values_diff_cache
+        if self.values_diff_cache is None:
+            self.refresh_values_diff_cache()
 
+        return self.values_diff_cache
+
+    def refresh_values_diff_cache(self):
         result = {}
         users_keys = ["assigned_to", "owner"]
 
@@ -318,7 +321,26 @@ class HistoryEntry(models.Model):
         self.values_diff_cache = result
         # Update values_diff_cache without dispatching signals
         HistoryEntry.objects.filter(pk=self.pk).update(values_diff_cache=self.values_diff_cache)
-        return self.values_diff_cache
 
     class Meta:
         ordering = ["created_at"]
+        index_together = [("project", "created_at", "id")]
+
+
+class HistoryLastSnapshot(models.Model):
+    """
+    Current frozen state of every history key, updated with each new
+    history entry so the next snapshot is diffed against it instead of
+    being rebuilt from the last complete snapshot and its partial diffs.
+    """
+    key = models.CharField(primary_key=True, max_length=255)
+    project = models.ForeignKey("projects.Project", on_delete=models.CASCADE)
+
+    # Id of the last history entry of the key
+    entry_id = models.CharField(max_length=255)
+
+    # Complete frozen object snapshot after the last entry
+    snapshot = JSONField(null=True, blank=True, default=None)
+
+    # Partial entries stored since the last complete snapshot
+    partial_diffs = models.PositiveIntegerField(default=0)
@@ -29,16 +29,20 @@ This is possible example:
           # Do something...
           history.persist_history(object, user=request.user)
 """
+import json
 import logging
 from collections import namedtuple
+from contextlib import closing
 from copy import deepcopy
 from functools import partial
 from functools import wraps
+from zlib import crc32
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.apps import apps
 from django.db import transaction as tx
+from django.db import connection
 from django_pglocks import advisory_lock
 
 from taiga.mdrender.service import render as mdrender
@@ -46,6 +50,7 @@ from taiga.base.utils.db import get_typename_for_model_class
 from taiga.base.utils.diff import make_diff as make_diff_from_dicts
 
 from .models import HistoryType
+from . import signals as history_signals
 
 # Freeze implementatitions
 from .freeze_impl import project_freezer
@@ -90,6 +95,23 @@ _deprecated_fields = {
     "userstories.userstory": frozenset(["assigned_to"]),
 }
 
+# Relations used by the freeze implementations (select_related and
+# prefetch_related lookups) loaded at once when freezing in bulk.
+_freeze_related_fields = {
+    "epics.epic": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "project__epiccustomattributes")),
+    "userstories.userstory": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "assigned_users", "role_points", "project__userstorycustomattributes")),
+    "tasks.task": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "project__taskcustomattributes")),
+    "issues.issue": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "project__issuecustomattributes")),
+}
+
 log = logging.getLogger("taiga.history")
 
 
@@ -202,6 +224,47 @@ def freeze_model_instance(obj: object) -> FrozenObj:
     return FrozenObj(key, snapshot)
 
 
+def freeze_model_instances_in_bulk(objects: list) -> list:
+    """
+    Creates new frozen objects from a list of model instances
+    of the same class.
+
+    Instances are reloaded with one query (plus one per prefetched
+    relation) instead of one per instance. Return a list of
+    (instance, frozen object) tuples, removed and repeated instances
+    are skipped.
+    """
+
+    if not objects:
+        return []
+
+    model_cls = objects[0].__class__
+    typename = get_typename_for_model_class(model_cls)
+    if typename not in _freeze_impl_map:
+        raise RuntimeError("No implementation found for {}".format(typename))
+
+    select_related, prefetch_related = _freeze_related_fields.get(typename, ((), ()))
+    qs = (model_cls.objects.filter(pk__in=[obj.pk for obj in objects])
+                           .select_related(*select_related)
+                           .prefetch_related(*prefetch_related))
+    objs_by_pk = {obj.pk: obj for obj in qs}
+
+    impl_fn = _freeze_impl_map[typename]
+    result = []
+    for obj in objects:
+        obj = objs_by_pk.pop(obj.pk, None)
+        if obj is None:
+            continue
+
+        snapshot = impl_fn(obj)
+        assert isinstance(snapshot, dict), \
+            "freeze handlers should return always a dict"
+
+        result.append((obj, FrozenObj(make_key_from_model_object(obj), snapshot)))
+
+    return result
+
+
 def is_hidden_snapshot(obj: FrozenDiff) -> bool:
     """
     Check if frozen object is considered
@@ -301,7 +364,12 @@ def _rebuild_snapshot_from_diffs(keysnapshot, partials):
     return result
 
 
-def get_last_snapshot_for_key(key: str) -> FrozenObj:
+def _rebuild_last_snapshot_for_key(key: str):
+    """
+    Rebuild the current frozen state of a key from its last complete snapshot
+    and the partial diffs stored after it. Return the frozen object, the
+    number of partial diffs and the id of the last history entry.
+    """
     entry_model = apps.get_model("history", "HistoryEntry")
 
     # Search last snapshot
@@ -311,7 +379,7 @@ def get_last_snapshot_for_key(key: str) -> FrozenObj:
 
     keysnapshot = qs.first()
     if keysnapshot is None:
-        return None, True
+        return None, 0, None
 
     # Get all partial snapshots
     entries = tuple(entry_model.objects
@@ -320,12 +388,103 @@ def get_last_snapshot_for_key(key: str) -> FrozenObj:
                     .order_by("created_at"))
 
     snapshot = _rebuild_snapshot_from_diffs(keysnapshot.snapshot, entries)
+    last_entry_id = entries[-1].id if entries else keysnapshot.id
+    return FrozenObj(keysnapshot.key, snapshot), len(entries), last_entry_id
+
+
+def _get_last_snapshot_state(key: str):
+    """
+    Get the current frozen state of a key, from its HistoryLastSnapshot if it
+    is up to date (one row instead of up to MAX_PARTIAL_DIFFS entries).
+
+    Return the frozen object, the number of partial diffs since the last
+    complete snapshot and the HistoryLastSnapshot (or None if it is missing).
+    """
+    entry_model = apps.get_model("history", "HistoryEntry")
+    last_snapshot_model = apps.get_model("history", "HistoryLastSnapshot")
+
+    last_snapshot = last_snapshot_model.objects.filter(key=key).first()
+    if last_snapshot is not None:
+        # History entries can be stored without take_snapshot (importers)
+        last_entry_id = (entry_model.objects.filter(key=key)
+                                            .order_by("-created_at")
+                                            .values_list("id", flat=True)
+                                            .first())
+        if last_entry_id == last_snapshot.entry_id:
+            return FrozenObj(key, last_snapshot.snapshot), last_snapshot.partial_diffs, last_snapshot
+
+    fobj, partial_diffs, last_entry_id = _rebuild_last_snapshot_for_key(key)
+    return fobj, partial_diffs, last_snapshot
+
+
+def _save_last_snapshot(key: str, entry: object, snapshot: dict, partial_diffs: int, last_snapshot=None):
+    last_snapshot_model = apps.get_model("history", "HistoryLastSnapshot")
+    values = {"project_id": entry.project_id, "entry_id": entry.id, "snapshot": snapshot,
+              "partial_diffs": partial_diffs}
+
+    if last_snapshot is not None:
+        last_snapshot_model.objects.filter(key=key).update(**values)
+    else:
+        last_snapshot_model.objects.create(key=key, **values)
+
+
+def get_last_snapshot_for_key(key: str) -> FrozenObj:
+    fobj, partial_diffs, last_snapshot = _get_last_snapshot_state(key)
+    if fobj is None:
+        return None, True
+
     max_partial_diffs = getattr(settings, "MAX_PARTIAL_DIFFS", 60)
+    return fobj, partial_diffs >= max_partial_diffs
+
+
+def build_last_snapshot_for_key(key: str):
+    """
+    Store the HistoryLastSnapshot of a key from its history entries.
+    """
+    entry_model = apps.get_model("history", "HistoryEntry")
+    last_snapshot_model = apps.get_model("history", "HistoryLastSnapshot")
 
-    if len(entries) >= max_partial_diffs:
-        return FrozenObj(keysnapshot.key, snapshot), True
+    with advisory_lock("history-"+key):
+        fobj, partial_diffs, last_entry_id = _rebuild_last_snapshot_for_key(key)
+        if fobj is None:
+            return None
+
+        last_entry = entry_model.objects.only("project_id", "type").get(id=last_entry_id)
+        if last_entry.type == HistoryType.delete:
+            # The object doesn't exist anymore
+            last_snapshot_model.objects.filter(key=key).delete()
+            return None
+
+        values = {"project_id": last_entry.project_id, "entry_id": last_entry_id,
+                  "snapshot": fobj.snapshot, "partial_diffs": partial_diffs}
+        last_snapshot, created = last_snapshot_model.objects.update_or_create(key=key, defaults=values)
+        return last_snapshot
+
+
+def _get_last_snapshot_states_in_bulk(keys: list) -> dict:
+    """
+    Same as _get_last_snapshot_state for a list of keys. Only the keys
+    without an up to date HistoryLastSnapshot are rebuilt one by one.
+    """
+    entry_model = apps.get_model("history", "HistoryEntry")
+    last_snapshot_model = apps.get_model("history", "HistoryLastSnapshot")
+
+    last_snapshots = {ls.key: ls for ls in last_snapshot_model.objects.filter(key__in=keys)}
+    last_entry_ids = dict(entry_model.objects.filter(key__in=list(last_snapshots.keys()))
+                                             .order_by("key", "-created_at")
+                                             .distinct("key")
+                                             .values_list("key", "id"))
+
+    states = {}
+    for key in keys:
+        last_snapshot = last_snapshots.get(key, None)
+        if last_snapshot is not None and last_entry_ids.get(key, None) == last_snapshot.entry_id:
+            states[key] = (FrozenObj(key, last_snapshot.snapshot), last_snapshot.partial_diffs, last_snapshot)
+        else:
+            fobj, partial_diffs, last_entry_id = _rebuild_last_snapshot_for_key(key)
+            states[key] = (fobj, partial_diffs, last_snapshot)
 
-    return FrozenObj(keysnapshot.key, snapshot), False
+    return states
 
 
 # Public api
@@ -366,7 +525,9 @@ def take_snapshot(obj: object, *, comment: str="", user=None,
         typename = get_typename_for_model_class(obj.__class__)
 
         new_fobj = freeze_model_instance(obj)
-        old_fobj, need_real_snapshot = get_last_snapshot_for_key(key)
+        old_fobj, partial_diffs, last_snapshot = _get_last_snapshot_state(key)
+        need_real_snapshot = (old_fobj is None or
+                              partial_diffs >= getattr(settings, "MAX_PARTIAL_DIFFS", 60))
 
         # migrate diff to latest schema
         if old_fobj:
@@ -419,7 +580,138 @@ def take_snapshot(obj: object, *, comment: str="", user=None,
             "is_snapshot": need_real_snapshot,
         }
 
-        return entry_model.objects.create(**kwargs)
+        entry = entry_model.objects.create(**kwargs)
+        if entry_type == HistoryType.delete:
+            # The object doesn't exist anymore, its key can't be diffed again
+            apps.get_model("history", "HistoryLastSnapshot").objects.filter(key=key).delete()
+        else:
+            _save_last_snapshot(key, entry, fdiff.snapshot, 0 if need_real_snapshot else partial_diffs + 1,
+                                last_snapshot=last_snapshot)
+        return entry
+
+
+def _lock_history_keys_in_bulk(keys: list):
+    """
+    Take the advisory locks of some history keys (the same ones than
+    `advisory_lock("history-"+key)`) with one query, until the end of
+    the current transaction. Keys are locked in order.
+    """
+    lock_ids = []
+    for key in keys:
+        # Same lock id than django_pglocks for string keys
+        pos = crc32("history-{}".format(key).encode("utf-8"))
+        lock_id = (2 ** 31 - 1) & pos
+        if pos & 2 ** 31:
+            lock_id -= 2 ** 31
+        lock_ids.append(lock_id)
+
+    sql = """
+        SELECT pg_advisory_xact_lock(lock_id)
+          FROM (SELECT unnest(%s::bigint[]) AS lock_id ORDER BY 1) lock_ids
+    """
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, [sorted(set(lock_ids))])
+
+
+@tx.atomic
+def take_snapshots_in_bulk(objects: list, user=None) -> list:
+    """
+    Same as take_snapshot for a list of model instances of the same
+    class (used by bulk operations, like moving user stories to a sprint).
+
+    Objects are frozen and diffed in memory and their history entries
+    are stored with one bulk insert. The history_entries_bulk_created
+    signal is sent once with all the new entries, so their side effects
+    (values diff, timelines, webhooks...) are handled in batch.
+    """
+    if not objects:
+        return []
+
+    entry_model = apps.get_model("history", "HistoryEntry")
+    last_snapshot_model = apps.get_model("history", "HistoryLastSnapshot")
+
+    typename = get_typename_for_model_class(objects[0].__class__)
+    keys = sorted(set(make_key_from_model_object(obj) for obj in objects))
+    max_partial_diffs = getattr(settings, "MAX_PARTIAL_DIFFS", 60)
+    excluded_fields = get_excluded_fields(typename)
+    not_important_fields = _not_important_fields.get(typename, frozenset())
+
+    user_id = None if user is None else user.id
+    user_name = "" if user is None else user.get_full_name()
+
+    entries = []
+    last_snapshots = []
+    # Keys are locked in order to avoid deadlocks with other bulk snapshots
+    _lock_history_keys_in_bulk(keys)
+
+    frozen_objs = freeze_model_instances_in_bulk(objects)
+    states = _get_last_snapshot_states_in_bulk([fobj.key for obj, fobj in frozen_objs])
+
+    # Bulk operations usually change the same values on every object (the
+    # milestone, the status...) and values only depend on those fields.
+    values_cache = {}
+
+    for obj, new_fobj in frozen_objs:
+        key = new_fobj.key
+        old_fobj, partial_diffs, _ = states[key]
+        need_real_snapshot = old_fobj is None or partial_diffs >= max_partial_diffs
+
+        # migrate diff to latest schema
+        if old_fobj:
+            old_fobj = migrate_to_last_version(typename, old_fobj)
+
+        fdiff = make_diff(old_fobj, new_fobj, excluded_fields)
+
+        # If diff is empty, do not create empty history entry
+        if not fdiff.diff and old_fobj is not None:
+            continue
+
+        values_key = json.dumps({k: v for k, v in fdiff.diff.items() if k not in not_important_fields},
+                                sort_keys=True, default=str)
+        if values_key not in values_cache:
+            values_cache[values_key] = make_diff_values(typename, fdiff)
+
+        entry = entry_model(user={"pk": user_id, "name": user_name},
+                            project_id=getattr(obj, 'project_id', getattr(obj, 'id', None)),
+                            key=key,
+                            type=HistoryType.change if old_fobj else HistoryType.create,
+                            snapshot=fdiff.snapshot if need_real_snapshot else None,
+                            diff=fdiff.diff,
+                            values=deepcopy(values_cache[values_key]),
+                            comment="",
+                            comment_html="",
+                            is_hidden=is_hidden_snapshot(fdiff),
+                            is_snapshot=need_real_snapshot)
+        entries.append(entry)
+        last_snapshots.append(last_snapshot_model(key=key,
+                                                  project_id=entry.project_id,
+                                                  entry_id=entry.id,
+                                                  snapshot=fdiff.snapshot,
+                                                  partial_diffs=0 if need_real_snapshot else partial_diffs + 1))
+
+    entry_model.objects.bulk_create(entries)
+    last_snapshot_model.objects.filter(key__in=[ls.key for ls in last_snapshots]).delete()
+    last_snapshot_model.objects.bulk_create(last_snapshots)
+
+    if entries:
+        history_signals.history_entries_bulk_created.send(sender=entry_model, entries=entries)
+
+    return entries
+
+
+def build_values_diff_cache(entry_ids: list) -> int:
+    """
+    Compute and store the values_diff_cache of the history entries
+    that don't have it yet. Return the number of updated entries.
+    """
+    entry_model = apps.get_model("history", "HistoryEntry")
+
+    total = 0
+    for entry in entry_model.objects.filter(id__in=entry_ids, values_diff_cache__isnull=True):
+        entry.refresh_values_diff_cache()
+        total += 1
+
+    return total
 
 
 # High level query api
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from django.conf import settings
+from django.db import connection
+
+from .tasks import build_values_diff_cache
+
+
+def on_new_history_entry(sender, instance, created, **kwargs):
+    if not created or instance.values_diff_cache is not None:
+        return
+
+    # Compute the values diff out of the request so reads (API, timeline,
+    # notifications and webhooks) find it cached.
+    entry_ids = [instance.id]
+    if settings.CELERY_ENABLED:
+        connection.on_commit(lambda: build_values_diff_cache.delay(entry_ids))
+    else:
+        connection.on_commit(lambda: build_values_diff_cache(entry_ids))
+
+
+def on_new_history_entries_bulk(sender, entries, **kwargs):
+    entry_ids = [entry.id for entry in entries if entry.values_diff_cache is None]
+    if not entry_ids:
+        return
+
+    if settings.CELERY_ENABLED:
+        connection.on_commit(lambda: build_values_diff_cache.delay(entry_ids))
+    else:
+        connection.on_commit(lambda: build_values_diff_cache(entry_ids))
@@ -63,6 +63,7 @@ class IssueViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, W
                        filters.CreatedDateFilter,
                        filters.ModifiedDateFilter,
                        filters.FinishedDateFilter,
+                       filters.CustomAttributesFilter,
                        filters.OrderByFilterMixin)
     filter_fields = ("project",
                      "project__slug",
@@ -183,25 +184,25 @@ class IssueViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, W
         project = get_object_or_404(Project, id=project_id)
 
         filter_backends = self.get_filter_backends()
-        types_filter_backends = (f for f in filter_backends if f != filters.IssueTypesFilter)
-        statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
-        owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
-        priorities_filter_backends = (f for f in filter_backends if f != filters.PrioritiesFilter)
-        severities_filter_backends = (f for f in filter_backends if f != filters.SeveritiesFilter)
-        roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
+        facets_filter_backends = {
+            "types": filters.IssueTypesFilter,
+            "statuses": filters.StatusesFilter,
+            "assigned_to": filters.AssignedToFilter,
+            "owners": filters.OwnersFilter,
+            "priorities": filters.PrioritiesFilter,
+            "severities": filters.SeveritiesFilter,
+            "roles": filters.RoleFilter,
+            "custom_attributes": filters.CustomAttributesFilter,
+        }
+        common_filter_backends = [f for f in filter_backends if f not in facets_filter_backends.values()]
 
         queryset = self.get_queryset()
         querysets = {
-            "types": self.filter_queryset(queryset, filter_backends=types_filter_backends),
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "priorities": self.filter_queryset(queryset, filter_backends=priorities_filter_backends),
-            "severities": self.filter_queryset(queryset, filter_backends=severities_filter_backends),
-            "tags": self.filter_queryset(queryset),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
+            "common": self.filter_queryset(queryset, filter_backends=common_filter_backends),
+            "unfiltered": self.filter_queryset(queryset, filter_backends=[filters.FilterBackend]),
         }
+        for facet, facet_filter_backend in facets_filter_backends.items():
+            querysets[facet] = self.filter_queryset(queryset, filter_backends=[facet_filter_backend])
         return response.Ok(services.get_issues_filters_data(project, querysets))
 
     @list_route(methods=["GET"])
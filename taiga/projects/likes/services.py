@@ -37,8 +37,6 @@ def add_like(obj, user):
     obj_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(obj)
     with atomic():
         like, created = Like.objects.get_or_create(content_type=obj_type, object_id=obj.id, user=user)
-        if like.project is not None:
-            like.project.refresh_totals()
 
     return like
 
@@ -58,13 +56,8 @@ def remove_like(obj, user):
         if not qs.exists():
             return
 
-        like = qs.first()
-        project = like.project
         qs.delete()
 
-        if project is not None:
-            project.refresh_totals()
-
 
 def get_fans(obj):
     """Get the fans of an object.
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0059_auto_20170116_1633'),
+        ('likes', '0002_auto_20151130_2230'),
+        ('timeline', '0007_auto_20170406_0615'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTotalsBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('fans', 'Fans'), ('activity', 'Activity')], max_length=10, verbose_name='kind')),
+                ('day', models.DateField(verbose_name='day')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals_buckets', to='projects.Project', verbose_name='project')),
+            ],
+            options={
+                'verbose_name': 'project totals bucket',
+                'verbose_name_plural': 'project totals buckets',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='projecttotalsbucket',
+            unique_together=set([('project', 'kind', 'day')]),
+        ),
+        # Backfill the buckets from the existing likes and timeline entries
+        migrations.RunSQL(
+            """
+            INSERT INTO projects_projecttotalsbucket (project_id, kind, day, count)
+                 SELECT likes_like.object_id, 'fans', (likes_like.created_date AT TIME ZONE 'UTC')::date, COUNT(*)
+                   FROM likes_like
+             INNER JOIN django_content_type ON django_content_type.id = likes_like.content_type_id
+             INNER JOIN projects_project ON projects_project.id = likes_like.object_id
+                  WHERE django_content_type.app_label = 'projects'
+                    AND django_content_type.model = 'project'
+               GROUP BY likes_like.object_id, (likes_like.created_date AT TIME ZONE 'UTC')::date;
+
+            INSERT INTO projects_projecttotalsbucket (project_id, kind, day, count)
+                 SELECT projects_project.id, 'activity', (timeline_timeline.created AT TIME ZONE 'UTC')::date, COUNT(*)
+                   FROM timeline_timeline
+             INNER JOIN projects_project ON timeline_timeline.namespace = 'project:' || projects_project.id
+               GROUP BY projects_project.id, (timeline_timeline.created AT TIME ZONE 'UTC')::date;
+            """,
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
@@ -50,8 +50,6 @@ from taiga.projects.notifications.services import (
     set_notify_policy_level_to_ignore,
     create_notify_policy_if_not_exists)
 
-from taiga.timeline.service import build_project_namespace
-
 from . import choices
 
 from dateutil.relativedelta import relativedelta
@@ -301,38 +299,37 @@ class Project(ProjectDefaults, TaggedMixin, TagsColorsMixin, models.Model):
             super().save(*args, **kwargs)
 
     def refresh_totals(self, save=True):
+        """
+        Update the fans and activity totals from the per-day buckets
+        maintained by `taiga.projects.services.totals`. Windows are
+        computed with day granularity.
+        """
         now = timezone.now()
         self.totals_updated_datetime = now
 
-        Like = apps.get_model("likes", "Like")
-        content_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(Project)
-        qs = Like.objects.filter(content_type=content_type, object_id=self.id)
-
-        self.total_fans = qs.count()
-
-        qs_week = qs.filter(created_date__gte=now - relativedelta(weeks=1))
-        self.total_fans_last_week = qs_week.count()
-
-        qs_month = qs.filter(created_date__gte=now - relativedelta(months=1))
-        self.total_fans_last_month = qs_month.count()
-
-        qs_year = qs.filter(created_date__gte=now - relativedelta(years=1))
-        self.total_fans_last_year = qs_year.count()
-
-        tl_model = apps.get_model("timeline", "Timeline")
-        namespace = build_project_namespace(self)
-
-        qs = tl_model.objects.filter(namespace=namespace)
-        self.total_activity = qs.count()
-
-        qs_week = qs.filter(created__gte=now - relativedelta(weeks=1))
-        self.total_activity_last_week = qs_week.count()
-
-        qs_month = qs.filter(created__gte=now - relativedelta(months=1))
-        self.total_activity_last_month = qs_month.count()
-
-        qs_year = qs.filter(created__gte=now - relativedelta(years=1))
-        self.total_activity_last_year = qs_year.count()
+        def sum_since(day):
+            return models.Sum(models.Case(models.When(day__gte=day, then="count"),
+                                          default=0, output_field=models.IntegerField()))
+
+        qs = self.totals_buckets.values("kind").annotate(
+            total=models.Sum("count"),
+            last_week=sum_since((now - relativedelta(weeks=1)).date()),
+            last_month=sum_since((now - relativedelta(months=1)).date()),
+            last_year=sum_since((now - relativedelta(years=1)).date()),
+        )
+        totals = {row["kind"]: row for row in qs}
+
+        fans = totals.get(choices.TOTALS_KIND_FANS, {})
+        self.total_fans = fans.get("total", 0)
+        self.total_fans_last_week = fans.get("last_week", 0)
+        self.total_fans_last_month = fans.get("last_month", 0)
+        self.total_fans_last_year = fans.get("last_year", 0)
+
+        activity = totals.get(choices.TOTALS_KIND_ACTIVITY, {})
+        self.total_activity = activity.get("total", 0)
+        self.total_activity_last_week = activity.get("last_week", 0)
+        self.total_activity_last_month = activity.get("last_month", 0)
+        self.total_activity_last_year = activity.get("last_year", 0)
 
         if save:
             self.save(update_fields=[
@@ -504,6 +501,23 @@ class Project(ProjectDefaults, TaggedMixin, TagsColorsMixin, models.Model):
             connect_memberships_signals()
 
 
+class ProjectTotalsBucket(models.Model):
+    project = models.ForeignKey("Project", null=False, blank=False,
+                                related_name="totals_buckets", verbose_name=_("project"))
+    kind = models.CharField(max_length=10, null=False, blank=False, choices=choices.TOTALS_KINDS,
+                            verbose_name=_("kind"))
+    day = models.DateField(null=False, blank=False, verbose_name=_("day"))
+    count = models.IntegerField(null=False, blank=False, default=0, verbose_name=_("count"))
+
+    class Meta:
+        verbose_name = "project totals bucket"
+        verbose_name_plural = "project totals buckets"
+        unique_together = ("project", "kind", "day")
+
+    def __str__(self):
+        return "{} {} {}: {}".format(self.project_id, self.kind, self.day, self.count)
+
+
 class ProjectModulesConfig(models.Model):
     project = models.OneToOneField("Project", null=False, blank=False,
                                    related_name="modules_config", verbose_name=_("project"))
@@ -21,13 +21,36 @@ from django.core.management.base import BaseCommand
 
 from taiga.base.utils.iterators import iter_queryset
 from taiga.projects.notifications.models import HistoryChangeNotification
-from taiga.projects.notifications.services import send_sync_notifications
+from taiga.projects.notifications.services import (send_sync_notifications,
+                                                   process_due_notifications,
+                                                   get_notifications_queue_metrics)
 
 from django_pglocks import advisory_lock
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument("--worker",
+                            action="store_true",
+                            dest="worker",
+                            default=False,
+                            help="Claim the due notifications in batches, skipping the ones locked by "
+                                 "other workers, so several processes can run at the same time")
+        parser.add_argument("--batch_size",
+                            action="store",
+                            dest="batch_size",
+                            type=int,
+                            default=100,
+                            help="Number of notifications claimed at once in worker mode")
+
     def handle(self, *args, **options):
+        if options["worker"]:
+            self.print_metrics("before")
+            total = process_due_notifications(batch_size=options["batch_size"])
+            self.stdout.write("{} notifications processed".format(total))
+            self.print_metrics("after")
+            return
+
         with advisory_lock("send-notifications-command", wait=False) as acquired:
             if acquired:
                 qs = HistoryChangeNotification.objects.all()
@@ -38,3 +61,7 @@ class Command(BaseCommand):
                         pass
             else:
                 print("Other process already running")
+
+    def print_metrics(self, when):
+        metrics = get_notifications_queue_metrics()
+        self.stdout.write("Queue {}: {depth} pending, {due} due, oldest {oldest_age:.0f}s".format(when, **metrics))
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notifypolicy_live_notify_level'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historychangenotification',
+            name='updated_datetime',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='updated date time'),
+        ),
+    ]
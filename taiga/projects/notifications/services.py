@@ -17,14 +17,17 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import datetime
+import logging
 
-from functools import partial
+from collections import defaultdict
+from html import escape
 
 from django.apps import apps
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Q, Case, Count, IntegerField, Min, Sum, When
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import ugettext as _
@@ -37,13 +40,17 @@ from taiga.projects.history.choices import HistoryType
 from taiga.projects.history.services import (make_key_from_model_object,
                                              get_last_snapshot_for_key,
                                              get_model_from_key)
-from taiga.permissions.services import user_has_perm
+from taiga.base.utils.db import get_typename_for_model_class
+from taiga.permissions.services import calculate_permissions
 from taiga.events import events
 
 from .models import HistoryChangeNotification, Watched
 from .squashing import squash_history_entries
 
 
+logger = logging.getLogger(__name__)
+
+
 def notify_policy_exists(project, user) -> bool:
     """
     Check if policy exists for specified project
@@ -118,73 +125,175 @@ def analize_object_for_watchers(obj: object, comment: str, user: object):
         obj.add_watcher(user)
 
 
-def _filter_by_permissions(obj, user):
-    UserStory = apps.get_model("userstories", "UserStory")
-    Issue = apps.get_model("issues", "Issue")
-    Task = apps.get_model("tasks", "Task")
-    Epic = apps.get_model("epics", "Epic")
-    WikiPage = apps.get_model("wiki", "WikiPage")
-
-    if isinstance(obj, UserStory):
-        return user_has_perm(user, "view_us", obj, cache="project")
-    elif isinstance(obj, Issue):
-        return user_has_perm(user, "view_issues", obj, cache="project")
-    elif isinstance(obj, Task):
-        return user_has_perm(user, "view_tasks", obj, cache="project")
-    elif isinstance(obj, Epic):
-        return user_has_perm(user, "view_epics", obj, cache="project")
-    elif isinstance(obj, WikiPage):
-        return user_has_perm(user, "view_wiki_pages", obj, cache="project")
-    return False
+# Permission needed to be notified about the changes of an object
+_view_permissions = {
+    "userstories.userstory": "view_us",
+    "issues.issue": "view_issues",
+    "tasks.task": "view_tasks",
+    "epics.epic": "view_epics",
+    "wiki.wikipage": "view_wiki_pages",
+}
 
 
-def _filter_notificable(user):
-    return user.is_active and not user.is_system
+def _get_notification_candidates(obj, *, history=None, discard_users=None):
+    """
+    Get, with a single query, the active users that can be notified about
+    the changes of the object. Each user has the attributes:
 
+    - is_hard: the user is a project member or watches the project.
+    - is_light: the user watches or participates in the object.
+    - policy_id, notify_level, live_notify_level: its notify policy.
+    - is_member, is_admin, role_permissions: its project membership.
+    """
+    project = obj.get_project()
+    content_type = ContentType.objects.get_for_model(obj)
 
-def get_users_to_notify(obj, *, history=None, discard_users=None, live=False) -> list:
+    # Owner and assigned user, and if the history is an unassignment
+    # change we should notify that user too
+    involved_ids = [getattr(obj, "owner_id", None), getattr(obj, "assigned_to_id", None)]
+    if history and history.type == HistoryType.change and "assigned_to" in history.diff:
+        involved_ids += history.diff["assigned_to"]
+
+    sql = """
+        WITH candidates AS (
+            SELECT user_id,
+                   bool_or(is_hard) AS is_hard,
+                   bool_or(NOT is_hard) AS is_light
+              FROM (
+                   SELECT user_id, TRUE AS is_hard
+                     FROM projects_membership
+                    WHERE project_id = %(project_id)s
+                UNION ALL
+                   SELECT user_id, TRUE AS is_hard
+                     FROM notifications_notifypolicy
+                    WHERE project_id = %(project_id)s
+                      AND notify_level <> %(level_none)s
+                UNION ALL
+                   SELECT user_id, FALSE AS is_hard
+                     FROM notifications_watched
+                    WHERE content_type_id = %(content_type_id)s
+                      AND object_id = %(object_id)s
+                UNION ALL
+                   SELECT unnest(%(involved_ids)s::int[]) AS user_id, FALSE AS is_hard
+              ) AS sources
+             WHERE user_id IS NOT NULL
+               AND NOT user_id = ANY(%(discard_ids)s::int[])
+          GROUP BY user_id
+        )
+        SELECT users_user.*,
+               candidates.is_hard,
+               candidates.is_light,
+               notifications_notifypolicy.id AS policy_id,
+               notifications_notifypolicy.notify_level,
+               notifications_notifypolicy.live_notify_level,
+               projects_membership.id IS NOT NULL AS is_member,
+               COALESCE(projects_membership.is_admin, FALSE) AS is_admin,
+               users_role.permissions AS role_permissions
+          FROM candidates
+    INNER JOIN users_user
+            ON users_user.id = candidates.user_id
+     LEFT JOIN notifications_notifypolicy
+            ON notifications_notifypolicy.user_id = candidates.user_id
+           AND notifications_notifypolicy.project_id = %(project_id)s
+     LEFT JOIN projects_membership
+            ON projects_membership.user_id = candidates.user_id
+           AND projects_membership.project_id = %(project_id)s
+     LEFT JOIN users_role
+            ON users_role.id = projects_membership.role_id
+         WHERE users_user.is_active
+           AND NOT users_user.is_system
     """
-    Get filtered set of users to notify for specified
-    model instance and changer.
 
-    NOTE: changer at this momment is not used.
-    NOTE: analogouts to obj.get_watchers_to_notify(changer)
+    params = {
+        "project_id": project.id,
+        "level_none": NotifyLevel.none,
+        "content_type_id": content_type.id,
+        "object_id": obj.id,
+        "involved_ids": [user_id for user_id in involved_ids if user_id is not None],
+        "discard_ids": [user.id for user in discard_users or []],
+    }
+    return list(get_user_model().objects.raw(sql, params))
+
+
+def _create_missing_notify_policies(project, users):
     """
-    project = obj.get_project()
+    Create, in bulk, the default notify policy of the users without it.
+    """
+    model_cls = apps.get_model("notifications", "NotifyPolicy")
+    now = timezone.now()
 
-    def _check_level(project: object, user: object, levels: tuple) -> bool:
-        policy = project.cached_notify_policy_for_user(user)
-        if live:
-            return policy.live_notify_level in levels
-        return policy.notify_level in levels
+    policies = []
+    for user in users:
+        if user.policy_id is not None:
+            continue
 
-    _can_notify_hard = partial(_check_level, project,
-                               levels=[NotifyLevel.all])
-    _can_notify_light = partial(_check_level, project,
-                                levels=[NotifyLevel.all, NotifyLevel.involved])
+        user.notify_level = NotifyLevel.involved
+        user.live_notify_level = NotifyLevel.involved
+        policies.append(model_cls(project=project,
+                                  user=user,
+                                  notify_level=user.notify_level,
+                                  live_notify_level=user.live_notify_level,
+                                  created_at=now,
+                                  modified_at=now))
 
-    candidates = set()
-    candidates.update(filter(_can_notify_hard, project.members.all()))
-    candidates.update(filter(_can_notify_hard, obj.project.get_watchers()))
-    candidates.update(filter(_can_notify_light, obj.get_watchers()))
-    candidates.update(filter(_can_notify_light, obj.get_participants()))
+    if policies:
+        model_cls.objects.bulk_create(policies)
+        if "cached_notify_policies" in project.__dict__:
+            del project.cached_notify_policies
 
-    # If the history is an unassignment change we should notify that user too
-    if history and history.type == HistoryType.change and "assigned_to" in history.diff:
-        assigned_to_users = get_user_model().objects.filter(id__in=history.diff["assigned_to"])
-        candidates.update(filter(_can_notify_light, assigned_to_users))
 
-    # Remove the changer from candidates
-    if discard_users:
-        candidates = candidates - set(discard_users)
+def _can_view(project, perm, user):
+    permissions = calculate_permissions(is_authenticated=True,
+                                        is_superuser=user.is_superuser,
+                                        is_member=user.is_member,
+                                        is_admin=user.is_admin,
+                                        role_permissions=user.role_permissions or [],
+                                        anon_permissions=project.anon_permissions,
+                                        public_permissions=project.public_permissions)
+    return perm in permissions
 
-    # Filter by object permissions
-    candidates = set(filter(partial(_filter_by_permissions, obj), candidates))
 
-    # Filter disabled and system users
-    candidates = set(filter(partial(_filter_notificable), candidates))
+def _check_level(user, level):
+    if user.is_hard and level == NotifyLevel.all:
+        return True
+    return user.is_light and level in (NotifyLevel.all, NotifyLevel.involved)
 
-    return frozenset(candidates)
+
+def get_users_to_notify_by_channel(obj, *, history=None, discard_users=None) -> tuple:
+    """
+    Get the filtered sets of users to notify by email and live for
+    specified model instance.
+
+    Members and project watchers are notified if their notify level is
+    "all", object watchers and participants if it is "all" or "involved".
+    Users without permissions to view the object, disabled and system
+    users are discarded.
+    """
+    perm = _view_permissions.get(get_typename_for_model_class(obj.__class__), None)
+    if perm is None:
+        return frozenset(), frozenset()
+
+    project = obj.get_project()
+    candidates = _get_notification_candidates(obj, history=history, discard_users=discard_users)
+    _create_missing_notify_policies(project, candidates)
+
+    candidates = [user for user in candidates if _can_view(project, perm, user)]
+    notify_users = frozenset(user for user in candidates if _check_level(user, user.notify_level))
+    live_notify_users = frozenset(user for user in candidates if _check_level(user, user.live_notify_level))
+    return notify_users, live_notify_users
+
+
+def get_users_to_notify(obj, *, history=None, discard_users=None, live=False) -> list:
+    """
+    Get filtered set of users to notify for specified
+    model instance and changer.
+
+    NOTE: changer at this momment is not used.
+    NOTE: analogouts to obj.get_watchers_to_notify(changer)
+    """
+    notify_users, live_notify_users = get_users_to_notify_by_channel(obj, history=history,
+                                                                      discard_users=discard_users)
+    return live_notify_users if live else notify_users
 
 
 def _resolve_template_name(model: object, *, change_type: int) -> str:
@@ -207,6 +316,50 @@ def _resolve_template_name(model: object, *, change_type: int) -> str:
                        change=change_type)
 
 
+class _RecipientPlaceholder:
+    """
+    Stands for the recipient of a notification email while it is rendered,
+    its name is replaced later in the email of every user.
+    """
+    email = "recipient@taiga.invalid"
+    full_name = "%%taiga-recipient-full-name%%"
+
+    def get_full_name(self):
+        return self.full_name
+
+    def __str__(self):
+        return self.full_name
+
+
+def _make_recipient_email(rendered_email, user, connection):
+    """
+    Given a notification email rendered for _RecipientPlaceholder, return
+    a copy of it for the specified user.
+    """
+    full_name = user.get_full_name()
+    html_full_name = escape(full_name)
+
+    def _replace(text, value):
+        return text.replace(_RecipientPlaceholder.full_name, value)
+
+    if rendered_email.content_subtype == "html":
+        body = _replace(rendered_email.body, html_full_name)
+    else:
+        body = _replace(rendered_email.body, full_name)
+
+    email = EmailMultiAlternatives(subject=_replace(rendered_email.subject, full_name),
+                                   body=body,
+                                   from_email=rendered_email.from_email,
+                                   to=[user.email],
+                                   headers=dict(rendered_email.extra_headers),
+                                   connection=connection)
+    email.content_subtype = rendered_email.content_subtype
+    for content, mimetype in rendered_email.alternatives:
+        email.attach_alternative(_replace(content, html_full_name), mimetype)
+
+    return email
+
+
 def _make_template_mail(name: str):
     """
     Helper that creates a adhoc djmail template email
@@ -238,16 +391,15 @@ def send_notifications(obj, *, history):
 
     # Get a complete list of notifiable users for current
     # object and send the change notification to them.
-    notify_users = get_users_to_notify(obj, history=history, discard_users=[notification.owner])
+    notify_users, live_notify_users = get_users_to_notify_by_channel(obj, history=history,
+                                                                      discard_users=[notification.owner])
     notification.notify_users.add(*notify_users)
 
     # If we are the min interval is 0 it just work in a synchronous and spamming way
     if settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL == 0:
         send_sync_notifications(notification.id)
 
-    live_notify_users = get_users_to_notify(obj, history=history, discard_users=[notification.owner], live=True)
-    for user in live_notify_users:
-        events.emit_live_notification_for_model(obj, user, history)
+    events.emit_live_notifications_for_model(obj, live_notify_users, history)
 
 
 @transaction.atomic
@@ -265,6 +417,13 @@ def send_sync_notifications(notification_id):
     if time_diff.seconds < settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL:
         return
 
+    _send_notification_emails(notification)
+
+
+def _send_notification_emails(notification):
+    """
+    Send the emails of a locked notification and delete it.
+    """
     history_entries = tuple(notification.history_entries.all().order_by("created_at"))
     history_entries = list(squash_history_entries(history_entries))
 
@@ -314,11 +473,22 @@ def send_sync_notifications(notification_id):
         "List-Unsubscribe": "<{unsubscribe_url}>".format(**format_args),
     }
 
+    users_by_lang = defaultdict(list)
     for user in notification.notify_users.distinct():
-        context["user"] = user
-        context["lang"] = user.lang or settings.LANGUAGE_CODE
-        email.send(user.email, context, headers=headers)
+        users_by_lang[user.lang or settings.LANGUAGE_CODE].append(user)
 
+    # Render the email once per language and send all the messages
+    # with the same connection.
+    connection = get_connection()
+    messages = []
+    for lang, users in users_by_lang.items():
+        context["user"] = _RecipientPlaceholder()
+        context["lang"] = lang
+        rendered_email = email.make_email_object(_RecipientPlaceholder.email, context, headers=headers)
+        messages += [_make_recipient_email(rendered_email, user, connection) for user in users]
+
+    if messages:
+        connection.send_messages(messages)
 
     notification.delete()
 
@@ -328,6 +498,60 @@ def process_sync_notifications():
         send_sync_notifications(notification.pk)
 
 
+def _get_due_notifications_queryset():
+    min_updated_datetime = timezone.now() - datetime.timedelta(seconds=settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL)
+    return HistoryChangeNotification.objects.filter(updated_datetime__lte=min_updated_datetime)
+
+
+def process_due_notifications(batch_size=100):
+    """
+    Send the notifications whose last change is older than
+    CHANGE_NOTIFICATIONS_MIN_INTERVAL, claiming them in batches with
+    SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL 9.5+) so several
+    processes can drain the queue at the same time. Return the number of
+    sent notifications, the failed ones stay in the queue.
+    """
+    total = 0
+    failed_ids = []
+    while True:
+        with transaction.atomic():
+            notifications = list(_get_due_notifications_queryset().exclude(id__in=failed_ids)
+                                                                   .select_for_update(skip_locked=True)
+                                                                   .order_by("updated_datetime")[:batch_size])
+            for notification in notifications:
+                try:
+                    with transaction.atomic():
+                        _send_notification_emails(notification)
+                except Exception:
+                    # Leave it in the queue, it will be retried on the next run
+                    logger.exception("Error sending the change notification %s", notification.id)
+                    failed_ids.append(notification.id)
+                else:
+                    total += 1
+
+        if len(notifications) < batch_size:
+            return total
+
+
+def get_notifications_queue_metrics() -> dict:
+    """
+    Get the pending change notifications (depth), the ones that can be
+    sent now (due) and the age in seconds of the oldest one.
+    """
+    now = timezone.now()
+    min_updated_datetime = now - datetime.timedelta(seconds=settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL)
+    result = HistoryChangeNotification.objects.aggregate(
+        depth=Count("id"),
+        due=Sum(Case(When(updated_datetime__lte=min_updated_datetime, then=1),
+                     default=0, output_field=IntegerField())),
+        oldest_datetime=Min("created_datetime"))
+
+    oldest_datetime = result.pop("oldest_datetime")
+    result["due"] = result["due"] or 0
+    result["oldest_age"] = (now - oldest_datetime).total_seconds() if oldest_datetime else 0
+    return result
+
+
 def _get_q_watchers(obj):
     obj_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(obj)
     return Q(watched__content_type=obj_type, watched__object_id=obj.id)
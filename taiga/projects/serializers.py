@@ -27,6 +27,7 @@ from taiga.users.gravatar import get_gravatar_id, get_user_gravatar_id
 from taiga.users.serializers import UserBasicInfoSerializer
 
 from taiga.permissions.services import calculate_permissions
+from taiga.permissions.services import get_user_permissions_for_projects
 from taiga.permissions.services import is_project_admin, is_project_owner
 
 from . import services
@@ -291,16 +292,27 @@ class ProjectSerializer(serializers.LightSerializer):
     def get_tags_colors(self, obj):
         return dict(obj.tags_colors)
 
+    def _get_my_permissions_by_project(self):
+        # The permissions of all the projects of the page are resolved at once
+        if getattr(self, "_my_permissions_by_project", None) is None:
+            projects = self.instance if self.many else [self.instance]
+            self._my_permissions_by_project = get_user_permissions_for_projects(self.context["request"].user,
+                                                                                projects)
+        return self._my_permissions_by_project
+
     def get_my_permissions(self, obj):
         if "request" in self.context:
-            user = self.context["request"].user
-            return calculate_permissions(is_authenticated=user.is_authenticated(),
-                                         is_superuser=user.is_superuser,
-                                         is_member=self.get_i_am_member(obj),
-                                         is_admin=self.get_i_am_admin(obj),
-                                         role_permissions=obj.my_role_permissions_attr,
-                                         anon_permissions=obj.anon_permissions,
-                                         public_permissions=obj.public_permissions)
+            my_permissions = self._get_my_permissions_by_project().get(obj.id, None)
+            if my_permissions is None:
+                user = self.context["request"].user
+                my_permissions = calculate_permissions(is_authenticated=user.is_authenticated(),
+                                                       is_superuser=user.is_superuser,
+                                                       is_member=self.get_i_am_member(obj),
+                                                       is_admin=self.get_i_am_admin(obj),
+                                                       role_permissions=obj.my_role_permissions_attr,
+                                                       anon_permissions=obj.anon_permissions,
+                                                       public_permissions=obj.public_permissions)
+            return my_permissions
         return []
 
     def get_owner(self, obj):
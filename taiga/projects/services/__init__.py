@@ -54,6 +54,10 @@ from .projects import orphan_project
 from .projects import delete_project
 from .projects import duplicate_project
 
+from .totals import increment_project_totals
+from .totals import rebuild_project_totals
+from .totals import roll_projects_totals_windows
+
 from .stats import get_stats_for_project_issues
 from .stats import get_stats_for_project
 from .stats import get_member_stats_for_project
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+from collections import OrderedDict, defaultdict
+from contextlib import closing
+from operator import itemgetter
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.utils.encoding import force_bytes
+from django.utils.translation import ugettext as _
+
+from taiga.base.utils import cache as cache_utils
+from taiga.projects.custom_attributes import choices as custom_attributes_choices
+
+
+class Facet:
+    """
+    A group of counters of a filters_data endpoint.
+
+    `key` is the SQL expression counted for every item. It can use the
+    `columns` of the items (available in the "items" relation) and the
+    relations added by `joins`.
+    """
+    def __init__(self, name, key, columns=(), joins="", key_type=int):
+        self.name = name
+        self.key = key
+        self.columns = columns
+        self.joins = joins
+        self.key_type = key_type
+
+
+def get_custom_attributes_facet(values_table, item_column, custom_attributes_table):
+    """
+    Build the facet that counts the items by the values of their custom
+    attributes. The keys are "<custom attribute id>:<value>" and only the
+    attributes of `FACETS_TYPES` are counted.
+    """
+    types = ", ".join("'{}'".format(type) for type in custom_attributes_choices.FACETS_TYPES)
+    return Facet("custom_attributes", key_type=str,
+                 key='"custom_attributes"."id" || \':\' || "attributes_values"."value"',
+                 joins="""
+                     INNER JOIN "{values_table}" "custom_attributes_values"
+                             ON "custom_attributes_values"."{item_column}" = "items"."id"
+                     CROSS JOIN LATERAL jsonb_each_text("custom_attributes_values"."attributes_values")
+                                        "attributes_values"("custom_attribute_id", "value")
+                     INNER JOIN "{custom_attributes_table}" "custom_attributes"
+                             ON "custom_attributes"."id"::text = "attributes_values"."custom_attribute_id"
+                            AND "custom_attributes"."type" IN ({types})
+                            AND "attributes_values"."value" <> ''
+                 """.format(values_table=values_table, item_column=item_column,
+                            custom_attributes_table=custom_attributes_table, types=types))
+
+
+#####################################################
+# Cache versions
+#####################################################
+
+def _get_version_key(project_id):
+    return "filters-data-version-{}".format(project_id)
+
+
+def bump_filters_data_version(project_id):
+    """
+    Invalidate the cached facets counters of a project, because one of its
+    items, or one of the relations used by the counters, has changed.
+    """
+    cache_utils.bump_version(_get_version_key(project_id))
+
+
+def _get_version(project_id):
+    return cache_utils.get_version(_get_version_key(project_id))
+
+
+#####################################################
+# Counters
+#####################################################
+
+def _get_queryset_sql(queryset):
+    return queryset.order_by().values("id").query.sql_with_params()
+
+
+def _count_facets(table, facets, items_sql, flags):
+    columns = OrderedDict([("id", None)])
+    for facet in facets:
+        columns.update((column, None) for column in facet.columns)
+
+    items_columns = ['"{}"."{}"'.format(table, column) for column in columns]
+    items_params = list(items_sql[1])
+    for name, (flag_sql, flag_params) in flags.items():
+        items_columns.append('"{}"."id" IN ({}) "{}_filter"'.format(table, flag_sql, name))
+        items_params.extend(flag_params)
+
+    # Every facet is counted over the items matching the filters of the other
+    # facets, so the filter of each facet is computed once as a flag.
+    branches = []
+    for facet in facets:
+        conditions = ['"items"."{}_filter"'.format(name) for name in flags if name != facet.name]
+        branches.append("""
+            SELECT '{name}' "facet",
+                   ({key})::text "key",
+                   "items"."id" "item_id"
+              FROM "items"
+                   {joins}
+             WHERE {conditions}
+        """.format(name=facet.name, key=facet.key, joins=facet.joins,
+                   conditions=" AND ".join(conditions) or "TRUE"))
+
+    sql = """
+        WITH "items" AS (
+                SELECT {columns}
+                  FROM "{table}"
+                 WHERE "{table}"."id" IN ({items_sql})
+             ),
+             "facet_rows" AS ({branches})
+
+          SELECT "facet",
+                 "key",
+                 COUNT(DISTINCT "item_id")
+            FROM "facet_rows"
+        GROUP BY "facet", "key"
+    """.format(columns=", ".join(items_columns), table=table, items_sql=items_sql[0],
+               branches=" UNION ALL ".join(branches))
+
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, items_params)
+        rows = cursor.fetchall()
+
+    key_types = {facet.name: facet.key_type for facet in facets}
+    counts = {facet.name: {} for facet in facets}
+    for facet, key, count in rows:
+        if key is not None:
+            key = key_types[facet](key)
+        counts[facet][key] = count
+
+    return counts
+
+
+def get_facets_counts(project, facets, querysets):
+    """
+    Count the items of every facet scanning only once the items that match
+    the common filters.
+
+    `querysets` must contain the items filtered by all the filters but the
+    ones of the facets ("common"), the items filtered only with the default
+    filter backend ("unfiltered") and, for every facet with its own filter,
+    the items filtered only with it. The counters are cached by project and
+    filters until one of the items of the project changes.
+
+    Return a dict {facet name: {key: count}}.
+    """
+    items_sql = _get_queryset_sql(querysets["common"])
+    unfiltered_sql = _get_queryset_sql(querysets["unfiltered"])
+
+    flags = OrderedDict()
+    for facet in facets:
+        if facet.name in querysets:
+            facet_sql = _get_queryset_sql(querysets[facet.name])
+            if facet_sql != unfiltered_sql:
+                flags[facet.name] = facet_sql
+
+    table = querysets["common"].model._meta.db_table
+    filters_hash = hashlib.sha1(force_bytes(repr((
+        table, [facet.name for facet in facets], items_sql, list(flags.items()),
+    )))).hexdigest()
+    cache_key = "filters-data-{}-{}-{}".format(project.id, _get_version(project.id), filters_hash)
+
+    counts = cache.get(cache_key)
+    if counts is None:
+        counts = _count_facets(table, facets, items_sql, flags)
+        cache.set(cache_key, counts, timeout=settings.FILTERS_DATA_CACHE_TIMEOUT)
+
+    return counts
+
+
+#####################################################
+# Facets data
+#####################################################
+
+def get_project_members(project):
+    membership_model = apps.get_model("projects", "Membership")
+    return list(membership_model.objects.filter(project=project, user__isnull=False)
+                                        .values_list("user_id", "user__full_name", "user__username"))
+
+
+def get_choices_facet_data(queryset, counts):
+    result = []
+    for id, name, color, order in queryset.values_list("id", "name", "color", "order"):
+        result.append({
+            "id": id,
+            "name": _(name),
+            "color": color,
+            "order": order,
+            "count": counts.get(id, 0),
+        })
+    return sorted(result, key=itemgetter("order"))
+
+
+def get_roles_facet_data(project, counts):
+    result = []
+    for id, name, order in project.roles.values_list("id", "name", "order"):
+        result.append({
+            "id": id,
+            "name": _(name),
+            "color": None,
+            "order": order,
+            "count": counts.get(id, 0),
+        })
+    return sorted(result, key=itemgetter("order"))
+
+
+def get_users_facet_data(members, counts):
+    # Unassigned items are always listed
+    result = [{
+        "id": None,
+        "full_name": "",
+        "count": counts.get(None, 0),
+    }]
+    for id, full_name, username in members:
+        result.append({
+            "id": id,
+            "full_name": full_name or username or "",
+            "count": counts.get(id, 0),
+        })
+    return sorted(result, key=itemgetter("full_name"))
+
+
+def get_owners_facet_data(members, counts):
+    users = [member for member in members if counts.get(member[0])]
+
+    # System users are listed too if they own any item
+    members_ids = set(member[0] for member in members)
+    others_ids = [id for id in counts if id is not None and id not in members_ids]
+    if others_ids:
+        users += get_user_model().objects.filter(id__in=others_ids, is_system=True)\
+                                         .values_list("id", "full_name", "username")
+
+    result = []
+    for id, full_name, username in users:
+        result.append({
+            "id": id,
+            "full_name": full_name or username or "",
+            "count": counts[id],
+        })
+    return sorted(result, key=itemgetter("full_name"))
+
+
+def get_tags_facet_data(project, counts):
+    result = []
+    for name, color in project.tags_colors or []:
+        result.append({
+            "name": name,
+            "color": color,
+            "count": counts.get(name, 0),
+        })
+    return sorted(result, key=itemgetter("name"))
+
+
+def get_custom_attributes_facet_data(queryset, counts):
+    values = defaultdict(list)
+    for key, count in counts.items():
+        id, value = key.split(":", 1)
+        values[int(id)].append({
+            "value": value,
+            "count": count,
+        })
+
+    result = []
+    queryset = queryset.filter(type__in=custom_attributes_choices.FACETS_TYPES)
+    for id, name, type, order in queryset.values_list("id", "name", "type", "order"):
+        result.append({
+            "id": id,
+            "name": name,
+            "type": type,
+            "order": order,
+            "values": sorted(values[id], key=itemgetter("value")),
+        })
+    return sorted(result, key=itemgetter("order"))
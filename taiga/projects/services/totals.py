@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from contextlib import closing
+
+from django.apps import apps
+from django.db import connection
+from django.utils import timezone
+
+from dateutil.relativedelta import relativedelta
+
+from taiga.celery import app
+from taiga.timeline.service import build_project_namespace
+
+from .. import choices
+
+
+def increment_project_totals(project_id, kind, created_datetime, count=1):
+    """
+    Add `count` to the per-day bucket of the project counter `kind` for the
+    day of `created_datetime` (use a negative count to decrement).
+    """
+    sql = """
+        INSERT INTO projects_projecttotalsbucket (project_id, kind, day, count)
+             VALUES (%s, %s, (%s AT TIME ZONE 'UTC')::date, %s)
+        ON CONFLICT (project_id, kind, day)
+          DO UPDATE SET count = projects_projecttotalsbucket.count + EXCLUDED.count
+    """
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, [project_id, kind, created_datetime, count])
+
+
+def rebuild_project_totals(project, save=True):
+    """
+    Recalculate the totals buckets of a project scanning the likes and the
+    timeline tables, for initial loads or after bulk operations that skipped
+    the counters (imports, timeline rebuilds...).
+    """
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    project_content_type = ContentType.objects.get_for_model(project)
+
+    sql = """
+        DELETE FROM projects_projecttotalsbucket WHERE project_id = %(project_id)s;
+
+        INSERT INTO projects_projecttotalsbucket (project_id, kind, day, count)
+             SELECT %(project_id)s, %(fans)s, (created_date AT TIME ZONE 'UTC')::date, COUNT(*)
+               FROM likes_like
+              WHERE content_type_id = %(content_type_id)s AND object_id = %(project_id)s
+           GROUP BY (created_date AT TIME ZONE 'UTC')::date;
+
+        INSERT INTO projects_projecttotalsbucket (project_id, kind, day, count)
+             SELECT %(project_id)s, %(activity)s, (created AT TIME ZONE 'UTC')::date, COUNT(*)
+               FROM timeline_timeline
+              WHERE namespace = %(namespace)s
+           GROUP BY (created AT TIME ZONE 'UTC')::date;
+    """
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, {
+            "project_id": project.id,
+            "content_type_id": project_content_type.id,
+            "namespace": build_project_namespace(project),
+            "fans": choices.TOTALS_KIND_FANS,
+            "activity": choices.TOTALS_KIND_ACTIVITY,
+        })
+
+    project.refresh_totals(save=save)
+
+
+@app.task
+def roll_projects_totals_windows():
+    """
+    Periodic task that moves out of the last week/month/year totals the
+    activity and fans of the days that have left those windows.
+
+    Only the projects with buckets in the yearly window or with some
+    non-zero total are updated, the rest of them are already at 0.
+    """
+    now = timezone.now()
+    sql = """
+        UPDATE projects_project
+           SET totals_updated_datetime = %(now)s,
+               total_fans_last_week = COALESCE(totals.fans_last_week, 0),
+               total_fans_last_month = COALESCE(totals.fans_last_month, 0),
+               total_fans_last_year = COALESCE(totals.fans_last_year, 0),
+               total_activity_last_week = COALESCE(totals.activity_last_week, 0),
+               total_activity_last_month = COALESCE(totals.activity_last_month, 0),
+               total_activity_last_year = COALESCE(totals.activity_last_year, 0)
+          FROM projects_project projects
+               LEFT OUTER JOIN (
+                   SELECT project_id,
+                          SUM(CASE WHEN kind = %(fans)s AND day >= %(week)s THEN count ELSE 0 END) fans_last_week,
+                          SUM(CASE WHEN kind = %(fans)s AND day >= %(month)s THEN count ELSE 0 END) fans_last_month,
+                          SUM(CASE WHEN kind = %(fans)s THEN count ELSE 0 END) fans_last_year,
+                          SUM(CASE WHEN kind = %(activity)s AND day >= %(week)s THEN count ELSE 0 END) activity_last_week,
+                          SUM(CASE WHEN kind = %(activity)s AND day >= %(month)s THEN count ELSE 0 END) activity_last_month,
+                          SUM(CASE WHEN kind = %(activity)s THEN count ELSE 0 END) activity_last_year
+                     FROM projects_projecttotalsbucket
+                    WHERE day >= %(year)s
+                 GROUP BY project_id
+               ) totals ON totals.project_id = projects.id
+         WHERE projects_project.id = projects.id
+           AND (totals.project_id IS NOT NULL
+                OR projects.total_fans_last_week <> 0
+                OR projects.total_fans_last_month <> 0
+                OR projects.total_fans_last_year <> 0
+                OR projects.total_activity_last_week <> 0
+                OR projects.total_activity_last_month <> 0
+                OR projects.total_activity_last_year <> 0)
+    """
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, {
+            "now": now,
+            "fans": choices.TOTALS_KIND_FANS,
+            "activity": choices.TOTALS_KIND_ACTIVITY,
+            "week": (now - relativedelta(weeks=1)).date(),
+            "month": (now - relativedelta(months=1)).date(),
+            "year": (now - relativedelta(years=1)).date(),
+        })
@@ -21,6 +21,8 @@ from django.conf import settings
 
 from taiga.projects.notifications.services import create_notify_policy_if_not_exists
 
+from . import choices
+
 
 ####################################
 # Signals over project items
@@ -32,6 +34,23 @@ def membership_post_delete(sender, instance, using, **kwargs):
     instance.project.update_role_points()
 
 
+## Permissions
+
+def update_user_permissions_version(sender, instance, **kwargs):
+    from taiga.permissions.services import bump_user_permissions_version
+    if instance.user_id:
+        bump_user_permissions_version(instance.user_id)
+
+
+def update_project_members_permissions_version(sender, instance, **kwargs):
+    from taiga.permissions.services import bump_user_permissions_version
+    # Deleting a role moves its memberships to another one with a bulk update
+    Membership = apps.get_model("projects", "Membership")
+    for user_id in Membership.objects.filter(project_id=instance.project_id, user__isnull=False)\
+                                     .values_list("user_id", flat=True):
+        bump_user_permissions_version(user_id)
+
+
 ## Notify policy
 
 def create_notify_policy(sender, instance, using, **kwargs):
@@ -39,6 +58,52 @@ def create_notify_policy(sender, instance, using, **kwargs):
         create_notify_policy_if_not_exists(instance.project, instance.user)
 
 
+## Totals
+
+def _is_project_like(like):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    return like.content_type_id == ContentType.objects.get_for_model(apps.get_model("projects", "Project")).id
+
+
+def like_pre_save(sender, instance, **kwargs):
+    if instance.pk is None or not _is_project_like(instance):
+        return
+
+    Like = apps.get_model("likes", "Like")
+    instance._previous_created_date = Like.objects.filter(pk=instance.pk).values_list("created_date",
+                                                                                     flat=True).first()
+
+
+def like_post_save(sender, instance, created, **kwargs):
+    if not _is_project_like(instance):
+        return
+
+    from .services.totals import increment_project_totals
+    previous_created_date = getattr(instance, "_previous_created_date", None)
+    if created:
+        increment_project_totals(instance.object_id, choices.TOTALS_KIND_FANS, instance.created_date)
+    elif previous_created_date is not None and previous_created_date != instance.created_date:
+        increment_project_totals(instance.object_id, choices.TOTALS_KIND_FANS, previous_created_date, -1)
+        increment_project_totals(instance.object_id, choices.TOTALS_KIND_FANS, instance.created_date)
+    else:
+        return
+
+    instance.content_object.refresh_totals()
+
+
+def like_post_delete(sender, instance, **kwargs):
+    if not _is_project_like(instance):
+        return
+
+    from .services.totals import increment_project_totals
+    increment_project_totals(instance.object_id, choices.TOTALS_KIND_FANS, instance.created_date, -1)
+
+    Project = apps.get_model("projects", "Project")
+    project = Project.objects.filter(id=instance.object_id).first()
+    if project is not None:
+        project.refresh_totals()
+
+
 ## Project attributes
 
 def project_post_save(sender, instance, created, **kwargs):
@@ -78,6 +143,41 @@ def project_post_save(sender, instance, created, **kwargs):
                                   is_admin=True, email=instance.owner.email)
 
 
+## Filters data
+
+def update_filters_data_version(sender, instance, **kwargs):
+    from .services.facets import bump_filters_data_version
+    bump_filters_data_version(instance.project_id)
+
+
+def update_filters_data_version_for_related_userstory(sender, instance, **kwargs):
+    from .services.facets import bump_filters_data_version
+    # The user story can be deleted before its relations
+    UserStory = apps.get_model("userstories", "UserStory")
+    project_id = UserStory.objects.filter(id=instance.user_story_id).values_list("project_id", flat=True).first()
+    if project_id is not None:
+        bump_filters_data_version(project_id)
+
+
+def update_filters_data_version_for_custom_attributes_values(sender, instance, **kwargs):
+    from .services.facets import bump_filters_data_version
+    bump_filters_data_version(instance.project.id)
+
+
+def update_filters_data_version_for_assigned_users(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    from .services.facets import bump_filters_data_version
+    if not reverse:
+        bump_filters_data_version(instance.project_id)
+    elif pk_set:
+        UserStory = apps.get_model("userstories", "UserStory")
+        project_ids = UserStory.objects.filter(id__in=pk_set).values_list("project_id", flat=True)
+        for project_id in set(project_ids):
+            bump_filters_data_version(project_id)
+
+
 ## US statuses
 
 def try_to_close_or_open_user_stories_when_edit_us_status(sender, instance, created, **kwargs):
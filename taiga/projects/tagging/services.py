@@ -18,6 +18,8 @@
 
 from django.db import connection
 
+from taiga.projects.services.facets import bump_filters_data_version
+
 
 def tag_exist_for_project_elements(project, tag):
     return tag in dict(project.tags_colors).keys()
@@ -54,6 +56,8 @@ def edit_tag(project, from_tag, to_tag, color):
     """
     cursor = connection.cursor()
     cursor.execute(sql, params={"from_tag": from_tag, "to_tag": to_tag, "project_id": project.id})
+    # The items are updated without signals
+    bump_filters_data_version(project.id)
 
     tags_colors = dict(project.tags_colors)
     tags_colors.pop(from_tag)
@@ -89,6 +93,8 @@ def rename_tag(project, from_tag, to_tag, **kwargs):
     """
     cursor = connection.cursor()
     cursor.execute(sql, params={"from_tag": from_tag, "to_tag": to_tag, "project_id": project.id})
+    # The items are updated without signals
+    bump_filters_data_version(project.id)
 
     tags_colors = dict(project.tags_colors)
     tags_colors.pop(from_tag)
@@ -117,6 +123,8 @@ def delete_tag(project, tag):
     """
     cursor = connection.cursor()
     cursor.execute(sql, params={"tag": tag, "project_id": project.id})
+    # The items are updated without signals
+    bump_filters_data_version(project.id)
 
     tags_colors = dict(project.tags_colors)
     del tags_colors[tag]
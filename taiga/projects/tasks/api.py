@@ -62,7 +62,8 @@ class TaskViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
                        filters.ModifiedDateFilter,
                        filters.MilestoneEstimatedStartFilter,
                        filters.MilestoneEstimatedFinishFilter,
-                       filters.FinishedDateFilter)
+                       filters.FinishedDateFilter,
+                       filters.CustomAttributesFilter)
     filter_fields = ["user_story",
                      "milestone",
                      "project",
@@ -217,19 +218,22 @@ class TaskViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
         project = get_object_or_404(Project, id=project_id)
 
         filter_backends = self.get_filter_backends()
-        statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
-        owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
-        roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
+        facets_filter_backends = {
+            "statuses": filters.StatusesFilter,
+            "assigned_to": filters.AssignedToFilter,
+            "owners": filters.OwnersFilter,
+            "roles": filters.RoleFilter,
+            "custom_attributes": filters.CustomAttributesFilter,
+        }
+        common_filter_backends = [f for f in filter_backends if f not in facets_filter_backends.values()]
 
         queryset = self.get_queryset()
         querysets = {
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
+            "common": self.filter_queryset(queryset, filter_backends=common_filter_backends),
+            "unfiltered": self.filter_queryset(queryset, filter_backends=[filters.FilterBackend]),
         }
+        for facet, facet_filter_backend in facets_filter_backends.items():
+            querysets[facet] = self.filter_queryset(queryset, filter_backends=[facet_filter_backend])
         return response.Ok(services.get_tasks_filters_data(project, querysets))
 
     @list_route(methods=["GET"])
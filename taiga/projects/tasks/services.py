@@ -19,15 +19,11 @@
 import csv
 import io
 from collections import OrderedDict
-from operator import itemgetter
-from contextlib import closing
-
-from django.db import connection
-from django.utils.translation import ugettext as _
 
 from taiga.base.utils import db, text
-from taiga.projects.history.services import take_snapshot
+from taiga.projects.history.services import take_snapshots_in_bulk
 from taiga.projects.services import apply_order_updates
+from taiga.projects.services import facets
 from taiga.projects.tasks.apps import connect_tasks_signals
 from taiga.projects.tasks.apps import disconnect_tasks_signals
 from taiga.events import events
@@ -104,12 +100,8 @@ def update_tasks_order_in_bulk(bulk_data: list, field: str, project: object,
 
 
 def snapshot_tasks_in_bulk(bulk_data, user):
-    for task_data in bulk_data:
-        try:
-            task = models.Task.objects.get(pk=task_data['task_id'])
-            take_snapshot(task, user=user)
-        except models.Task.DoesNotExist:
-            pass
+    tasks = models.Task.objects.filter(pk__in=[task_data['task_id'] for task_data in bulk_data])
+    take_snapshots_in_bulk(list(tasks), user=user)
 
 
 #####################################################
@@ -184,262 +176,39 @@ def tasks_to_csv(project, queryset):
 # Api filter data
 #####################################################
 
-def _get_tasks_statuses(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-      SELECT "projects_taskstatus"."id",
-             "projects_taskstatus"."name",
-             "projects_taskstatus"."color",
-             "projects_taskstatus"."order",
-             (SELECT count(*)
-                FROM "tasks_task"
-                     INNER JOIN "projects_project" ON
-                                ("tasks_task"."project_id" = "projects_project"."id")
-               WHERE {where} AND "tasks_task"."status_id" = "projects_taskstatus"."id")
-        FROM "projects_taskstatus"
-       WHERE "projects_taskstatus"."project_id" = %s
-    ORDER BY "projects_taskstatus"."order";
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, color, order, count in rows:
-        result.append({
-            "id": id,
-            "name": _(name),
-            "color": color,
-            "order": order,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("order"))
-
-
-def _get_tasks_assigned_to(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-        WITH counters AS (
-                SELECT assigned_to_id,  count(assigned_to_id) count
-                  FROM "tasks_task"
-            INNER JOIN "projects_project" ON ("tasks_task"."project_id" = "projects_project"."id")
-                 WHERE {where} AND "tasks_task"."assigned_to_id" IS NOT NULL
-              GROUP BY assigned_to_id
-        )
-
-                 SELECT "projects_membership"."user_id" user_id,
-                        "users_user"."full_name",
-                        "users_user"."username",
-                        COALESCE("counters".count, 0) count
-                   FROM projects_membership
-        LEFT OUTER JOIN counters ON ("projects_membership"."user_id" = "counters"."assigned_to_id")
-             INNER JOIN "users_user" ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- unassigned tasks
-        UNION
-
-                 SELECT NULL user_id, NULL, NULL, count(coalesce(assigned_to_id, -1)) count
-                   FROM "tasks_task"
-             INNER JOIN "projects_project" ON ("tasks_task"."project_id" = "projects_project"."id")
-                  WHERE {where} AND "tasks_task"."assigned_to_id" IS NULL
-               GROUP BY assigned_to_id
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id] + where_params)
-        rows = cursor.fetchall()
-
-    result = []
-    none_valued_added = False
-    for id, full_name, username, count in rows:
-        result.append({
-            "id": id,
-            "full_name": full_name or username or "",
-            "count": count,
-        })
-
-        if id is None:
-            none_valued_added = True
-
-    # If there was no task with null assigned_to we manually add it
-    if not none_valued_added:
-        result.append({
-            "id": None,
-            "full_name": "",
-            "count": 0,
-        })
-
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_tasks_roles(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "task_counters" AS (
-         SELECT DISTINCT "tasks_task"."status_id" "status_id",
-                         "tasks_task"."id" "us_id",
-                         "projects_membership"."role_id" "role_id"
-                    FROM "tasks_task"
-              INNER JOIN "projects_project"
-                      ON ("tasks_task"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "projects_membership"
-                      ON "projects_membership"."user_id" = "tasks_task"."assigned_to_id"
-                   WHERE {where}
-            ),
-             "counters" AS (
-                  SELECT "role_id" as "role_id",
-                         COUNT("role_id") "count"
-                    FROM "task_counters"
-                GROUP BY "role_id"
-            )
-
-                 SELECT "users_role"."id",
-                        "users_role"."name",
-                        "users_role"."order",
-                        COALESCE("counters"."count", 0)
-                   FROM "users_role"
-        LEFT OUTER JOIN "counters"
-                     ON "counters"."role_id" = "users_role"."id"
-                  WHERE "users_role"."project_id" = %s
-               ORDER BY "users_role"."order";
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, order, count in rows:
-        result.append({
-            "id": id,
-            "name": _(name),
-            "color": None,
-            "order": order,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("order"))
-
-
-def _get_tasks_owners(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-        WITH counters AS (
-                SELECT "tasks_task"."owner_id" owner_id,
-                       count(coalesce("tasks_task"."owner_id", -1)) count
-                  FROM "tasks_task"
-            INNER JOIN "projects_project" ON ("tasks_task"."project_id" = "projects_project"."id")
-                 WHERE {where}
-              GROUP BY "tasks_task"."owner_id"
-        )
-
-                 SELECT "projects_membership"."user_id" id,
-                        "users_user"."full_name",
-                        "users_user"."username",
-                        COALESCE("counters".count, 0) count
-                   FROM projects_membership
-        LEFT OUTER JOIN counters ON ("projects_membership"."user_id" = "counters"."owner_id")
-             INNER JOIN "users_user" ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- System users
-        UNION
-
-                 SELECT "users_user"."id" user_id,
-                        "users_user"."full_name" full_name,
-                        "users_user"."username" username,
-                        COALESCE("counters".count, 0) count
-                   FROM users_user
-        LEFT OUTER JOIN counters ON ("users_user"."id" = "counters"."owner_id")
-                  WHERE ("users_user"."is_system" IS TRUE)
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, full_name, username, count in rows:
-        if count > 0:
-            result.append({
-                "id": id,
-                "full_name": full_name or username or "",
-                "count": count,
-            })
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_tasks_tags(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-        WITH tasks_tags AS (
-                    SELECT tag,
-                           COUNT(tag) counter FROM (
-                                SELECT UNNEST(tasks_task.tags) tag
-                                  FROM tasks_task
-                            INNER JOIN projects_project
-                                        ON (tasks_task.project_id = projects_project.id)
-                                 WHERE {where}) tags
-                  GROUP BY tag),
-             project_tags AS (
-                    SELECT reduce_dim(tags_colors) tag_color
-                      FROM projects_project
-                     WHERE id=%s)
-
-      SELECT tag_color[1] tag,
-             tag_color[2] color,
-             COALESCE(tasks_tags.counter, 0) counter
-        FROM project_tags
-   LEFT JOIN tasks_tags ON project_tags.tag_color[1] = tasks_tags.tag
-    ORDER BY tag
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for name, color, count in rows:
-        result.append({
-            "name": name,
-            "color": color,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("name"))
+TASKS_FACETS = (
+    facets.Facet("statuses", key='"items"."status_id"', columns=["status_id"]),
+    facets.Facet("assigned_to", key='"items"."assigned_to_id"', columns=["assigned_to_id"]),
+    facets.Facet("owners", key='"items"."owner_id"', columns=["owner_id"]),
+    facets.Facet("tags", key='"tags"."tag"', columns=["tags"], key_type=str,
+                 joins='CROSS JOIN LATERAL UNNEST("items"."tags") "tags"("tag")'),
+    facets.Facet("roles", key='"memberships"."role_id"', columns=["project_id", "assigned_to_id"],
+                 joins="""
+                     LEFT OUTER JOIN "projects_membership" "memberships"
+                                  ON "memberships"."project_id" = "items"."project_id"
+                                 AND "memberships"."user_id" = "items"."assigned_to_id"
+                 """),
+    facets.get_custom_attributes_facet("custom_attributes_taskcustomattributesvalues", "task_id",
+                                       "custom_attributes_taskcustomattribute"),
+)
 
 
 def get_tasks_filters_data(project, querysets):
     """
-    Given a project and an tasks queryset, return a simple data structure
-    of all possible filters for the tasks in the queryset.
+    Given a project and the tasks querysets of every filter, return a simple
+    data structure of all possible filters for the tasks in the queryset.
     """
+    counts = facets.get_facets_counts(project, TASKS_FACETS, querysets)
+    members = facets.get_project_members(project)
+
     data = OrderedDict([
-        ("statuses", _get_tasks_statuses(project, querysets["statuses"])),
-        ("assigned_to", _get_tasks_assigned_to(project, querysets["assigned_to"])),
-        ("owners", _get_tasks_owners(project, querysets["owners"])),
-        ("tags", _get_tasks_tags(project, querysets["tags"])),
-        ("roles", _get_tasks_roles(project, querysets["roles"])),
+        ("statuses", facets.get_choices_facet_data(project.task_statuses.all(), counts["statuses"])),
+        ("assigned_to", facets.get_users_facet_data(members, counts["assigned_to"])),
+        ("owners", facets.get_owners_facet_data(members, counts["owners"])),
+        ("tags", facets.get_tags_facet_data(project, counts["tags"])),
+        ("roles", facets.get_roles_facet_data(project, counts["roles"])),
+        ("custom_attributes", facets.get_custom_attributes_facet_data(project.taskcustomattributes.all(),
+                                                                      counts["custom_attributes"])),
     ])
 
     return data
@@ -75,6 +75,7 @@ class UserStoryViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixi
                        base_filters.FinishDateFilter,
                        base_filters.MilestoneEstimatedStartFilter,
                        base_filters.MilestoneEstimatedFinishFilter,
+                       base_filters.CustomAttributesFilter,
                        base_filters.OrderByFilterMixin)
     filter_fields = ["project",
                      "project__slug",
@@ -303,23 +304,23 @@ class UserStoryViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixi
         project = get_object_or_404(Project, id=project_id)
 
         filter_backends = self.get_filter_backends()
-        statuses_filter_backends = (f for f in filter_backends if f != base_filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != base_filters.AssignedToFilter)
-        assigned_users_filter_backends = (f for f in filter_backends if f != base_filters.AssignedUsersFilter)
-        owners_filter_backends = (f for f in filter_backends if f != base_filters.OwnersFilter)
-        epics_filter_backends = (f for f in filter_backends if f != filters.EpicFilter)
-        roles_filter_backends = (f for f in filter_backends if f != base_filters.RoleFilter)
+        facets_filter_backends = {
+            "statuses": base_filters.StatusesFilter,
+            "assigned_to": base_filters.AssignedToFilter,
+            "assigned_users": base_filters.AssignedUsersFilter,
+            "owners": base_filters.OwnersFilter,
+            "epics": filters.EpicFilter,
+            "custom_attributes": base_filters.CustomAttributesFilter,
+        }
+        common_filter_backends = [f for f in filter_backends if f not in facets_filter_backends.values()]
 
         queryset = self.get_queryset()
         querysets = {
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "assigned_users": self.filter_queryset(queryset, filter_backends=assigned_users_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset),
-            "epics": self.filter_queryset(queryset, filter_backends=epics_filter_backends),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends)
+            "common": self.filter_queryset(queryset, filter_backends=common_filter_backends),
+            "unfiltered": self.filter_queryset(queryset, filter_backends=[base_filters.FilterBackend]),
         }
+        for facet, facet_filter_backend in facets_filter_backends.items():
+            querysets[facet] = self.filter_queryset(queryset, filter_backends=[facet_filter_backend])
         return response.Ok(services.get_userstories_filters_data(project, querysets))
 
     @list_route(methods=["GET"])
@@ -19,16 +19,13 @@
 import csv
 import io
 from collections import OrderedDict
-from operator import itemgetter
-from contextlib import closing
 
-from django.db import connection
 from django.utils import timezone
-from django.utils.translation import ugettext as _
 
 from taiga.base.utils import db, text
-from taiga.projects.history.services import take_snapshot
+from taiga.projects.history.services import take_snapshots_in_bulk
 from taiga.projects.services import apply_order_updates
+from taiga.projects.services import facets
 from taiga.projects.userstories.apps import connect_userstories_signals
 from taiga.projects.userstories.apps import disconnect_userstories_signals
 from taiga.events import events
@@ -144,16 +141,15 @@ def update_userstories_milestone_in_bulk(bulk_data: list, milestone: object):
         user_story_id__in=[e["us_id"] for e in bulk_data]).update(
         milestone=milestone)
 
+    # The milestone is one of the filters of the user stories and the tasks
+    facets.bump_filters_data_version(milestone.project_id)
+
     return us_orders
 
 
 def snapshot_userstories_in_bulk(bulk_data, user):
-    for us_data in bulk_data:
-        try:
-            us = models.UserStory.objects.get(pk=us_data['us_id'])
-            take_snapshot(us, user=user)
-        except models.UserStory.DoesNotExist:
-            pass
+    user_stories = models.UserStory.objects.filter(pk__in=[us_data['us_id'] for us_data in bulk_data])
+    take_snapshots_in_bulk(list(user_stories), user=user)
 
 
 #####################################################
@@ -300,481 +296,81 @@ def userstories_to_csv(project, queryset):
 # Api filter data
 #####################################################
 
-def _get_userstories_statuses(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."status_id" "status_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-                   WHERE {where}
-            ),
-             "counters" AS (
-                  SELECT "status_id",
-                         COUNT("status_id") "count"
-                    FROM "us_counters"
-                GROUP BY "status_id"
-            )
-
-                 SELECT "projects_userstorystatus"."id",
-                        "projects_userstorystatus"."name",
-                        "projects_userstorystatus"."color",
-                        "projects_userstorystatus"."order",
-                        COALESCE("counters"."count", 0)
-                   FROM "projects_userstorystatus"
-        LEFT OUTER JOIN "counters"
-                     ON "counters"."status_id" = "projects_userstorystatus"."id"
-                  WHERE "projects_userstorystatus"."project_id" = %s
-               ORDER BY "projects_userstorystatus"."order";
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, color, order, count in rows:
-        result.append({
-            "id": id,
-            "name": _(name),
-            "color": color,
-            "order": order,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("order"))
-
-
-def _get_userstories_assigned_to(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."assigned_to_id" "assigned_to_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "assigned_to_id",
-                        COUNT("assigned_to_id")
-                   FROM "us_counters"
-               GROUP BY "assigned_to_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters".count, 0) "count"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."assigned_to_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- unassigned userstories
-        UNION
-
-                 SELECT NULL "user_id",
-                        NULL "full_name",
-                        NULL "username",
-                        count(coalesce("assigned_to_id", -1)) "count"
-                   FROM "userstories_userstory"
-             INNER JOIN "projects_project"
-                     ON ("userstories_userstory"."project_id" = "projects_project"."id")
-        LEFT OUTER JOIN "epics_relateduserstory"
-                     ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                  WHERE {where} AND "userstories_userstory"."assigned_to_id" IS NULL
-               GROUP BY "assigned_to_id"
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id] + where_params)
-        rows = cursor.fetchall()
-
-    result = []
-    none_valued_added = False
-    for id, full_name, username, count in rows:
-        result.append({
-            "id": id,
-            "full_name": full_name or username or "",
-            "count": count,
-        })
-
-        if id is None:
-            none_valued_added = True
-
-    # If there was no userstory with null assigned_to we manually add it
-    if not none_valued_added:
-        result.append({
-            "id": None,
-            "full_name": "",
-            "count": 0,
-        })
-
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_assigned_users(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT COALESCE("userstories_userstory_assigned_users"."user_id",
-            "userstories_userstory"."assigned_to_id") as "assigned_user_id",
-                "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              LEFT JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory_assigned_users"."userstory_id" = "userstories_userstory"."id"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-              LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "assigned_user_id",
-                        COUNT("assigned_user_id")
-                   FROM "us_counters"
-               GROUP BY "assigned_user_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters".count, 0) "count"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."assigned_user_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- unassigned userstories
-        UNION
-
-                 SELECT NULL "user_id",
-                        NULL "full_name",
-                        NULL "username",
-                        count(coalesce("assigned_to_id", -1)) "count"
-                   FROM "userstories_userstory"
-             INNER JOIN "projects_project"
-                     ON ("userstories_userstory"."project_id" = "projects_project"."id")
-        LEFT OUTER JOIN "epics_relateduserstory"
-                     ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                  WHERE {where} AND "userstories_userstory"."id" NOT IN (
-                    SELECT "userstories_userstory_assigned_users"."userstory_id" FROM
-                      "userstories_userstory_assigned_users"
-                  ) AND "userstories_userstory"."assigned_to_id" IS NULL
-               GROUP BY "username";
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id] + where_params)
-        rows = cursor.fetchall()
-
-    result = []
-    none_valued_added = False
-    for id, full_name, username, count in rows:
-        result.append({
-            "id": id,
-            "full_name": full_name or username or "",
-            "count": count,
-        })
-
-        if id is None:
-            none_valued_added = True
-
-    # If there was no userstory with null assigned_to we manually add it
-    if not none_valued_added:
-        result.append({
-            "id": None,
-            "full_name": "",
-            "count": 0,
-        })
-
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_owners(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS(
-         SELECT DISTINCT "userstories_userstory"."owner_id" "owner_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "owner_id",
-                        COUNT("owner_id")
-                   FROM "us_counters"
-               GROUP BY "owner_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name",
-                        "users_user"."username",
-                        COALESCE("counters".count, 0) "count"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."owner_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- System users
-                  UNION
-
-                 SELECT "users_user"."id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters"."count", 0) "count"
-                   FROM "users_user"
-        LEFT OUTER JOIN "counters"
-                     ON ("users_user"."id" = "counters"."owner_id")
-                  WHERE ("users_user"."is_system" IS TRUE)
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, full_name, username, count in rows:
-        if count > 0:
-            result.append({
-                "id": id,
-                "full_name": full_name or username or "",
-                "count": count,
-            })
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_tags(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-           WITH "userstories_tags" AS (
-                       SELECT "tag",
-                              COUNT("tag") "counter"
-                         FROM (
-                          SELECT DISTINCT "userstories_userstory"."id" "us_id",
-                                           UNNEST("userstories_userstory"."tags") "tag"
-                                     FROM "userstories_userstory"
-                               INNER JOIN "projects_project"
-                                       ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                          LEFT OUTER JOIN "epics_relateduserstory"
-                                       ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                                    WHERE {where}
-                              ) "tags"
-                     GROUP BY "tag"),
-
-                "project_tags" AS (
-                       SELECT reduce_dim("tags_colors") "tag_color"
-                         FROM "projects_project"
-                        WHERE "id"=%s)
-
-         SELECT "tag_color"[1] "tag",
-                "tag_color"[2] "color",
-                COALESCE("userstories_tags"."counter", 0) "counter"
-           FROM "project_tags"
-LEFT OUTER JOIN "userstories_tags"
-             ON "project_tags"."tag_color"[1] = "userstories_tags"."tag"
-       ORDER BY "tag"
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for name, color, count in rows:
-        result.append({
-            "name": name,
-            "color": color,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("name"))
-
-
-def _get_userstories_epics(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-    extra_sql = """
-       WITH "counters" AS (
-               SELECT "epics_relateduserstory"."epic_id" AS "epic_id",
-                      count("epics_relateduserstory"."id") AS "counter"
-                 FROM "epics_relateduserstory"
-           INNER JOIN "userstories_userstory"
-                   ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-           INNER JOIN "projects_project"
-                   ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                WHERE {where}
-             GROUP BY "epics_relateduserstory"."epic_id"
-       )
-
-         -- User stories with no epics (return results only if there are userstories)
-               SELECT NULL AS "id",
-                      NULL AS "ref",
-                      NULL AS "subject",
-                      0 AS "order",
-                      count(COALESCE("epics_relateduserstory"."epic_id", -1)) AS "counter"
-                 FROM "userstories_userstory"
-      LEFT OUTER JOIN "epics_relateduserstory"
-                   ON ("epics_relateduserstory"."user_story_id" = "userstories_userstory"."id")
-           INNER JOIN "projects_project"
-                   ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                WHERE {where} AND "epics_relateduserstory"."epic_id" IS NULL
-             GROUP BY "epics_relateduserstory"."epic_id"
-
-                UNION
-
-               SELECT "epics_epic"."id" AS "id",
-                      "epics_epic"."ref" AS "ref",
-                      "epics_epic"."subject" AS "subject",
-                      "epics_epic"."epics_order" AS "order",
-                      COALESCE("counters"."counter", 0) AS "counter"
-                 FROM "epics_epic"
-      LEFT OUTER JOIN "counters"
-                   ON ("counters"."epic_id" = "epics_epic"."id")
-                WHERE "epics_epic"."project_id" = %s
-        """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + where_params + [project.id])
-        rows = cursor.fetchall()
-
+USERSTORIES_FACETS = (
+    facets.Facet("statuses", key='"items"."status_id"', columns=["status_id"]),
+    facets.Facet("assigned_to", key='"items"."assigned_to_id"', columns=["assigned_to_id"]),
+    facets.Facet("assigned_users",
+                   key='COALESCE("assigned_users"."user_id", "items"."assigned_to_id")',
+                   columns=["assigned_to_id"],
+                   joins="""
+                       LEFT OUTER JOIN "userstories_userstory_assigned_users" "assigned_users"
+                                    ON "assigned_users"."userstory_id" = "items"."id"
+                   """),
+    facets.Facet("owners", key='"items"."owner_id"', columns=["owner_id"]),
+    facets.Facet("tags", key='"tags"."tag"', columns=["tags"], key_type=str,
+                   joins='CROSS JOIN LATERAL UNNEST("items"."tags") "tags"("tag")'),
+    facets.Facet("epics", key='"related_epics"."epic_id"',
+                   joins="""
+                       LEFT OUTER JOIN "epics_relateduserstory" "related_epics"
+                                    ON "related_epics"."user_story_id" = "items"."id"
+                   """),
+    facets.Facet("roles", key='"memberships"."role_id"', columns=["project_id", "assigned_to_id"],
+                   joins="""
+                       LEFT OUTER JOIN "userstories_userstory_assigned_users" "assigned_users"
+                                    ON "assigned_users"."userstory_id" = "items"."id"
+                       LEFT OUTER JOIN "projects_membership" "memberships"
+                                    ON "memberships"."project_id" = "items"."project_id"
+                                   AND ("memberships"."user_id" = "items"."assigned_to_id"
+                                        OR "memberships"."user_id" = "assigned_users"."user_id")
+                   """),
+    facets.get_custom_attributes_facet("custom_attributes_userstorycustomattributesvalues", "user_story_id",
+                                       "custom_attributes_userstorycustomattribute"),
+)
+
+
+def _get_userstories_epics(project, counts):
     result = []
-    for id, ref, subject, order, count in rows:
+    for id, ref, subject, order in project.epics.values_list("id", "ref", "subject", "epics_order"):
         result.append({
             "id": id,
             "ref": ref,
             "subject": subject,
             "order": order,
-            "count": count,
+            "count": counts.get(id, 0),
         })
 
     result = sorted(result, key=lambda k: (k["order"], k["id"] or 0))
 
-    # Add row when there is no user stories with no epics
-    if result == [] or result[0]["id"] is not None:
-        result.insert(0, {
-            "id": None,
-            "ref": None,
-            "subject": None,
-            "order": 0,
-            "count": 0,
-        })
+    # User stories with no epics
+    result.insert(0, {
+        "id": None,
+        "ref": None,
+        "subject": None,
+        "order": 0,
+        "count": counts.get(None, 0),
+    })
     return result
 
 
-def _get_userstories_roles(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(queryset.query, connection, None)
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."status_id" "status_id",
-                         "userstories_userstory"."id" "us_id",
-                         "projects_membership"."role_id" "role_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory_assigned_users"."userstory_id" = "userstories_userstory"."id"
-         LEFT OUTER JOIN "projects_membership"
-                      ON "projects_membership"."user_id" = "userstories_userstory"."assigned_to_id"
-                      OR "projects_membership"."user_id" = "userstories_userstory_assigned_users"."user_id"
-                   WHERE {where}
-            ),
-             "counters" AS (
-                  SELECT "role_id" as "role_id",
-                         COUNT("role_id") "count"
-                    FROM "us_counters"
-                GROUP BY "role_id"
-            )
-
-                 SELECT "users_role"."id",
-                        "users_role"."name",
-                        "users_role"."order",
-                        COALESCE("counters"."count", 0)
-                   FROM "users_role"
-        LEFT OUTER JOIN "counters"
-                     ON "counters"."role_id" = "users_role"."id"
-                  WHERE "users_role"."project_id" = %s
-               ORDER BY "users_role"."order";
-    """.format(where=where)
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, order, count in rows:
-        result.append({
-            "id": id,
-            "name": _(name),
-            "color": None,
-            "order": order,
-            "count": count,
-        })
-    return sorted(result, key=itemgetter("order"))
-
-
 def get_userstories_filters_data(project, querysets):
     """
-    Given a project and an userstories queryset, return a simple data structure
-    of all possible filters for the userstories in the queryset.
+    Given a project and the userstories querysets of every filter, return a
+    simple data structure of all possible filters for the userstories in the
+    queryset.
     """
+    counts = facets.get_facets_counts(project, USERSTORIES_FACETS, querysets)
+    members = facets.get_project_members(project)
+
     data = OrderedDict([
-        ("statuses", _get_userstories_statuses(project, querysets["statuses"])),
-        ("assigned_to",
-         _get_userstories_assigned_to(project, querysets["assigned_to"])),
-        ("assigned_users",
-         _get_userstories_assigned_users(project, querysets["assigned_users"])),
-        ("owners", _get_userstories_owners(project, querysets["owners"])),
-        ("tags", _get_userstories_tags(project, querysets["tags"])),
-        ("epics", _get_userstories_epics(project, querysets["epics"])),
-        ("roles", _get_userstories_roles(project, querysets["roles"])),
+        ("statuses", facets.get_choices_facet_data(project.us_statuses.all(), counts["statuses"])),
+        ("assigned_to", facets.get_users_facet_data(members, counts["assigned_to"])),
+        ("assigned_users", facets.get_users_facet_data(members, counts["assigned_users"])),
+        ("owners", facets.get_owners_facet_data(members, counts["owners"])),
+        ("tags", facets.get_tags_facet_data(project, counts["tags"])),
+        ("epics", _get_userstories_epics(project, counts["epics"])),
+        ("roles", facets.get_roles_facet_data(project, counts["roles"])),
+        ("custom_attributes", facets.get_custom_attributes_facet_data(project.userstorycustomattributes.all(),
+                                                                      counts["custom_attributes"])),
     ])
 
     return data
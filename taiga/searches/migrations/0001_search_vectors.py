@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# NOTE: These columns are needed by taiga.searches.services. They are
+#       maintained by triggers, so they are not declared in the models.
+
+ITEMS_SEARCH_VECTOR = """
+    setweight(to_tsvector('simple',
+                          coalesce({row}.subject) || ' ' ||
+                          coalesce({row}.ref)), 'A') ||
+    setweight(to_tsvector('simple', coalesce(inmutable_array_to_string({row}.tags))), 'B') ||
+    setweight(to_tsvector('simple', coalesce({row}.description)), 'C')
+"""
+
+WIKI_PAGES_SEARCH_VECTOR = """
+    setweight(to_tsvector('simple', coalesce({row}.slug)), 'A') ||
+    setweight(to_tsvector('simple', coalesce({row}.content)), 'B')
+"""
+
+
+CREATE_SEARCH_VECTOR = """
+    ALTER TABLE {table} ADD COLUMN search_vector tsvector;
+
+    CREATE OR REPLACE FUNCTION {table}_search_vector_update()
+                       RETURNS trigger
+                      LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.search_vector := {new_search_vector};
+        RETURN NEW;
+    END;
+    $$;
+
+    CREATE TRIGGER {table}_search_vector_update
+            BEFORE INSERT OR UPDATE OF {columns}
+                ON {table}
+          FOR EACH ROW
+           EXECUTE PROCEDURE {table}_search_vector_update();
+
+    UPDATE {table} SET search_vector = {search_vector};
+
+    CREATE INDEX {table}_search_vector_idx
+              ON {table}
+           USING gin(search_vector);
+"""
+
+
+DROP_SEARCH_VECTOR = """
+    DROP INDEX IF EXISTS {table}_search_vector_idx;
+    DROP TRIGGER IF EXISTS {table}_search_vector_update ON {table};
+    DROP FUNCTION IF EXISTS {table}_search_vector_update();
+    ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def _search_vector_operation(table, search_vector, columns):
+    create_sql = CREATE_SEARCH_VECTOR.format(table=table,
+                                             columns=", ".join(columns),
+                                             new_search_vector=search_vector.format(row="NEW"),
+                                             search_vector=search_vector.format(row=table))
+    drop_sql = DROP_SEARCH_VECTOR.format(table=table)
+    return migrations.RunSQL([create_sql], [drop_sql])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0033_text_search_indexes'),
+        ('epics', '0005_epic_external_reference'),
+        ('userstories', '0016_userstory_assigned_users'),
+        ('tasks', '0012_add_due_date'),
+        ('issues', '0008_add_due_date'),
+        ('wiki', '0005_auto_20161201_1628'),
+    ]
+
+    operations = [
+        _search_vector_operation("epics_epic", ITEMS_SEARCH_VECTOR,
+                                 ["subject", "ref", "tags", "description"]),
+        _search_vector_operation("userstories_userstory", ITEMS_SEARCH_VECTOR,
+                                 ["subject", "ref", "tags", "description"]),
+        _search_vector_operation("tasks_task", ITEMS_SEARCH_VECTOR,
+                                 ["subject", "ref", "tags", "description"]),
+        _search_vector_operation("issues_issue", ITEMS_SEARCH_VECTOR,
+                                 ["subject", "ref", "tags", "description"]),
+        _search_vector_operation("wiki_wikipage", WIKI_PAGES_SEARCH_VECTOR,
+                                 ["slug", "content"]),
+    ]
@@ -17,11 +17,12 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from taiga.base.api import serializers
-from taiga.base.fields import Field, MethodField
+from taiga.base.fields import Field
 
 
 class EpicSearchResultsSerializer(serializers.LightSerializer):
     id = Field()
+    project = Field(attr="project_id")
     ref = Field()
     subject = Field()
     status = Field(attr="status_id")
@@ -30,28 +31,18 @@ class EpicSearchResultsSerializer(serializers.LightSerializer):
 
 class UserStorySearchResultsSerializer(serializers.LightSerializer):
     id = Field()
+    project = Field(attr="project_id")
     ref = Field()
     subject = Field()
     status = Field(attr="status_id")
-    total_points = MethodField()
-    milestone_name = MethodField()
-    milestone_slug = MethodField()
-
-    def get_milestone_name(self, obj):
-        return obj.milestone.name if obj.milestone else None
-
-    def get_milestone_slug(self, obj):
-        return obj.milestone.slug if obj.milestone else None
-
-    def get_total_points(self, obj):
-        assert hasattr(obj, "total_points_attr"), \
-            "instance must have a total_points_attr attribute"
-
-        return obj.total_points_attr
+    total_points = Field()
+    milestone_name = Field()
+    milestone_slug = Field()
 
 
 class TaskSearchResultsSerializer(serializers.LightSerializer):
     id = Field()
+    project = Field(attr="project_id")
     ref = Field()
     subject = Field()
     status = Field(attr="status_id")
@@ -60,6 +51,7 @@ class TaskSearchResultsSerializer(serializers.LightSerializer):
 
 class IssueSearchResultsSerializer(serializers.LightSerializer):
     id = Field()
+    project = Field(attr="project_id")
     ref = Field()
     subject = Field()
     status = Field(attr="status_id")
@@ -68,4 +60,5 @@ class IssueSearchResultsSerializer(serializers.LightSerializer):
 
 class WikiPageSearchResultsSerializer(serializers.LightSerializer):
     id = Field()
+    project = Field(attr="project_id")
     slug = Field()
@@ -16,81 +16,192 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.apps import apps
+from collections import namedtuple, OrderedDict
+from contextlib import closing
+
 from django.conf import settings
+from django.db import connection
 from taiga.base.utils.db import to_tsquery
-from taiga.projects.userstories.utils import attach_total_points
+from taiga.permissions.services import user_has_perm
 
 MAX_RESULTS = getattr(settings, "SEARCHES_MAX_RESULTS", 150)
 
 
-def search_epics(project, text):
-    model = apps.get_model("epics", "Epic")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "epics_epic"
-    return _search_items(queryset, table, text)
-
-
-def search_user_stories(project, text):
-    model = apps.get_model("userstories", "UserStory")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "userstories_userstory"
-    return _search_items(queryset, table, text)
+########################################################################
+## Multi-type search
+########################################################################
+
+SearchType = namedtuple("SearchType", ["key", "table", "permission", "columns", "joins", "ordering"])
+
+_ITEM_COLUMNS = """
+    {table}.ref AS ref,
+    {table}.subject AS subject,
+    NULL AS slug,
+    {table}.status_id AS status_id,
+    {table}.assigned_to_id AS assigned_to_id,
+    NULL AS total_points,
+    NULL AS milestone_name,
+    NULL AS milestone_slug
+"""
+
+# NOTE: The ordering of every type is the ordering of its model and it's only
+#       used to break the ties of the rank
+SEARCH_TYPES = [
+    SearchType(key="epics",
+               table="epics_epic",
+               permission="view_epics",
+               columns=_ITEM_COLUMNS.format(table="epics_epic"),
+               joins="",
+               ordering="epics_epic.project_id, epics_epic.epics_order, epics_epic.ref"),
+    SearchType(key="userstories",
+               table="userstories_userstory",
+               permission="view_us",
+               columns="""
+                   userstories_userstory.ref AS ref,
+                   userstories_userstory.subject AS subject,
+                   NULL AS slug,
+                   userstories_userstory.status_id AS status_id,
+                   userstories_userstory.assigned_to_id AS assigned_to_id,
+                   (SELECT SUM(projects_points.value)
+                      FROM userstories_rolepoints
+                INNER JOIN projects_points ON userstories_rolepoints.points_id = projects_points.id
+                     WHERE userstories_rolepoints.user_story_id = userstories_userstory.id) AS total_points,
+                   milestones_milestone.name AS milestone_name,
+                   milestones_milestone.slug AS milestone_slug
+               """,
+               joins="""
+                   LEFT JOIN milestones_milestone
+                          ON milestones_milestone.id = userstories_userstory.milestone_id
+               """,
+               ordering="userstories_userstory.project_id, userstories_userstory.backlog_order, "
+                        "userstories_userstory.ref"),
+    SearchType(key="tasks",
+               table="tasks_task",
+               permission="view_tasks",
+               columns=_ITEM_COLUMNS.format(table="tasks_task"),
+               joins="",
+               ordering="tasks_task.project_id, tasks_task.created_date, tasks_task.ref"),
+    SearchType(key="issues",
+               table="issues_issue",
+               permission="view_issues",
+               columns=_ITEM_COLUMNS.format(table="issues_issue"),
+               joins="",
+               ordering="issues_issue.project_id, issues_issue.id DESC"),
+    SearchType(key="wikipages",
+               table="wiki_wikipage",
+               permission="view_wiki_pages",
+               columns="""
+                   NULL AS ref,
+                   NULL AS subject,
+                   wiki_wikipage.slug AS slug,
+                   NULL AS status_id,
+                   NULL AS assigned_to_id,
+                   NULL AS total_points,
+                   NULL AS milestone_name,
+                   NULL AS milestone_slug
+               """,
+               joins="",
+               ordering="wiki_wikipage.project_id, wiki_wikipage.slug"),
+]
+
+# The projects where the user has a permission
+_PERMITTED_PROJECTS_SQL = """
+    {table}.project_id IN (
+        SELECT projects_project.id
+          FROM projects_project
+     LEFT JOIN projects_membership
+            ON projects_membership.project_id = projects_project.id AND
+               projects_membership.user_id = %(user_id)s
+     LEFT JOIN users_role
+            ON users_role.id = projects_membership.role_id
+         WHERE %({permission})s = ANY(projects_project.anon_permissions) OR
+               (%(is_authenticated)s AND %({permission})s = ANY(projects_project.public_permissions)) OR
+               projects_membership.is_admin OR
+               %({permission})s = ANY(users_role.permissions)
+    )
+"""
+
+_SEARCH_TYPE_SQL = """
+    (SELECT '{key}' AS type,
+            row_number() OVER (ORDER BY {ordering}) AS position,
+            {table}.id AS id,
+            {table}.project_id AS project_id,
+            {columns}
+       FROM {table}
+            {joins}
+      WHERE {where}
+   ORDER BY {ordering}
+      LIMIT %(limit)s)
+"""
+
+
+def _make_search_type_sql(search_type, *, project, user, text):
+    if project is not None:
+        where = ["{table}.project_id = %(project_id)s"]
+    elif user.is_superuser:
+        where = ["TRUE"]
+    else:
+        where = [_PERMITTED_PROJECTS_SQL]
+
+    ordering = search_type.ordering
+    if text:
+        where.append("{table}.search_vector @@ to_tsquery('simple', %(tsquery)s)")
+        ordering = "ts_rank({table}.search_vector, to_tsquery('simple', %(tsquery)s)) DESC, " + ordering
 
+    return _SEARCH_TYPE_SQL.format(key=search_type.key,
+                                   table=search_type.table,
+                                   columns=search_type.columns,
+                                   joins=search_type.joins,
+                                   where=" AND ".join(where).format(table=search_type.table,
+                                                                    permission=search_type.permission),
+                                   ordering=ordering.format(table=search_type.table))
 
-def search_tasks(project, text):
-    model = apps.get_model("tasks", "Task")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "tasks_task"
-    return _search_items(queryset, table, text)
 
+def get_search_types_for_user(user, project=None):
+    """
+    Get the types of objects the user can search in a project or, without a
+    project, in any project.
+    """
+    if project is None:
+        return SEARCH_TYPES
 
-def search_issues(project, text):
-    model = apps.get_model("issues", "Issue")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "issues_issue"
-    return _search_items(queryset, table, text)
+    return [search_type for search_type in SEARCH_TYPES
+            if user_has_perm(user, search_type.permission, project)]
 
 
-def search_wiki_pages(project, text):
-    model = apps.get_model("wiki", "WikiPage")
-    queryset = model.objects.filter(project_id=project.pk)
-    tsquery = "to_tsquery('simple', %s)"
-    tsvector = """
-        setweight(to_tsvector('simple', coalesce(wiki_wikipage.slug)), 'A') ||
-        setweight(to_tsvector('simple', coalesce(wiki_wikipage.content)), 'B')
+def search(user, text, project=None):
     """
+    Search, with a single query, the epics, user stories, tasks, issues and
+    wiki pages of a project (or, without a project, of every project the
+    user can view). The results of every type are limited to MAX_RESULTS
+    and sorted by rank.
 
-    return _search_by_query(queryset, tsquery, tsvector, text)
+    Returns a dict with a list of lightweight rows for every type the user
+    has permission to view.
+    """
+    search_types = get_search_types_for_user(user, project)
+    results = OrderedDict((search_type.key, []) for search_type in search_types)
+    if not search_types:
+        return results
+
+    params = {
+        "project_id": project.id if project is not None else None,
+        "user_id": user.id,
+        "is_authenticated": user.is_authenticated(),
+        "tsquery": to_tsquery(text) if text else None,
+        "limit": MAX_RESULTS,
+    }
+    params.update({search_type.permission: search_type.permission for search_type in search_types})
 
+    sql = "UNION ALL".join(_make_search_type_sql(search_type, project=project, user=user, text=text)
+                           for search_type in search_types)
 
-def _search_items(queryset, table, text):
-    tsquery = "to_tsquery('simple', %s)"
-    tsvector = """
-        setweight(to_tsvector('simple',
-                              coalesce({table}.subject) || ' ' ||
-                              coalesce({table}.ref)), 'A') ||
-        setweight(to_tsvector('simple', coalesce(inmutable_array_to_string({table}.tags))), 'B') ||
-        setweight(to_tsvector('simple', coalesce({table}.description)), 'C')
-    """.format(table=table)
-    return _search_by_query(queryset, tsquery, tsvector, text)
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, params)
+        SearchResult = namedtuple("SearchResult", [column[0] for column in cursor.description])
+        rows = [SearchResult(*row) for row in cursor.fetchall()]
 
+    for row in sorted(rows, key=lambda row: row.position):
+        results[row.type].append(row)
 
-def _search_by_query(queryset, tsquery, tsvector, text):
-    select = {
-        "rank": "ts_rank({tsvector},{tsquery})".format(tsquery=tsquery,
-                                                       tsvector=tsvector),
-    }
-    order_by = ["-rank", ]
-    where = ["{tsvector} @@ {tsquery}".format(tsquery=tsquery,
-                                              tsvector=tsvector), ]
-
-    if text:
-        queryset = queryset.extra(select=select,
-                                  select_params=[to_tsquery(text)],
-                                  where=where,
-                                  params=[to_tsquery(text)],
-                                  order_by=order_by)
-
-    queryset = attach_total_points(queryset)
-    return queryset[:MAX_RESULTS]
+    return results
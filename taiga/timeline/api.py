@@ -18,9 +18,13 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import ugettext as _
 
+from taiga.base import exceptions as exc
 from taiga.base import response
 from taiga.base.api import ReadOnlyListViewSet
+from taiga.base.api.pagination import decode_cursor, encode_cursor, replace_query_param
 
 from . import serializers
 from . import service
@@ -31,6 +35,7 @@ class TimelineViewSet(ReadOnlyListViewSet):
     serializer_class = serializers.TimelineSerializer
 
     content_type = None
+    cursor_query_param = "cursor"
 
     def get_content_type(self):
         app_name, model = self.content_type.split(".", 1)
@@ -44,19 +49,72 @@ class TimelineViewSet(ReadOnlyListViewSet):
         filtered_qs = self.filter_queryset(qs)
         return filtered_qs
 
+    def is_cursor_paginated(self):
+        return ("HTTP_X_CURSOR_PAGINATION" in self.request.META or
+                self.cursor_query_param in self.request.QUERY_PARAMS)
+
+    def paginate_queryset_by_cursor(self, queryset):
+        """
+        Keyset pagination over the (created, id) order of the timeline: the
+        cursor is the sort key of the last item of the previous page, so
+        every page costs the same and new entries don't shift the pages.
+        """
+        page_size = self.get_paginate_by()
+        if not page_size:
+            return None
+
+        cursor = self.request.QUERY_PARAMS.get(self.cursor_query_param, None)
+        if cursor:
+            try:
+                created, id = decode_cursor(cursor)
+                created = parse_datetime(created)
+                id = int(id)
+                if created is None:
+                    raise ValueError()
+            except (TypeError, ValueError):
+                raise exc.WrongArguments(_("Invalid cursor"))
+
+            # The redundant "created <=" condition lets the planner use the
+            # (namespace, created) index for the range scan
+            queryset = queryset.extra(where=['"timeline_timeline"."created" <= %s',
+                                             '("timeline_timeline"."created", "timeline_timeline"."id") < (%s, %s)'],
+                                      params=[created, created, id])
+
+        # Retrieve one more object to check if there is a next page
+        object_list = list(queryset[:page_size + 1])
+        has_next = len(object_list) > page_size
+        object_list = object_list[:page_size]
+
+        self.headers["x-paginated"] = "true"
+        self.headers["x-paginated-by"] = page_size
+
+        if has_next:
+            last = object_list[-1]
+            next_cursor = encode_cursor([last.created.isoformat(), last.id])
+            url = self.request.build_absolute_uri()
+            self.headers["x-pagination-next-cursor"] = next_cursor
+            self.headers["X-Pagination-Next"] = replace_query_param(url, self.cursor_query_param, next_cursor)
+
+        return object_list
+
     def response_for_queryset(self, queryset):
-        # Switch between paginated or standard style responses
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            user_ids = list(set([obj.data.get("user", {}).get("id", None) for obj in page.object_list]))
+        # Switch between cursor paginated, paginated or standard style responses
+        if self.is_cursor_paginated():
+            object_list = self.paginate_queryset_by_cursor(queryset)
+        else:
+            page = self.paginate_queryset(queryset)
+            object_list = page.object_list if page is not None else None
+
+        if object_list is not None:
+            user_ids = list(set([obj.data.get("user", {}).get("id", None) for obj in object_list]))
             User = get_user_model()
             users = {u.id: u for u in User.objects.filter(id__in=user_ids)}
 
-            for obj in page.object_list:
+            for obj in object_list:
                 user_id = obj.data.get("user", {}).get("id", None)
                 obj._prefetched_user = users.get(user_id, None)
 
-            serializer = self.get_pagination_serializer(page)
+            serializer = self.get_serializer(object_list, many=True)
         else:
             serializer = self.get_serializer(queryset, many=True)
 
@@ -28,13 +28,30 @@ class TimelineAppConfig(AppConfig):
 
     def ready(self):
         from . import signals as handlers
+        from taiga.projects.history import signals as history_signals
 
         signals.post_save.connect(handlers.on_new_history_entry,
                                   sender=apps.get_model("history", "HistoryEntry"),
                                   dispatch_uid="timeline")
+        history_signals.history_entries_bulk_created.connect(handlers.on_new_history_entries_bulk,
+                                                             dispatch_uid="timeline_bulk")
         signals.post_save.connect(handlers.create_membership_push_to_timeline,
                                   sender=apps.get_model("projects", "Membership"))
         signals.pre_delete.connect(handlers.delete_membership_push_to_timeline,
                                    sender=apps.get_model("projects", "Membership"))
         signals.post_save.connect(handlers.create_user_push_to_timeline,
                                   sender=get_user_model())
+
+        # Invalidate the cached timeline visibility of the users
+        signals.post_save.connect(handlers.invalidate_membership_timeline_visibility,
+                                  sender=apps.get_model("projects", "Membership"),
+                                  dispatch_uid="timeline_visibility_membership_save")
+        signals.post_delete.connect(handlers.invalidate_membership_timeline_visibility,
+                                    sender=apps.get_model("projects", "Membership"),
+                                    dispatch_uid="timeline_visibility_membership_delete")
+        signals.post_save.connect(handlers.invalidate_role_timeline_visibility,
+                                  sender=apps.get_model("users", "Role"),
+                                  dispatch_uid="timeline_visibility_role_save")
+        signals.post_delete.connect(handlers.invalidate_deleted_role_timeline_visibility,
+                                    sender=apps.get_model("users", "Role"),
+                                    dispatch_uid="timeline_visibility_role_delete")
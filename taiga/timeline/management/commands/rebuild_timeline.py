@@ -20,12 +20,14 @@
 # python manage.py rebuild_timeline --settings=settings.local_timeline --initial_date 2014-10-02 --final_date 2014-10-03
 # python manage.py rebuild_timeline --settings=settings.local_timeline --purge
 # python manage.py rebuild_timeline --settings=settings.local_timeline --initial_date 2014-10-02
+# python manage.py rebuild_timeline --settings=settings.local_timeline --processes 8
+# python manage.py rebuild_timeline --settings=settings.local_timeline --processes 8 --resume
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.test.utils import override_settings
 
 from taiga.timeline.models import Timeline
-from taiga.timeline.rebuilder import rebuild_timeline
+from taiga.timeline.rebuilder import rebuild_timeline, rebuild_timeline_in_parallel
 
 from optparse import make_option
 
@@ -54,10 +56,38 @@ class Command(BaseCommand):
                             dest='project',
                             default=None,
                             help='Selected project id for timeline generation')
+        parser.add_argument('--processes',
+                            action='store',
+                            dest='processes',
+                            type=int,
+                            default=None,
+                            help='Rebuild the projects in parallel with this number of processes')
+        parser.add_argument('--resume',
+                            action='store_true',
+                            dest='resume',
+                            default=False,
+                            help='Continue an interrupted parallel rebuild from its checkpoints')
+        parser.add_argument('--page_size',
+                            action='store',
+                            dest='page_size',
+                            type=int,
+                            default=1000,
+                            help='History entries processed (and checkpointed) at once in parallel rebuilds')
 
     @override_settings(DEBUG=False)
     def handle(self, *args, **options):
         if options["purge"] == True:
             Timeline.objects.all().delete()
 
+        if options["processes"] or options["resume"]:
+            if options["initial_date"] or options["final_date"]:
+                raise CommandError("Parallel rebuilds always rebuild whole projects, "
+                                   "--initial_date and --final_date are not supported")
+
+            project_ids = [int(options["project"])] if options["project"] else None
+            rebuild_timeline_in_parallel(project_ids, processes=options["processes"],
+                                         resume=options["resume"], page_size=options["page_size"],
+                                         log=self.stdout.write)
+            return
+
         rebuild_timeline(options["initial_date"], options["final_date"], options["project"])
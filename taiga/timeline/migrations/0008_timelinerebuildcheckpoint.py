@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0060_projecttotalsbucket'),
+        ('timeline', '0007_auto_20170406_0615'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineRebuildCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_history_entry_created_at', models.DateTimeField(blank=True, default=None, null=True)),
+                ('last_history_entry_id', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('total_history_entries', models.PositiveIntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_rebuild_checkpoint', to='projects.Project')),
+            ],
+        ),
+    ]
@@ -41,6 +41,19 @@ class Timeline(models.Model):
         index_together = [('content_type', 'object_id', 'namespace'),
                           ('namespace', 'created'),]
 
+class TimelineRebuildCheckpoint(models.Model):
+    """
+    Progress of the timeline rebuild of a project, to resume
+    interrupted rebuilds.
+    """
+    project = models.OneToOneField(Project, related_name="timeline_rebuild_checkpoint")
+    last_history_entry_created_at = models.DateTimeField(null=True, blank=True, default=None)
+    last_history_entry_id = models.CharField(max_length=255, null=True, blank=True, default=None)
+    total_history_entries = models.PositiveIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+
 # Register all implementations
 from .timeline_implementations import *
 
@@ -16,20 +16,23 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Model
+from django.db import connections
+from django.db import transaction
 from django.test.utils import override_settings
 
 from taiga.projects.models import Project
+from taiga.projects.services.totals import rebuild_project_totals
 from taiga.projects.history.models import HistoryEntry
-from .models import Timeline
-from .service import _get_impl_key_from_model, _timeline_impl_map, extract_user_info
+from .models import Timeline, TimelineRebuildCheckpoint
+from .service import extract_user_info, push_loaded_history_entries_to_timelines
 from .signals import on_new_history_entry, _push_to_timelines
 
 from unittest.mock import patch
 
 import gc
+import multiprocessing
+import time
 
 
 class BulkCreator(object):
@@ -51,22 +54,9 @@ class BulkCreator(object):
 bulk_creator = BulkCreator()
 
 
-def custom_add_to_object_timeline(obj:object, instance:object, event_type:str, created_datetime:object,
-                                  namespace:str="default", extra_data:dict={}):
-    assert isinstance(obj, Model), "obj must be a instance of Model"
-    assert isinstance(instance, Model), "instance must be a instance of Model"
-    event_type_key = _get_impl_key_from_model(instance.__class__, event_type)
-    impl = _timeline_impl_map.get(event_type_key, None)
-
-    bulk_creator.create_element(Timeline(
-        content_object=obj,
-        namespace=namespace,
-        event_type=event_type_key,
-        project=instance.project,
-        data=impl(instance, extra_data=extra_data),
-        data_content_type=ContentType.objects.get_for_model(instance.__class__),
-        created=created_datetime,
-    ))
+def custom_bulk_create_timeline_entries(entries):
+    for entry in entries:
+        bulk_creator.create_element(entry)
 
 
 @override_settings(CELERY_ENABLED=False)
@@ -82,7 +72,7 @@ def rebuild_timeline(initial_date, final_date, project_id):
 
         timelines.delete()
 
-    with patch('taiga.timeline.service._add_to_object_timeline', new=custom_add_to_object_timeline):
+    with patch('taiga.timeline.service._bulk_create_timeline_entries', new=custom_bulk_create_timeline_entries):
         # Projects api wasn't a HistoryResourceMixin so we can't interate on the HistoryEntries in this case
         projects = Project.objects.order_by("created_date")
         history_entries = HistoryEntry.objects.order_by("created_at")
@@ -131,7 +121,164 @@ def rebuild_timeline(initial_date, final_date, project_id):
             except ObjectDoesNotExist as e:
                 print("Ignoring")
 
-        for project in projects.iterator():
-            project.refresh_totals()
-
     bulk_creator.flush()
+
+    for project in projects.iterator():
+        rebuild_project_totals(project)
+
+
+def _push_project_creation_to_timelines(project):
+    for membership in project.memberships.exclude(user=None).exclude(user=project.owner):
+        _push_to_timelines(project, membership.user, membership, "create", membership.created_at,
+                           refresh_totals=False)
+
+    extra_data = {
+        "values_diff": {},
+        "user": extract_user_info(project.owner),
+    }
+    _push_to_timelines(project, project.owner, project, "create", project.created_date,
+                       extra_data=extra_data, refresh_totals=False)
+
+
+def _get_history_entries_page(project_id, last_created_at, last_id, page_size):
+    history_entries = HistoryEntry.objects.filter(project_id=project_id).order_by("created_at", "id")
+    if last_created_at is not None:
+        # Keyset pagination over the (project, created_at, id) index
+        history_entries = history_entries.extra(where=["(created_at, id) > (%s, %s)"],
+                                                params=[last_created_at, last_id])
+    return list(history_entries[:page_size])
+
+
+@override_settings(CELERY_ENABLED=False)
+def rebuild_project_timeline(project_id, page_size=1000, progress=None):
+    """
+    Rebuild the timeline of a project from its history entries, saving the
+    progress after each page in a TimelineRebuildCheckpoint so an interrupted
+    rebuild continues where it stopped.
+
+    Return the number of history entries processed.
+    """
+    project = Project.objects.get(id=project_id)
+    checkpoint = TimelineRebuildCheckpoint.objects.filter(project=project).first()
+    if checkpoint is not None and checkpoint.finished:
+        return 0
+
+    entries = []
+    with patch("taiga.timeline.service._bulk_create_timeline_entries", new=entries.extend):
+        if checkpoint is None:
+            with transaction.atomic():
+                Timeline.objects.filter(project=project).delete()
+                _push_project_creation_to_timelines(project)
+                Timeline.objects.bulk_create(entries, batch_size=1000)
+                checkpoint = TimelineRebuildCheckpoint.objects.create(project=project)
+            del entries[:]
+
+        processed = 0
+        while True:
+            page = _get_history_entries_page(project.id, checkpoint.last_history_entry_created_at,
+                                             checkpoint.last_history_entry_id, page_size)
+            if not page:
+                break
+
+            with transaction.atomic():
+                push_loaded_history_entries_to_timelines(page, refresh_totals=False)
+                Timeline.objects.bulk_create(entries, batch_size=1000)
+                checkpoint.last_history_entry_created_at = page[-1].created_at
+                checkpoint.last_history_entry_id = page[-1].id
+                checkpoint.total_history_entries += len(page)
+                checkpoint.save()
+            del entries[:]
+
+            processed += len(page)
+            if progress is not None:
+                progress(project, processed)
+
+    with transaction.atomic():
+        rebuild_project_totals(project)
+        checkpoint.finished = True
+        checkpoint.save()
+
+    return processed
+
+
+def _init_rebuild_worker():
+    # Never share the database connections inherited from the parent process
+    connections.close_all()
+
+
+def _rebuild_project_timeline_worker(args):
+    project_id, page_size, progress_queue = args
+    start = time.monotonic()
+
+    def progress(project, processed):
+        # Report every page, the parent process logs the throughput
+        progress_queue.put((project.id, processed, time.monotonic() - start))
+
+    processed = rebuild_project_timeline(project_id, page_size=page_size, progress=progress)
+    return project_id, processed, time.monotonic() - start
+
+
+def _rate(processed, elapsed):
+    return processed / elapsed if elapsed else 0
+
+
+def rebuild_timeline_in_parallel(project_ids=None, processes=None, resume=False, page_size=1000, log=None):
+    """
+    Rebuild the timeline of several projects (all of them by default) with a
+    pool of processes, one project per task. With `resume` the projects
+    already rebuilt are skipped and the unfinished ones continue from their
+    checkpoint.
+
+    `log`, if given, is called with a line of progress after every page of
+    history entries and every finished project.
+    """
+    if not resume:
+        TimelineRebuildCheckpoint.objects.all().delete()
+
+    if project_ids is None:
+        project_ids = Project.objects.order_by("id").values_list("id", flat=True)
+
+    finished_ids = set(TimelineRebuildCheckpoint.objects.filter(finished=True).values_list("project_id",
+                                                                                           flat=True))
+    pending_ids = [project_id for project_id in project_ids if project_id not in finished_ids]
+
+    connections.close_all()
+    start = time.monotonic()
+    finished_processed = 0
+    running_processed = {}
+
+    def _log_progress(progress_queue):
+        while not progress_queue.empty():
+            project_id, processed, elapsed = progress_queue.get()
+            running_processed[project_id] = processed
+            if log is not None:
+                total_processed = finished_processed + sum(running_processed.values())
+                log("project {}: {} entries, {:.1f} entries/sec - total: {} entries, {:.1f} entries/sec".format(
+                    project_id, processed, _rate(processed, elapsed), total_processed,
+                    _rate(total_processed, time.monotonic() - start)))
+
+    with multiprocessing.Manager() as manager, \
+            multiprocessing.Pool(processes, initializer=_init_rebuild_worker) as pool:
+        progress_queue = manager.Queue()
+        tasks = [(project_id, page_size, progress_queue) for project_id in pending_ids]
+        results = pool.imap_unordered(_rebuild_project_timeline_worker, tasks)
+
+        count = 0
+        while count < len(tasks):
+            try:
+                project_id, processed, elapsed = results.next(timeout=1)
+            except multiprocessing.TimeoutError:
+                _log_progress(progress_queue)
+                continue
+
+            _log_progress(progress_queue)
+            count += 1
+            running_processed.pop(project_id, None)
+            finished_processed += processed
+            if log is not None:
+                total_elapsed = time.monotonic() - start
+                log("{}/{} projects - project {}: {} entries in {:.1f}s - total: {} entries, "
+                    "{:.1f} entries/sec".format(count, len(pending_ids), project_id, processed, elapsed,
+                                                 finished_processed, _rate(finished_processed, total_elapsed)))
+
+    return finished_processed
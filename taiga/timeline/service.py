@@ -18,10 +18,15 @@
 
 from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import BooleanField
 from django.db.models import Model
 from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django.db.models.query import QuerySet
+from django.utils.translation import ugettext as _
 
 from functools import partial, wraps
 
@@ -52,9 +57,12 @@ def build_project_namespace(project: object):
     return "{0}:{1}".format("project", project.id)
 
 
-def _add_to_object_timeline(obj: object, instance: object, event_type: str, created_datetime: object,
-                            namespace: str="default", extra_data: dict={}):
-    assert isinstance(obj, Model), "obj must be a instance of Model"
+def _make_timeline_entries(objects, instance: object, event_type: str, created_datetime: object,
+                           namespace: str="default", extra_data: dict={}, data: dict=None):
+    """
+    Build (without saving) the timeline entries of an event for several objects.
+    The payload is computed only once (unless it is given) and shared by all of them.
+    """
     assert isinstance(instance, Model), "instance must be a instance of Model"
     from .models import Timeline
     event_type_key = _get_impl_key_from_model(instance.__class__, event_type)
@@ -64,21 +72,46 @@ def _add_to_object_timeline(obj: object, instance: object, event_type: str, crea
     if hasattr(instance, "project"):
         project = instance.project
 
-    Timeline.objects.create(
-        content_object=obj,
-        namespace=namespace,
-        event_type=event_type_key,
-        project=project,
-        data=impl(instance, extra_data=extra_data),
-        data_content_type=ContentType.objects.get_for_model(instance.__class__),
-        created=created_datetime,
-    )
+    objects = list(objects)
+    if data is None:
+        data = impl(instance, extra_data=extra_data)
+    # ContentType.objects caches them in-process, so this doesn't hit the database
+    content_types = {}
+    for model in set([instance.__class__] + [obj.__class__ for obj in objects]):
+        content_types[model] = ContentType.objects.get_for_model(model)
+
+    entries = []
+    for obj in objects:
+        assert isinstance(obj, Model), "obj must be a instance of Model"
+        entries.append(Timeline(
+            content_type=content_types[obj.__class__],
+            object_id=obj.pk,
+            namespace=namespace,
+            event_type=event_type_key,
+            project=project,
+            data=data,
+            data_content_type=content_types[instance.__class__],
+            created=created_datetime,
+        ))
+    return entries
+
+
+def _bulk_create_timeline_entries(entries):
+    from .models import Timeline
+    return Timeline.objects.bulk_create(entries)
+
+
+def _add_to_object_timeline(obj: object, instance: object, event_type: str, created_datetime: object,
+                            namespace: str="default", extra_data: dict={}):
+    assert isinstance(obj, Model), "obj must be a instance of Model"
+    _add_to_objects_timeline([obj], instance, event_type, created_datetime, namespace, extra_data)
 
 
 def _add_to_objects_timeline(objects, instance: object, event_type: str, created_datetime: object,
                              namespace: str="default", extra_data: dict={}):
-    for obj in objects:
-        _add_to_object_timeline(obj, instance, event_type, created_datetime, namespace, extra_data)
+    entries = _make_timeline_entries(objects, instance, event_type, created_datetime, namespace, extra_data)
+    if entries:
+        _bulk_create_timeline_entries(entries)
 
 
 def _push_to_timeline(objects, instance: object, event_type: str, created_datetime: object,
@@ -106,29 +139,43 @@ def push_to_timelines(project_id, user_id, obj_app_label, obj_model_name, obj_id
     except get_user_model().DoesNotExist:
         return
 
+    project = None
     if project_id is not None:
-        # Actions related with a project
-
         projectModel = apps.get_model("projects", "Project")
         try:
             project = projectModel.objects.get(id=project_id)
         except projectModel.DoesNotExist:
             return
 
-        # Project timeline
-        _push_to_timeline(project, obj, event_type, created_datetime,
-                          namespace=build_project_namespace(project),
-                          extra_data=extra_data)
+    _push_object_to_timelines(project, user, obj, event_type, created_datetime, extra_data=extra_data,
+                              refresh_totals=refresh_totals)
 
-        if refresh_totals:
-            project.refresh_totals()
 
+def _push_object_to_timelines(project, user, obj, event_type, created_datetime, extra_data={},
+                              refresh_totals=True):
+    if project is not None:
+        # Actions related with a project
+
+        # Project timeline
+        entries = _make_timeline_entries([project], obj, event_type, created_datetime,
+                                         namespace=build_project_namespace(project),
+                                         extra_data=extra_data)
+
+        # Related people timelines (they share the payload of the project one)
         if hasattr(obj, "get_related_people"):
             related_people = obj.get_related_people()
 
-            _push_to_timeline(related_people, obj, event_type, created_datetime,
-                              namespace=build_user_namespace(user),
-                              extra_data=extra_data)
+            entries += _make_timeline_entries(related_people, obj, event_type, created_datetime,
+                                              namespace=build_user_namespace(user),
+                                              extra_data=extra_data, data=entries[0].data)
+
+        _bulk_create_timeline_entries(entries)
+
+        if refresh_totals:
+            from taiga.projects.choices import TOTALS_KIND_ACTIVITY
+            from taiga.projects.services.totals import increment_project_totals
+            increment_project_totals(project.id, TOTALS_KIND_ACTIVITY, created_datetime)
+            project.refresh_totals()
     else:
         # Actions not related with a project
         # - Me
@@ -137,6 +184,88 @@ def push_to_timelines(project_id, user_id, obj_app_label, obj_model_name, obj_id
                           extra_data=extra_data)
 
 
+def _clean_description_fields(values_diff):
+    # Description_diff and description_html if included can be huge, we are
+    # removing the html one and clearing the diff
+    values_diff.pop("description_html", None)
+    if "description_diff" in values_diff:
+        values_diff["description_diff"] = _("Check the history API for the exact diff")
+
+
+@app.task
+def push_history_entries_to_timelines(entry_ids, refresh_totals=True):
+    """
+    Push the changes of some history entries to the timelines. It runs out of
+    the request, so the values diff of the entries is computed here.
+    """
+    HistoryEntry = apps.get_model("history", "HistoryEntry")
+    entries = HistoryEntry.objects.filter(id__in=entry_ids).order_by("created_at", "id")
+    push_loaded_history_entries_to_timelines(list(entries), refresh_totals=refresh_totals)
+
+
+def push_loaded_history_entries_to_timelines(entries, refresh_totals=True):
+    """
+    Same as push_history_entries_to_timelines with already loaded entries. The
+    users and the objects of the entries are loaded with one query per model.
+    """
+    from taiga.projects.history import services as history_services
+    from taiga.projects.history.choices import HistoryType
+
+    entries = [entry for entry in entries if not entry.is_hidden and entry.user["pk"] is not None]
+    if not entries:
+        return
+
+    users = get_user_model().objects.in_bulk(set(entry.user["pk"] for entry in entries))
+
+    pks_by_model = {}
+    for entry in entries:
+        model = history_services.get_model_from_key(entry.key)
+        pks_by_model.setdefault(model, set()).add(history_services.get_pk_from_key(entry.key))
+
+    objs = {}
+    for model, pks in pks_by_model.items():
+        queryset = model.objects.all()
+        if any(field.name == "project" for field in model._meta.concrete_fields):
+            queryset = queryset.select_related("project")
+
+        for pk, obj in queryset.in_bulk(pks).items():
+            objs[(model, str(pk))] = obj
+
+    event_types = {
+        HistoryType.create: "create",
+        HistoryType.change: "change",
+        HistoryType.delete: "delete",
+    }
+
+    for entry in entries:
+        user = users.get(entry.user["pk"], None)
+        obj = objs.get((history_services.get_model_from_key(entry.key),
+                        history_services.get_pk_from_key(entry.key)), None)
+        if user is None or obj is None:
+            continue
+
+        values_diff = dict(entry.values_diff)
+        _clean_description_fields(values_diff)
+
+        extra_data = {
+            "values_diff": values_diff,
+            "user": extract_user_info(user),
+            "comment": entry.comment,
+            "comment_html": entry.comment_html,
+        }
+
+        # Detect deleted comment
+        if entry.delete_comment_date:
+            extra_data["comment_deleted"] = True
+
+        # Detect edited comment
+        if entry.comment_versions is not None and len(entry.comment_versions)>0:
+            extra_data["comment_edited"] = True
+
+        _push_object_to_timelines(obj.project, user, obj, event_types[entry.type], entry.created_at,
+                                  extra_data=extra_data, refresh_totals=refresh_totals)
+
+
 def get_timeline(obj, namespace=None):
     assert isinstance(obj, Model), "obj must be a instance of Model"
     from .models import Timeline
@@ -150,16 +279,8 @@ def get_timeline(obj, namespace=None):
     return timeline
 
 
-def filter_timeline_for_user(timeline, user):
-    # Superusers can see everything
-    if user.is_superuser:
-        return timeline
-
-    # Filtering entities from public projects or entities without project
-    tl_filter = Q(project__is_private=False) | Q(project=None)
-
-    # Filtering private project with some public parts
-    content_types = {
+def _get_timeline_content_types():
+    return {
         "view_project": ContentType.objects.get_by_natural_key("projects", "project"),
         "view_milestones": ContentType.objects.get_by_natural_key("milestones", "milestone"),
         "view_epics": ContentType.objects.get_by_natural_key("epics", "epic"),
@@ -170,6 +291,63 @@ def filter_timeline_for_user(timeline, user):
         "view_wiki_links": ContentType.objects.get_by_natural_key("wiki", "wikilink"),
     }
 
+
+def _get_timeline_visibility_cache_key(user_id):
+    return "timeline-visibility:{}".format(user_id)
+
+
+def get_timeline_visibility_for_user(user):
+    """
+    Get the timeline entries of private projects that a user can see because of
+    their memberships as a dict with:
+
+    - admin_project_ids: projects where the user can see everything.
+    - project_ids, content_type_ids: paired lists with the (project, data content type)
+      combinations the user can see in the rest of their projects.
+
+    The result is cached until the user memberships or roles change.
+    """
+    cache_key = _get_timeline_visibility_cache_key(user.id)
+    visibility = cache.get(cache_key)
+    if visibility is not None:
+        return visibility
+
+    content_types = _get_timeline_content_types()
+    # There is no specific permission for seeing new memberships
+    membership_content_type = ContentType.objects.get_by_natural_key(app_label="projects", model="membership")
+
+    visibility = {"admin_project_ids": [], "project_ids": [], "content_type_ids": []}
+    for membership in user.memberships.select_related("role"):
+        # Admin roles can see everything in a project
+        if membership.is_admin:
+            visibility["admin_project_ids"].append(membership.project_id)
+        else:
+            data_content_types = list(filter(None, [content_types.get(a, None) for a in
+                                                    membership.role.permissions]))
+            data_content_types.append(membership_content_type)
+            for data_content_type in data_content_types:
+                visibility["project_ids"].append(membership.project_id)
+                visibility["content_type_ids"].append(data_content_type.id)
+
+    cache.set(cache_key, visibility, getattr(settings, "TIMELINE_VISIBILITY_CACHE_TIMEOUT", 60*60))
+    return visibility
+
+
+def invalidate_timeline_visibility_for_users(user_ids):
+    cache.delete_many([_get_timeline_visibility_cache_key(user_id) for user_id in user_ids if user_id])
+
+
+def filter_timeline_for_user(timeline, user):
+    # Superusers can see everything
+    if user.is_superuser:
+        return timeline
+
+    # Filtering entities from public projects or entities without project
+    tl_filter = Q(project__is_private=False) | Q(project=None)
+
+    # Filtering private project with some public parts
+    content_types = _get_timeline_content_types()
+
     for content_type_key, content_type in content_types.items():
         tl_filter |= Q(project__is_private=True,
                        project__anon_permissions__contains=[content_type_key],
@@ -181,17 +359,18 @@ def filter_timeline_for_user(timeline, user):
                    project__anon_permissions__contains=["view_project"],
                    data_content_type=membership_content_type)
 
-    # Filtering private projects where user is member
+    # Filtering private projects where user is member, with two array parameters
+    # instead of one clause per membership
     if not user.is_anonymous():
-        for membership in user.cached_memberships:
-            # Admin roles can see everything in a project
-            if membership.is_admin:
-                tl_filter |= Q(project=membership.project)
-            else:
-                data_content_types = list(filter(None, [content_types.get(a, None) for a in
-                                                        membership.role.permissions]))
-                data_content_types.append(membership_content_type)
-                tl_filter |= Q(project=membership.project, data_content_type__in=data_content_types)
+        visibility = get_timeline_visibility_for_user(user)
+        sql = """
+            ("timeline_timeline"."project_id" = ANY(%s::int[])
+             OR ("timeline_timeline"."project_id", "timeline_timeline"."data_content_type_id") IN (
+                 SELECT * FROM unnest(%s::int[], %s::int[])))
+        """
+        params = [visibility["admin_project_ids"], visibility["project_ids"], visibility["content_type_ids"]]
+        timeline = timeline.annotate(visible_by_membership=RawSQL(sql, params, output_field=BooleanField()))
+        tl_filter |= Q(visible_by_membership=True)
 
     timeline = timeline.filter(tl_filter)
     return timeline
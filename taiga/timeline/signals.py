@@ -16,19 +16,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.apps import apps
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-from django.utils.translation import ugettext as _
 from django.db import connection
 
-from taiga.projects.history import services as history_services
 from taiga.projects.history.choices import HistoryType
 from taiga.timeline.service import (push_to_timelines,
+                                    push_history_entries_to_timelines,
+                                    push_loaded_history_entries_to_timelines,
                                     build_user_namespace,
                                     build_project_namespace,
-                                    extract_user_info)
+                                    invalidate_timeline_visibility_for_users)
 
 
 def _push_to_timelines(project, user, obj, event_type, created_datetime, extra_data={}, refresh_totals=True):
@@ -57,14 +57,6 @@ def _push_to_timelines(project, user, obj, event_type, created_datetime, extra_d
                           refresh_totals=refresh_totals)
 
 
-def _clean_description_fields(values_diff):
-    # Description_diff and description_html if included can be huge, we are
-    # removing the html one and clearing the diff
-    values_diff.pop("description_html", None)
-    if "description_diff" in values_diff:
-        values_diff["description_diff"] = _("Check the history API for the exact diff")
-
-
 def on_new_history_entry(sender, instance, created, **kwargs):
     if instance._importing:
         return
@@ -77,39 +69,27 @@ def on_new_history_entry(sender, instance, created, **kwargs):
 
     refresh_totals = getattr(instance, "refresh_totals", True)
 
-    model = history_services.get_model_from_key(instance.key)
-    pk = history_services.get_pk_from_key(instance.key)
-    obj = model.objects.get(pk=pk)
-    project = obj.project
-
-    if instance.type == HistoryType.create:
-        event_type = "create"
-    elif instance.type == HistoryType.change:
-        event_type = "change"
-    elif instance.type == HistoryType.delete:
-        event_type = "delete"
-
-    user = get_user_model().objects.get(id=instance.user["pk"])
-    values_diff = instance.values_diff
-    _clean_description_fields(values_diff)
-
-    extra_data = {
-        "values_diff": values_diff,
-        "user": extract_user_info(user),
-        "comment": instance.comment,
-        "comment_html": instance.comment_html,
-    }
+    # The values diff of the entry is computed by the task, out of the request,
+    # but delete entries are pushed now, while their object still exists.
+    if settings.CELERY_ENABLED and instance.type != HistoryType.delete:
+        entry_ids = [instance.id]
+        connection.on_commit(lambda: push_history_entries_to_timelines.delay(entry_ids,
+                                                                             refresh_totals=refresh_totals))
+    else:
+        push_loaded_history_entries_to_timelines([instance], refresh_totals=refresh_totals)
 
-    # Detect deleted comment
-    if instance.delete_comment_date:
-        extra_data["comment_deleted"] = True
 
-    # Detect edited comment
-    if instance.comment_versions is not None and len(instance.comment_versions)>0:
-        extra_data["comment_edited"] = True
+def on_new_history_entries_bulk(sender, entries, **kwargs):
+    entry_ids = [entry.id for entry in entries
+                 if not entry._importing and not entry.is_hidden and entry.user["pk"] is not None]
+    if not entry_ids:
+        return
 
-    created_datetime = instance.created_at
-    _push_to_timelines(project, user, obj, event_type, created_datetime, extra_data=extra_data, refresh_totals=refresh_totals)
+    # One push for all the entries of the bulk operation
+    if settings.CELERY_ENABLED:
+        connection.on_commit(lambda: push_history_entries_to_timelines.delay(entry_ids))
+    else:
+        push_history_entries_to_timelines(entry_ids)
 
 
 def create_membership_push_to_timeline(sender, instance, created, **kwargs):
@@ -138,3 +118,20 @@ def create_user_push_to_timeline(sender, instance, created, **kwargs):
         project = None
         user = instance
         _push_to_timelines(project, user, user, "create", created_datetime=user.date_joined)
+
+
+def invalidate_membership_timeline_visibility(sender, instance, **kwargs):
+    invalidate_timeline_visibility_for_users([instance.user_id])
+
+
+def invalidate_role_timeline_visibility(sender, instance, **kwargs):
+    user_ids = instance.memberships.exclude(user=None).values_list("user_id", flat=True)
+    invalidate_timeline_visibility_for_users(user_ids)
+
+
+def invalidate_deleted_role_timeline_visibility(sender, instance, **kwargs):
+    # Deleting a role moves its memberships to another one with a bulk update
+    Membership = apps.get_model("projects", "Membership")
+    user_ids = Membership.objects.filter(project_id=instance.project_id, user__isnull=False)\
+                                 .values_list("user_id", flat=True)
+    invalidate_timeline_visibility_for_users(user_ids)
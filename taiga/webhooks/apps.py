@@ -23,13 +23,18 @@ from django.db.models import signals
 
 def connect_webhooks_signals():
     from . import signal_handlers as handlers
+    from taiga.projects.history import signals as history_signals
     signals.post_save.connect(handlers.on_new_history_entry,
                               sender=apps.get_model("history", "HistoryEntry"),
                               dispatch_uid="webhooks")
+    history_signals.history_entries_bulk_created.connect(handlers.on_new_history_entries_bulk,
+                                                         dispatch_uid="webhooks_bulk")
 
 
 def disconnect_webhooks_signals():
+    from taiga.projects.history import signals as history_signals
     signals.post_save.disconnect(sender=apps.get_model("history", "HistoryEntry"), dispatch_uid="webhooks")
+    history_signals.history_entries_bulk_created.disconnect(dispatch_uid="webhooks_bulk")
 
 
 class WebhooksAppConfig(AppConfig):
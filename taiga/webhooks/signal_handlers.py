@@ -16,8 +16,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from django.apps import apps
 from django.db import connection
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.utils import timezone
 
 from taiga.projects.history import services as history_service
@@ -75,6 +77,63 @@ def on_new_history_entry(sender, instance, created, **kwargs):
     connection.on_commit(lambda: _execute_task(task, webhooks_args))
 
 
+def on_new_history_entries_bulk(sender, entries, **kwargs):
+    if not settings.WEBHOOKS_ENABLED:
+        return None
+
+    entries = [entry for entry in entries if not entry.is_hidden]
+    if not entries:
+        return None
+
+    # Entries of a bulk operation are about objects of the same model
+    model = history_service.get_model_from_key(entries[0].key)
+    objs = model.objects.in_bulk([history_service.get_pk_from_key(entry.key) for entry in entries])
+    objs = {str(pk): obj for pk, obj in objs.items()}
+    project_ids = set(obj.project_id for obj in objs.values())
+
+    owners = get_user_model().objects.in_bulk(set(entry.user["pk"] for entry in entries))
+    for entry in entries:
+        entry.prefetch_owner(owners.get(entry.user["pk"], None))
+
+    webhooks_by_project = {}
+    for webhook in apps.get_model("webhooks", "Webhook").objects.filter(project_id__in=project_ids):
+        webhooks_by_project.setdefault(webhook.project_id, []).append({
+            "id": webhook.pk,
+            "url": webhook.url,
+            "key": webhook.key,
+        })
+
+    date = timezone.now()
+    tasks_args = []
+    for entry in entries:
+        obj = objs.get(history_service.get_pk_from_key(entry.key), None)
+        if obj is None:
+            # Catch simultaneous DELETE request
+            continue
+
+        if entry.type == HistoryType.create:
+            task = tasks.create_webhook
+            extra_args = []
+        elif entry.type == HistoryType.change:
+            task = tasks.change_webhook
+            extra_args = [entry]
+        elif entry.type == HistoryType.delete:
+            task = tasks.delete_webhook
+            extra_args = []
+
+        for webhook in webhooks_by_project.get(obj.project_id, []):
+            args = [webhook["id"], webhook["url"], webhook["key"], entry.owner, date, obj] + extra_args
+            tasks_args.append((task, args))
+
+    if tasks_args:
+        connection.on_commit(lambda: _execute_tasks(tasks_args))
+
+
+def _execute_tasks(tasks_args):
+    for task, webhook_args in tasks_args:
+        _execute_task(task, [webhook_args])
+
+
 def _execute_task(task, webhooks_args):
     for webhook_args in webhooks_args:
 
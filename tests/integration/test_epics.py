@@ -280,3 +280,24 @@ def test_api_validator_assigned_to_when_create_epics(client):
 
         response = client.json.post(url, json.dumps(data))
         assert response.status_code == 400, response.data
+
+
+def test_api_filters_data_custom_attributes_are_not_filtered_by_themselves(client):
+    project = f.ProjectFactory.create()
+    user = f.UserFactory(is_superuser=True)
+    f.MembershipFactory.create(user=user, project=project)
+    text_attr = f.EpicCustomAttributeFactory.create(project=project, type="text")
+
+    epic1 = f.EpicFactory.create(project=project)
+    epic1.custom_attributes_values.attributes_values = {str(text_attr.id): "red"}
+    epic1.custom_attributes_values.save()
+    epic2 = f.EpicFactory.create(project=project)
+    epic2.custom_attributes_values.attributes_values = {str(text_attr.id): "blue"}
+    epic2.custom_attributes_values.save()
+
+    client.login(user)
+    url = reverse("epics-filters-data") + "?project={}&custom_attribute_{}=red".format(project.id, text_attr.id)
+    response = client.get(url)
+    assert response.status_code == 200
+    text_attr_data = next(filter(lambda i: i["id"] == text_attr.id, response.data["custom_attributes"]))
+    assert text_attr_data["values"] == [{"value": "blue", "count": 1}, {"value": "red", "count": 1}]
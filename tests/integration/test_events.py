@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+from unittest import mock
+
+from django.db import transaction
+
+from taiga.base.utils import json
+from taiga.events import events
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+class Obj:
+    _importing = False
+
+    def __init__(self, pk, project_id=1):
+        self.pk = pk
+        self.project_id = project_id
+
+
+@pytest.fixture
+def backend():
+    with mock.patch("taiga.events.events.backends.get_events_backend") as get_events_backend:
+        yield get_events_backend.return_value
+
+
+def _sent_messages(backend):
+    return [(c[1]["routing_key"], json.loads(c[1]["message"])["data"])
+            for c in backend.emit_event.call_args_list]
+
+
+def test_change_events_are_merged_on_commit(backend):
+    with transaction.atomic():
+        for pk in range(1, 4):
+            events.emit_event_for_model(Obj(pk), content_type="userstories.userstory", sessionid="s")
+        events.emit_event_for_ids([3, 4], "userstories.userstory", 1, sessionid="s")
+        events.emit_event_for_model(Obj(5), content_type="tasks.task", sessionid="s")
+        events.emit_event_for_model(Obj(6), content_type="userstories.userstory", type="delete", sessionid="s")
+        assert backend.emit_event.call_count == 0
+
+    assert _sent_messages(backend) == [
+        ("changes.project.1.userstories", {"type": "change", "matches": "userstories.userstory", "pk": [1, 2, 3, 4]}),
+        ("changes.project.1.tasks", {"type": "change", "matches": "tasks.task", "pk": 5}),
+        ("changes.project.1.userstories", {"type": "delete", "matches": "userstories.userstory", "pk": 6}),
+    ]
+
+
+def test_change_events_of_rolled_back_savepoints_are_discarded(backend):
+    with transaction.atomic():
+        events.emit_event_for_model(Obj(1), content_type="issues.issue", sessionid="s")
+        try:
+            with transaction.atomic():
+                events.emit_event_for_model(Obj(2), content_type="issues.issue", sessionid="s")
+                raise ValueError()
+        except ValueError:
+            pass
+        events.emit_event_for_model(Obj(3), content_type="issues.issue", sessionid="s")
+
+    assert _sent_messages(backend) == [
+        ("changes.project.1.issues", {"type": "change", "matches": "issues.issue", "pk": [1, 3]}),
+    ]
+
+
+def test_change_events_are_split_to_fit_the_payload_limit(backend, settings):
+    settings.EVENTS_PUSH_MAX_MESSAGE_SIZE = 200
+
+    with transaction.atomic():
+        events.emit_event_for_ids(list(range(1000, 1100)), "tasks.task", 1, sessionid="s")
+
+    messages = [c[1]["message"] for c in backend.emit_event.call_args_list]
+    assert len(messages) > 1
+    assert all(len(message) <= 200 for message in messages)
+    assert sum([json.loads(m)["data"]["pk"] for m in messages], []) == list(range(1000, 1100))
@@ -22,13 +22,15 @@ import pytest
 from unittest.mock import patch
 
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from .. import factories as f
 
 from taiga.base.utils import json
 from taiga.projects.history import services
-from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.models import HistoryEntry, HistoryLastSnapshot
 from taiga.projects.history.choices import HistoryType
 from taiga.projects.history.services import make_key_from_model_object
 
@@ -144,6 +146,141 @@ def test_real_snapshot_frequency(settings):
     assert qs_partials.count() == 2
 
 
+def test_last_snapshot_is_updated_with_each_entry():
+    issue = f.IssueFactory.create()
+    key = make_key_from_model_object(issue)
+
+    services.take_snapshot(issue, user=issue.owner)
+    last_snapshot = HistoryLastSnapshot.objects.get(key=key)
+    assert last_snapshot.partial_diffs == 0
+    assert last_snapshot.entry_id == HistoryEntry.objects.get(key=key).id
+
+    issue.subject = "new subject"
+    issue.save()
+    entry = services.take_snapshot(issue, user=issue.owner)
+    last_snapshot = HistoryLastSnapshot.objects.get(key=key)
+    assert last_snapshot.partial_diffs == 1
+    assert last_snapshot.entry_id == entry.id
+    assert last_snapshot.snapshot["subject"] == "new subject"
+
+
+def test_last_snapshot_is_rebuilt_when_missing_or_outdated():
+    issue = f.IssueFactory.create()
+    key = make_key_from_model_object(issue)
+    services.take_snapshot(issue, user=issue.owner)
+    issue.subject = "new subject"
+    issue.save()
+    services.take_snapshot(issue, user=issue.owner)
+
+    HistoryLastSnapshot.objects.filter(key=key).update(entry_id="outdated", snapshot={})
+    fobj, need_real_snapshot = services.get_last_snapshot_for_key(key)
+    assert fobj.snapshot["subject"] == "new subject"
+    assert not need_real_snapshot
+
+    HistoryLastSnapshot.objects.filter(key=key).delete()
+    last_snapshot = services.build_last_snapshot_for_key(key)
+    assert last_snapshot.partial_diffs == 1
+    assert last_snapshot.snapshot["subject"] == "new subject"
+
+
+def test_last_snapshot_is_removed_with_the_object_and_its_project():
+    issue1 = f.IssueFactory.create()
+    issue2 = f.IssueFactory.create()
+    key1 = make_key_from_model_object(issue1)
+    key2 = make_key_from_model_object(issue2)
+    services.take_snapshot(issue1, user=issue1.owner)
+    services.take_snapshot(issue2, user=issue2.owner)
+    assert HistoryLastSnapshot.objects.get(key=key1).project_id == issue1.project_id
+
+    services.take_snapshot(issue1, user=issue1.owner, delete=True)
+    assert not HistoryLastSnapshot.objects.filter(key=key1).exists()
+    assert services.build_last_snapshot_for_key(key1) is None
+    assert not HistoryLastSnapshot.objects.filter(key=key1).exists()
+
+    issue2.project.delete()
+    assert not HistoryLastSnapshot.objects.filter(key=key2).exists()
+
+
+def test_take_snapshots_in_bulk():
+    project = f.ProjectFactory.create()
+    milestone = f.MilestoneFactory.create(project=project)
+    user_stories = f.UserStoryFactory.create_batch(3, project=project)
+    new_user_story = f.UserStoryFactory.create(project=project)
+    for us in user_stories:
+        services.take_snapshot(us, user=project.owner)
+
+    for us in user_stories:
+        us.milestone = milestone
+        us.sprint_order = 10
+        us.save()
+
+    entries = services.take_snapshots_in_bulk(user_stories + [new_user_story], user=project.owner)
+    assert len(entries) == 4
+
+    for us in user_stories:
+        key = make_key_from_model_object(us)
+        entry = HistoryEntry.objects.filter(key=key).order_by("-created_at").first()
+        assert entry.type == HistoryType.change
+        assert entry.user["pk"] == project.owner.id
+        assert entry.diff["milestone"] == [None, milestone.id]
+        assert entry.values["milestone"] == {str(milestone.id): milestone.name}
+        assert not entry.is_snapshot
+
+        last_snapshot = HistoryLastSnapshot.objects.get(key=key)
+        assert last_snapshot.entry_id == entry.id
+        assert last_snapshot.partial_diffs == 1
+        assert last_snapshot.snapshot == json.loads(json.dumps(services.freeze_model_instance(us).snapshot))
+
+    key = make_key_from_model_object(new_user_story)
+    entry = HistoryEntry.objects.get(key=key)
+    assert entry.type == HistoryType.create
+    assert entry.is_snapshot
+
+    # Unchanged objects do not create new entries
+    assert services.take_snapshots_in_bulk(user_stories, user=project.owner) == []
+
+
+def test_take_snapshots_in_bulk_queries_do_not_depend_on_the_number_of_objects(settings,
+                                                                               django_assert_num_queries):
+    settings.CELERY_ENABLED = True
+    settings.WEBHOOKS_ENABLED = True
+
+    def prepare_user_stories(count):
+        project = f.ProjectFactory.create()
+        f.WebhookFactory.create(project=project)
+        milestone = f.MilestoneFactory.create(project=project)
+        user_stories = f.UserStoryFactory.create_batch(count, project=project)
+        for us in user_stories:
+            services.take_snapshot(us, user=project.owner)
+            us.milestone = milestone
+            us.save()
+        return user_stories
+
+    user_stories = prepare_user_stories(1)
+    with CaptureQueriesContext(connection) as captured:
+        assert len(services.take_snapshots_in_bulk(user_stories, user=user_stories[0].owner)) == 1
+
+    user_stories = prepare_user_stories(5)
+    with django_assert_num_queries(len(captured)):
+        assert len(services.take_snapshots_in_bulk(user_stories, user=user_stories[0].owner)) == 5
+
+
+def test_build_values_diff_cache():
+    issue = f.IssueFactory.create(subject="old subject")
+    services.take_snapshot(issue, user=issue.owner)
+    issue.subject = "new subject"
+    issue.save()
+    entry = services.take_snapshot(issue, user=issue.owner)
+    HistoryEntry.objects.filter(id=entry.id).update(values_diff_cache=None)
+
+    assert services.build_values_diff_cache([entry.id]) == 1
+    entry = HistoryEntry.objects.get(id=entry.id)
+    assert entry.values_diff_cache == {"subject": ["old subject", "new subject"]}
+
+    # Entries already cached are skipped
+    assert services.build_values_diff_cache([entry.id]) == 0
+
+
 def test_issue_resource_history_test(client):
     user = f.UserFactory.create()
     project = f.ProjectFactory.create(owner=user)
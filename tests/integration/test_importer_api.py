@@ -19,6 +19,8 @@
 import pytest
 import base64
 
+from unittest import mock
+
 from django.apps import apps
 from django.core.urlresolvers import reverse
 from django.core.files.base import ContentFile
@@ -1128,6 +1130,22 @@ def test_services_store_project_from_dict_with_issue_priorities_names_as_None(cl
     assert project.issues.first().priority.name == "None"
 
 
+def test_services_store_user_stories_renders_their_comments_at_once():
+    project = f.ProjectFactory.create()
+    data = {"user_stories": [{"subject": "Test {}".format(i),
+                              "history": [{"comment": "**comment {}**".format(i)}]} for i in range(3)]}
+
+    with mock.patch("taiga.export_import.services.store.mdrender_many") as render_many_mock, \
+            mock.patch("taiga.export_import.services.store.store_user_story") as store_user_story_mock:
+        render_many_mock.side_effect = lambda project, texts: [text.upper() for text in texts]
+        services.store.store_user_stories(project, data)
+
+    assert render_many_mock.call_count == 1
+    assert store_user_story_mock.call_count == 3
+    rendered_comments = store_user_story_mock.call_args[1]["rendered_comments"]
+    assert rendered_comments == {"**comment {}**".format(i): "**COMMENT {}**".format(i) for i in range(3)}
+
+
 ##################################################################
 ## tes api/v1/importer/load-dummp
 ##################################################################
@@ -19,9 +19,12 @@
 
 import pytest
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from taiga.mdrender.service import render, render_and_extract
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from .. import factories
 
@@ -66,3 +69,87 @@ def test_proccessor_valid_email():
     result = render(dummy_project, "**beta.tester@taiga.io**")
     expected_result = "<p><strong><a href=\"mailto:beta.tester@taiga.io\" target=\"_blank\">beta.tester@taiga.io</a></strong></p>"
     assert result == expected_result
+
+
+def test_mentions_and_references_are_resolved_in_bulk():
+    project = factories.ProjectFactory.create()
+    user1 = factories.UserFactory(username="user1", full_name="test name")
+    user2 = factories.UserFactory(username="user2", full_name="test name")
+    us1 = factories.UserStoryFactory.create(project=project)
+    us2 = factories.UserStoryFactory.create(project=project)
+    task = factories.TaskFactory.create(project=project)
+    issue = factories.IssueFactory.create(project=project)
+
+    text = "@user1 @user2 #{} #{} #{} #{} #999".format(us1.ref, us2.ref, task.ref, issue.ref)
+    with CaptureQueriesContext(connection) as captured:
+        (result, extracted) = render_and_extract(project, text)
+
+    # Users, references, user stories, tasks and issues
+    assert len(captured) == 5
+    assert set(extracted["mentions"]) == {user1, user2}
+    assert set(extracted["references"]) == {us1, us2, task, issue}
+    assert 'title="#{} {}"'.format(task.ref, task.subject) in result
+    assert "#999" in result
+
+
+def test_render_cache_is_invalidated_when_a_referenced_object_is_renamed():
+    project = factories.ProjectFactory.create()
+    us = factories.UserStoryFactory.create(project=project, subject="old subject")
+    text = "#{}".format(us.ref)
+
+    assert "old subject" in render(project, text)
+
+    us.subject = "new subject"
+    us.save()
+    assert "new subject" in render(project, text)
+
+
+def test_render_cache_is_invalidated_when_a_mentioned_user_is_created():
+    project = factories.ProjectFactory.create()
+    text = "@new-user"
+
+    assert "mention" not in render(project, text)
+
+    factories.UserFactory(username="new-user")
+    assert "mention" in render(project, text)
+
+
+def test_mentions_version_is_bumped_only_when_a_mentioned_field_changes():
+    user = factories.UserFactory(username="user1", full_name="old name")
+
+    with patch("taiga.mdrender.service.bump_mentions_version") as bump_mock:
+        user.last_login = None
+        user.save()
+        user.bio = "new bio"
+        user.save()
+        assert bump_mock.call_count == 0
+
+        user.full_name = "new name"
+        user.save()
+        assert bump_mock.call_count == 1
+
+
+def test_render_reads_the_versions_from_the_local_cache():
+    project = factories.ProjectFactory.create()
+    render(project, "**first**")
+
+    with patch("taiga.mdrender.service.cache.get_many") as get_many_mock:
+        render(project, "**second**")
+        assert get_many_mock.call_count == 0
+
+
+def test_render_and_extract_is_cached():
+    project = factories.ProjectFactory.create()
+    user = factories.UserFactory(username="user1")
+    issue = factories.IssueFactory.create(project=project)
+    text = "@user1 #{}".format(issue.ref)
+
+    (result1, extracted1) = render_and_extract(project, text)
+
+    with patch("taiga.mdrender.service._get_markdown") as get_markdown_mock:
+        (result2, extracted2) = render_and_extract(project, text)
+        assert get_markdown_mock.call_count == 0
+
+    assert result1 == result2
+    assert extracted2["mentions"] == [user]
+    assert extracted2["references"] == [issue]
@@ -21,6 +21,7 @@ import pytest
 
 from taiga.projects.userstories.models import UserStory
 from taiga.projects.issues.models import Issue
+from taiga.projects.votes.utils import attach_total_voters_to_queryset
 from taiga.base import neighbors as n
 
 from .. import factories as f
@@ -79,6 +80,24 @@ class TestUserStories:
         assert neighbors.left is None
         assert neighbors.right == us2
 
+    def test_ordering_by_status(self):
+        project = f.ProjectFactory.create()
+        status1 = f.UserStoryStatusFactory.create(project=project, order=1)
+        status2 = f.UserStoryStatusFactory.create(project=project, order=2)
+
+        us1 = f.UserStoryFactory.create(project=project, status=status2)
+        us2 = f.UserStoryFactory.create(project=project, status=status1)
+        us3 = f.UserStoryFactory.create(project=project, status=status1)
+
+        user_stories = UserStory.objects.filter(project=project).order_by("status", "-id")
+
+        neighbors = n.get_neighbors(us2, results_set=user_stories)
+
+        assert neighbors.left == us3
+        assert neighbors.right == us1
+        assert neighbors.right.subject == us1.subject
+        assert neighbors.right.ref == us1.ref
+
 
 @pytest.mark.django_db
 class TestIssues:
@@ -328,3 +347,22 @@ class TestIssues:
         assert issue1_neighbors.right == issue2
         assert issue2_neighbors.left == issue1
         assert issue2_neighbors.right is None
+
+    def test_ordering_by_total_voters(self):
+        project = f.ProjectFactory.create()
+
+        issue1 = f.IssueFactory.create(project=project)
+        issue2 = f.IssueFactory.create(project=project)
+        issue3 = f.IssueFactory.create(project=project)
+        f.VotesFactory.create(content_object=issue2, count=1)
+
+        issues = attach_total_voters_to_queryset(Issue.objects.filter(project=project))
+        issues = issues.order_by("-total_voters", "-id")
+
+        issue2_neighbors = n.get_neighbors(issue2, results_set=issues)
+        issue3_neighbors = n.get_neighbors(issue3, results_set=issues)
+
+        assert issue2_neighbors.left is None
+        assert issue2_neighbors.right == issue3
+        assert issue3_neighbors.left == issue2
+        assert issue3_neighbors.right == issue1
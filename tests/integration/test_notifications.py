@@ -186,7 +186,6 @@ def test_users_to_notify():
     policy_member1.notify_level = NotifyLevel.all
     policy_member1.save()
 
-    del project.cached_notify_policies
     users = services.get_users_to_notify(issue)
     assert len(users) == 2
     assert users == {member1.user, issue.get_owner()}
@@ -196,7 +195,6 @@ def test_users_to_notify():
     policy_member3.notify_level = NotifyLevel.all
     policy_member3.save()
 
-    del project.cached_notify_policies
     users = services.get_users_to_notify(issue)
     assert len(users) == 3
     assert users == {member1.user, member3.user, issue.get_owner()}
@@ -206,14 +204,12 @@ def test_users_to_notify():
     policy_member3.save()
 
     issue.add_watcher(member3.user)
-    del project.cached_notify_policies
     users = services.get_users_to_notify(issue)
     assert len(users) == 2
     assert users == {member1.user, issue.get_owner()}
 
     # Test with watchers without permissions
     issue.add_watcher(member5.user)
-    del project.cached_notify_policies
     users = services.get_users_to_notify(issue)
     assert len(users) == 2
     assert users == {member1.user, issue.get_owner()}
@@ -229,6 +225,40 @@ def test_users_to_notify():
     assert users == {member1.user, issue.get_owner()}
 
 
+def test_users_to_notify_by_channel():
+    project = f.ProjectFactory.create()
+    role = f.RoleFactory.create(project=project, permissions=['view_issues'])
+    member1 = f.MembershipFactory.create(project=project, role=role)
+    member2 = f.MembershipFactory.create(project=project, role=role)
+    policy_model_cls = apps.get_model("notifications", "NotifyPolicy")
+    policy_model_cls.objects.filter(user=member1.user).update(notify_level=NotifyLevel.all,
+                                                              live_notify_level=NotifyLevel.none)
+    policy_model_cls.objects.filter(user=member2.user).update(notify_level=NotifyLevel.none,
+                                                              live_notify_level=NotifyLevel.all)
+
+    watcher = f.UserFactory.create()
+    issue = f.IssueFactory.create(project=project, owner=member1.user)
+    issue.add_watcher(watcher)
+    policy_model_cls.objects.filter(user=watcher).delete()
+    assert not policy_model_cls.objects.filter(user=watcher, project=project).exists()
+
+    # Without permissions
+    users, live_users = services.get_users_to_notify_by_channel(issue)
+    assert users == {member1.user}
+    assert live_users == {member2.user}
+
+    # The missing notify policies are created
+    policy = policy_model_cls.objects.get(user=watcher, project=project)
+    assert policy.notify_level == NotifyLevel.involved
+    assert policy.live_notify_level == NotifyLevel.involved
+
+    project.public_permissions = ["view_issues"]
+    project.save()
+    users, live_users = services.get_users_to_notify_by_channel(issue, discard_users=[member2.user])
+    assert users == {member1.user, watcher}
+    assert live_users == {watcher}
+
+
 def test_watching_users_to_notify_on_issue_modification_1():
     # If:
     # - the user is watching the issue
@@ -347,6 +377,66 @@ def test_watching_users_to_notify_on_issue_modification_6():
     assert users == {issue.owner}
 
 
+def test_process_due_notifications(settings, mail):
+    settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL = 60
+
+    project = f.ProjectFactory.create()
+    role = f.RoleFactory.create(project=project, permissions=['view_us'])
+    member1 = f.MembershipFactory.create(project=project, role=role)
+    member2 = f.MembershipFactory.create(project=project, role=role)
+    us1 = f.UserStoryFactory.create(project=project, owner=member2.user)
+    us2 = f.UserStoryFactory.create(project=project, owner=member2.user)
+
+    for us in [us1, us2]:
+        take_snapshot(us, user=us.owner)
+        history = f.HistoryEntryFactory.create(project=project,
+                                               user={"pk": member1.user.id},
+                                               comment="test:change",
+                                               type=HistoryType.change,
+                                               key="userstories.userstory:{}".format(us.id),
+                                               is_hidden=False,
+                                               diff=[])
+        services.send_notifications(us, history=history)
+
+    models.HistoryChangeNotification.objects.filter(key="userstories.userstory:{}".format(us1.id)).update(
+        updated_datetime=timezone.now() - datetime.timedelta(seconds=120))
+
+    metrics = services.get_notifications_queue_metrics()
+    assert metrics["depth"] == 2
+    assert metrics["due"] == 1
+    assert metrics["oldest_age"] >= 0
+
+    assert services.process_due_notifications(batch_size=1) == 1
+    assert len(mail.outbox) == 1
+    assert models.HistoryChangeNotification.objects.get().key == "userstories.userstory:{}".format(us2.id)
+
+
+def test_process_due_notifications_does_not_count_the_failed_ones(settings):
+    settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL = 60
+
+    project = f.ProjectFactory.create()
+    role = f.RoleFactory.create(project=project, permissions=['view_us'])
+    member1 = f.MembershipFactory.create(project=project, role=role)
+    member2 = f.MembershipFactory.create(project=project, role=role)
+    us = f.UserStoryFactory.create(project=project, owner=member2.user)
+    take_snapshot(us, user=us.owner)
+    history = f.HistoryEntryFactory.create(project=project,
+                                           user={"pk": member1.user.id},
+                                           comment="test:change",
+                                           type=HistoryType.change,
+                                           key="userstories.userstory:{}".format(us.id),
+                                           is_hidden=False,
+                                           diff=[])
+    services.send_notifications(us, history=history)
+    models.HistoryChangeNotification.objects.update(updated_datetime=timezone.now() - datetime.timedelta(seconds=120))
+
+    with patch("taiga.projects.notifications.services._send_notification_emails") as send_mock:
+        send_mock.side_effect = Exception("SMTP error")
+        assert services.process_due_notifications() == 0
+
+    assert models.HistoryChangeNotification.objects.count() == 1
+
+
 def test_send_notifications_using_services_method_for_user_stories(settings, mail):
     settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL = 1
 
@@ -726,6 +816,39 @@ def test_send_notifications_using_services_method_for_wiki_pages(settings, mail)
         assert services.make_ms_thread_index(in_reply_to, msg_ts) == headers.get('Thread-Index')
 
 
+def test_send_notifications_renders_once_per_language(settings, mail):
+    settings.CHANGE_NOTIFICATIONS_MIN_INTERVAL = 0
+    project = f.ProjectFactory.create()
+    role = f.RoleFactory.create(project=project, permissions=['view_issues'])
+    member1 = f.MembershipFactory.create(project=project, role=role, user__lang="en",
+                                         user__full_name="Member <One>")
+    member2 = f.MembershipFactory.create(project=project, role=role, user__lang="en")
+    member3 = f.MembershipFactory.create(project=project, role=role, user__lang="es")
+    for member in [member1, member2, member3]:
+        project.add_watcher(member.user)
+
+    issue = f.IssueFactory.create(project=project, owner=project.owner)
+    take_snapshot(issue, user=issue.owner)
+    issue.subject = "new subject"
+    issue.save()
+    history = take_snapshot(issue, user=issue.owner)
+
+    with patch("taiga.base.mails.premailer.transform", side_effect=lambda html: html) as transform_mock:
+        services.send_notifications(issue, history=history)
+
+    assert transform_mock.call_count == 2
+    assert len(mail.outbox) == 3
+
+    emails = {email.to[0]: email for email in mail.outbox}
+    for member in [member1, member2, member3]:
+        email = emails[member.user.email]
+        assert member.user.get_full_name() in email.body
+        assert "taiga-recipient" not in email.body
+        assert "taiga-recipient" not in email.alternatives[0][0]
+
+    assert "Member &lt;One&gt;" in emails[member1.user.email].alternatives[0][0]
+
+
 def test_send_notifications_on_unassigned(client, mail):
     project = f.ProjectFactory.create()
     role = f.RoleFactory.create(project=project, permissions=['modify_issue', 'view_issues', 'view_us', 'view_tasks', 'view_wiki_pages'])
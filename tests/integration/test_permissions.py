@@ -19,6 +19,8 @@
 
 import pytest
 
+from unittest.mock import patch
+
 from taiga.permissions import services, choices
 from django.contrib.auth.models import AnonymousUser
 
@@ -132,3 +134,83 @@ def test_authenticated_user_has_perm_on_project_related_object():
 def test_authenticated_user_has_perm_on_invalid_object():
     user1 = factories.UserFactory()
     assert services.user_has_perm(user1, "test", user1) is False
+
+
+def test_get_user_projects_ids_with_permission():
+    user1 = factories.UserFactory()
+    project1 = factories.ProjectFactory()
+    project2 = factories.ProjectFactory()
+    project3 = factories.ProjectFactory()
+    role1 = factories.RoleFactory(project=project1, permissions=["view_us"])
+    role2 = factories.RoleFactory(project=project2, permissions=[])
+    role3 = factories.RoleFactory(project=project3, permissions=[])
+    membership1 = factories.MembershipFactory(user=user1, project=project1, role=role1)
+    factories.MembershipFactory(user=user1, project=project2, role=role2)
+    factories.MembershipFactory(user=user1, project=project3, role=role3, is_admin=True)
+
+    assert services.get_user_projects_ids_with_permission(AnonymousUser(), "view_us") == []
+    assert services.get_user_projects_ids_with_permission(user1, "view_us") == sorted([project1.id, project3.id])
+
+    role2.permissions = ["view_us"]
+    role2.save()
+    assert services.get_user_projects_ids_with_permission(user1, "view_us") == sorted([project1.id, project2.id,
+                                                                                        project3.id])
+
+    membership1.delete()
+    assert services.get_user_projects_ids_with_permission(user1, "view_us") == sorted([project2.id, project3.id])
+
+
+def test_calculate_permissions_returns_the_same_frozenset_for_the_same_permissions():
+    permissions1 = services.calculate_permissions(is_authenticated=True, is_member=True,
+                                                  role_permissions=["view_us", "view_tasks"],
+                                                  anon_permissions=["view_project"])
+    permissions2 = services.calculate_permissions(is_authenticated=True, is_member=True,
+                                                  role_permissions=["view_tasks", "view_us"],
+                                                  anon_permissions=["view_project"])
+
+    assert permissions1 == {"view_us", "view_tasks", "view_project"}
+    assert permissions1 is permissions2
+
+
+def test_get_user_permissions_for_projects():
+    user1 = factories.UserFactory()
+    project1 = factories.ProjectFactory(anon_permissions=["test1"], public_permissions=["test2"])
+    project2 = factories.ProjectFactory(anon_permissions=[], public_permissions=["test2"])
+    project3 = factories.ProjectFactory(anon_permissions=[], public_permissions=[])
+    role1 = factories.RoleFactory(project=project1, permissions=["test3"])
+    role2 = factories.RoleFactory(project=project2, permissions=[])
+    factories.MembershipFactory(user=user1, project=project1, role=role1)
+    factories.MembershipFactory(user=user1, project=project2, role=role2, is_admin=True)
+
+    permissions = services.get_user_permissions_for_projects(user1, [project1, project2, project3])
+    assert permissions[project1.id] == {"test1", "test2", "test3"}
+    assert permissions[project2.id] == set(["test2"] +
+                                           [x[0] for x in choices.ADMINS_PERMISSIONS] +
+                                           [x[0] for x in choices.MEMBERS_PERMISSIONS])
+    assert permissions[project3.id] == set()
+
+    permissions = services.get_user_permissions_for_projects(AnonymousUser(), [project1, project2])
+    assert permissions == {project1.id: {"test1"}, project2.id: set()}
+
+
+def test_get_user_permissions_for_projects_does_not_query_the_projects(django_assert_num_queries):
+    project = factories.ProjectFactory(anon_permissions=["test1"], public_permissions=["test2"])
+
+    with django_assert_num_queries(0):
+        permissions = services.get_user_permissions_for_projects(AnonymousUser(), [project])
+    assert permissions == {project.id: {"test1"}}
+
+
+def test_user_permissions_version_is_bumped_again_on_commit():
+    user = factories.UserFactory()
+    version = services._get_user_permissions_version(user.id)
+
+    with patch("taiga.permissions.services.transaction.on_commit") as on_commit_mock:
+        services.bump_user_permissions_version(user.id)
+        bumped_version = services._get_user_permissions_version(user.id)
+        assert bumped_version != version
+
+        # A request could cache the old memberships before the commit
+        assert on_commit_mock.call_count == 1
+        on_commit_mock.call_args[0][0]()
+        assert services._get_user_permissions_version(user.id) not in (version, bumped_version)
@@ -2057,6 +2057,29 @@ def test_delete_tag(client, settings):
     assert epic.tags == []
 
 
+def test_delete_tag_invalidates_the_filters_data(client):
+    user = f.UserFactory.create()
+    project = f.ProjectFactory.create(owner=user, tags_colors=[("tag1", "#123123")])
+    f.UserStoryFactory.create(project=project, tags=["tag1"])
+    f.MembershipFactory.create(project=project, user=user, is_admin=True)
+    client.login(user)
+
+    filters_data_url = reverse("userstories-filters-data") + "?project={}".format(project.id)
+    response = client.get(filters_data_url)
+    assert response.status_code == 200
+    assert [tag["count"] for tag in response.data["tags"] if tag["name"] == "tag1"] == [1]
+
+    response = client.json.post(reverse("projects-delete-tag", args=(project.id,)), json.dumps({"tag": "tag1"}))
+    assert response.status_code == 200
+
+    # The counters cached before the tag was removed from the items are not used
+    project.tags_colors = [("tag1", "#123123")]
+    project.save(update_fields=["tags_colors"])
+    response = client.get(filters_data_url)
+    assert response.status_code == 200
+    assert [tag["count"] for tag in response.data["tags"] if tag["name"] == "tag1"] == [0]
+
+
 def test_mix_tags(client, settings):
     user = f.UserFactory.create()
     project = f.ProjectFactory.create(owner=user, tags_colors=[("tag'1", "#123123"), ("tag2", "#123123"), ("tag3", "#123123")])
@@ -20,10 +20,13 @@
 import pytest
 
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from .. import factories as f
 
 from taiga.permissions.choices import MEMBERS_PERMISSIONS
+from taiga.searches import services
 from tests.utils import disconnect_signals, reconnect_signals
 
 
@@ -169,3 +172,45 @@ def test_search_text_query_with_an_invalid_project_id(client, searches_initial_d
 
     response = client.get(reverse("search-list"), {"project": "new", "text": "future"})
     assert response.status_code == 404
+
+
+def test_search_text_query_after_updating_the_objects(client, searches_initial_data):
+    data = searches_initial_data
+
+    client.login(data.member1.user)
+
+    # The search vectors are updated by the database on every change
+    data.us14.subject = "Changes in time travel"
+    data.us14.save()
+    type(data.wikipage11).objects.filter(id=data.wikipage11.id).update(content="Time travel")
+
+    response = client.get(reverse("search-list"), {"project": data.project1.id, "text": "travel"})
+    assert response.status_code == 200
+    assert [us["id"] for us in response.data["userstories"]] == [data.us14.id]
+    assert [wikipage["id"] for wikipage in response.data["wikipages"]] == [data.wikipage11.id]
+
+
+def test_search_text_query_in_all_my_projects(client, searches_initial_data):
+    data = searches_initial_data
+
+    client.login(data.member1.user)
+
+    response = client.get(reverse("search-list"), {"text": "future"})
+    assert response.status_code == 200
+    assert response.data["count"] == 12
+    assert [epic["id"] for epic in response.data["epics"]] == [data.epic11.id, data.epic12.id, data.epic14.id]
+    assert [us["id"] for us in response.data["userstories"]] == [data.us11.id, data.us13.id, data.us12.id]
+    assert [task["id"] for task in response.data["tasks"]] == [data.task11.id, data.task12.id, data.task14.id]
+    assert [issue["id"] for issue in response.data["issues"]] == [data.issue14.id, data.issue12.id, data.issue11.id]
+    assert response.data["wikipages"] == []
+    assert all(epic["project"] == data.project1.id for epic in response.data["epics"])
+
+
+def test_search_is_a_single_query(client, searches_initial_data):
+    data = searches_initial_data
+
+    with CaptureQueriesContext(connection) as captured:
+        results = services.search(data.member1.user, "future", project=data.project1)
+
+    assert len([query for query in captured if "UNION ALL" in query["sql"]]) == 1
+    assert len(results["epics"]) == 3
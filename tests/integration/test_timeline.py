@@ -18,15 +18,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import pytz
+import queue
 
 from datetime import datetime, timedelta
+from unittest.mock import patch
 import pytest
 
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
 from .. import factories
 
 from taiga.projects.history import services as history_services
+from taiga.projects.history.models import HistoryEntry
+from taiga.timeline import rebuilder
 from taiga.timeline import service
-from taiga.timeline.models import Timeline
+from taiga.timeline.models import Timeline, TimelineRebuildCheckpoint
 from taiga.timeline.serializers import TimelineSerializer
 
 
@@ -134,6 +143,29 @@ def test_filter_timeline_private_project_member_permissions():
     assert timeline.count() == 3
 
 
+def test_filter_timeline_private_project_member_permissions_changed():
+    Timeline.objects.all().delete()
+    user1 = factories.UserFactory()
+    user2 = factories.UserFactory()
+    project = factories.ProjectFactory.create(is_private=True)
+    membership = factories.MembershipFactory.create(user=user2, project=project)
+    membership.role.permissions = []
+    membership.role.save()
+    task = factories.TaskFactory.create(project=project)
+
+    service.register_timeline_implementation("tasks.task", "test", lambda x, extra_data=None: id(x))
+    service._add_to_object_timeline(user1, task, "test", task.created_date)
+    timeline = Timeline.objects.exclude(event_type="users.user.create")
+    assert service.filter_timeline_for_user(timeline, user2).count() == 0
+
+    membership.role.permissions = ["view_tasks"]
+    membership.role.save()
+    assert service.filter_timeline_for_user(timeline, user2).count() == 2
+
+    membership.delete()
+    assert service.filter_timeline_for_user(timeline, user2).count() == 0
+
+
 def test_filter_timeline_private_project_member_admin():
     Timeline.objects.all().delete()
     user1 = factories.UserFactory()
@@ -573,3 +605,185 @@ def test_timeline_error_use_member_ids_instead_of_memberships_ids():
     external_user_timeline = service.get_profile_timeline(external_user)
     assert len(external_user_timeline) == 1
     assert external_user_timeline[0].event_type == "users.user.create"
+
+
+def test_push_to_timelines_queries_do_not_depend_on_the_number_of_watchers():
+    def count_push_queries(watchers):
+        user_story = factories.UserStoryFactory.create()
+        for i in range(watchers):
+            user_story.add_watcher(factories.UserFactory.create())
+
+        with CaptureQueriesContext(connection) as captured:
+            service.push_to_timelines(user_story.project.id, user_story.owner.id, "userstories", "userstory",
+                                      user_story.id, "create", user_story.created_date, refresh_totals=False)
+
+        assert Timeline.objects.filter(namespace=service.build_user_namespace(user_story.owner),
+                                       data_content_type__model="userstory",
+                                       object_id__in=[u.id for u in user_story.get_related_people()]
+                                       ).count() == watchers + 1
+        return len(captured)
+
+    assert count_push_queries(1) == count_push_queries(10)
+
+
+def test_push_to_timelines_creates_all_the_entries_with_one_bulk_create():
+    user_story = factories.UserStoryFactory.create()
+    user_story.add_watcher(factories.UserFactory.create())
+
+    with patch("taiga.timeline.service._bulk_create_timeline_entries") as bulk_create_mock:
+        service.push_to_timelines(user_story.project.id, user_story.owner.id, "userstories", "userstory",
+                                  user_story.id, "create", user_story.created_date, refresh_totals=False)
+
+    assert bulk_create_mock.call_count == 1
+    entries = bulk_create_mock.call_args[0][0]
+    assert [entry.namespace for entry in entries].count(service.build_project_namespace(user_story.project)) == 1
+    assert len(entries) == len(user_story.get_related_people()) + 1
+
+
+def test_history_entries_values_diff_is_pushed_to_timelines_out_of_the_request(settings):
+    settings.CELERY_ENABLED = True
+    issue = factories.IssueFactory.create(subject="old subject")
+    history_services.take_snapshot(issue, user=issue.owner)
+    issue.subject = "new subject"
+    issue.save()
+    entry = history_services.take_snapshot(issue, user=issue.owner)
+
+    # Nothing is computed until the transaction is committed
+    assert HistoryEntry.objects.get(id=entry.id).values_diff_cache is None
+    assert not Timeline.objects.filter(event_type="issues.issue.change").exists()
+
+    service.push_history_entries_to_timelines([entry.id])
+
+    assert HistoryEntry.objects.get(id=entry.id).values_diff_cache == {"subject": ["old subject", "new subject"]}
+    timeline = Timeline.objects.get(namespace=service.build_project_namespace(issue.project),
+                                    event_type="issues.issue.change")
+    assert timeline.data["values_diff"] == {"subject": ["old subject", "new subject"]}
+
+
+def test_delete_entries_are_pushed_to_timelines_before_the_object_is_deleted(settings):
+    settings.CELERY_ENABLED = True
+    user_story = factories.UserStoryFactory.create(subject="test us timeline")
+    history_services.take_snapshot(user_story, user=user_story.owner, delete=True)
+    user_story.delete()
+
+    project_timeline = service.get_project_timeline(user_story.project)
+    assert project_timeline[0].event_type == "userstories.userstory.delete"
+    assert project_timeline[0].data["userstory"]["subject"] == "test us timeline"
+
+
+def test_timeline_visibility_is_invalidated_when_a_role_is_deleted():
+    project = factories.ProjectFactory.create(is_private=True)
+    role = factories.RoleFactory.create(project=project, permissions=["view_us"])
+    restricted_role = factories.RoleFactory.create(project=project, permissions=[])
+    membership = factories.MembershipFactory.create(project=project, role=role, is_admin=False)
+    user = membership.user
+
+    visibility = service.get_timeline_visibility_for_user(user)
+    assert len(visibility["content_type_ids"]) == 2
+
+    # Like RolesViewSet.pre_delete, the memberships are moved without signals
+    role.memberships.update(role=restricted_role)
+    role.delete()
+
+    visibility = service.get_timeline_visibility_for_user(user)
+    assert len(visibility["content_type_ids"]) == 1
+
+
+def test_rebuild_project_timeline_resumes_from_checkpoint():
+    user_story = factories.UserStoryFactory.create()
+    project = user_story.project
+    for i in range(3):
+        user_story.subject = "subject {}".format(i)
+        user_story.save()
+        history_services.take_snapshot(user_story, user=user_story.owner)
+
+    history_entries = list(HistoryEntry.objects.filter(project=project).order_by("created_at", "id"))
+    assert len(history_entries) == 3
+
+    assert rebuilder.rebuild_project_timeline(project.id, page_size=2) == 3
+    timeline_count = Timeline.objects.filter(project=project).count()
+    checkpoint = TimelineRebuildCheckpoint.objects.get(project=project)
+    assert checkpoint.finished
+    assert checkpoint.total_history_entries == 3
+
+    # Interrupted after the first page
+    checkpoint.finished = False
+    checkpoint.last_history_entry_created_at = history_entries[1].created_at
+    checkpoint.last_history_entry_id = history_entries[1].id
+    checkpoint.save()
+    Timeline.objects.filter(project=project, created=history_entries[2].created_at).delete()
+
+    assert rebuilder.rebuild_project_timeline(project.id, page_size=2) == 1
+    assert Timeline.objects.filter(project=project).count() == timeline_count
+
+
+def test_rebuild_project_timeline_pushes_every_page_at_once():
+    user_story = factories.UserStoryFactory.create()
+    project = user_story.project
+    for i in range(3):
+        user_story.subject = "subject {}".format(i)
+        user_story.save()
+        history_services.take_snapshot(user_story, user=user_story.owner)
+
+    with patch("taiga.timeline.rebuilder.push_loaded_history_entries_to_timelines") as push_mock:
+        assert rebuilder.rebuild_project_timeline(project.id, page_size=2) == 3
+
+    assert [len(call[0][0]) for call in push_mock.call_args_list] == [2, 1]
+
+
+def test_rebuild_project_timeline_worker_reports_the_progress_of_every_page():
+    user_story = factories.UserStoryFactory.create()
+    project = user_story.project
+    for i in range(3):
+        user_story.subject = "subject {}".format(i)
+        user_story.save()
+        history_services.take_snapshot(user_story, user=user_story.owner)
+
+    progress_queue = queue.Queue()
+    assert rebuilder._rebuild_project_timeline_worker((project.id, 2, progress_queue))[:2] == (project.id, 3)
+
+    progress = []
+    while not progress_queue.empty():
+        progress.append(progress_queue.get()[:2])
+    assert progress == [(project.id, 2), (project.id, 3)]
+
+
+def test_project_timeline_cursor_pagination(client):
+    project = factories.ProjectFactory.create(is_private=False)
+    factories.MembershipFactory.create(project=project, user=project.owner, is_admin=True)
+    Timeline.objects.filter(project=project).delete()
+    now = timezone.now()
+
+    service.register_timeline_implementation("projects.project", "test", lambda x, extra_data=None: {})
+    for i in range(5):
+        service._add_to_object_timeline(project, project, "test", now - timedelta(minutes=i),
+                                        namespace=service.build_project_namespace(project))
+
+    client.login(project.owner)
+    url = reverse("project-timeline-detail", kwargs={"pk": project.pk})
+
+    response = client.get(url, {"page_size": 2}, HTTP_X_CURSOR_PAGINATION="true")
+    assert response.status_code == 200
+    ids = [entry["id"] for entry in response.data]
+    assert len(ids) == 2
+
+    # New entries don't shift the next pages
+    service._add_to_object_timeline(project, project, "test", now + timedelta(minutes=1),
+                                    namespace=service.build_project_namespace(project))
+
+    while "x-pagination-next-cursor" in response:
+        response = client.get(url, {"page_size": 2, "cursor": response["x-pagination-next-cursor"]})
+        assert response.status_code == 200
+        ids += [entry["id"] for entry in response.data]
+
+    expected = Timeline.objects.filter(namespace=service.build_project_namespace(project),
+                                       created__lte=now).order_by("-created", "-id")
+    assert ids == [entry.id for entry in expected]
+
+
+def test_project_timeline_invalid_cursor(client):
+    project = factories.ProjectFactory.create(is_private=False)
+    url = reverse("project-timeline-detail", kwargs={"pk": project.pk})
+
+    response = client.get(url, {"cursor": "invalid"})
+    assert response.status_code == 400
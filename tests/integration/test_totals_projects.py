@@ -23,9 +23,15 @@ import datetime
 
 from .. import factories as f
 
+from taiga.projects.choices import TOTALS_KIND_ACTIVITY
 from taiga.projects.history.choices import HistoryType
-from taiga.projects.models import Project
+from taiga.projects.models import Project, ProjectTotalsBucket
+from taiga.projects.services.totals import increment_project_totals
+from taiga.projects.services.totals import rebuild_project_totals
+from taiga.projects.services.totals import roll_projects_totals_windows
+from taiga.timeline.models import Timeline
 
+from django.contrib.contenttypes.models import ContentType
 from django.core.urlresolvers import reverse
 from django.utils import timezone
 
@@ -160,3 +166,69 @@ def test_project_totals_updated_on_like(client):
     assert project.total_fans_last_month == 2
     assert project.total_fans_last_year == 3
     assert project.totals_updated_datetime > totals_updated_datetime
+
+
+def test_project_totals_windows_rolled_by_periodic_task():
+    project = f.create_project()
+    now = timezone.now()
+
+    for days in [0, 5, 25]:
+        increment_project_totals(project.id, TOTALS_KIND_ACTIVITY, now - datetime.timedelta(days=days))
+    project.refresh_totals()
+
+    project = Project.objects.get(id=project.id)
+    assert project.total_activity == 3
+    assert project.total_activity_last_week == 2
+    assert project.total_activity_last_month == 3
+
+    # Ten days later
+    for bucket in ProjectTotalsBucket.objects.filter(project=project):
+        bucket.day = bucket.day - datetime.timedelta(days=10)
+        bucket.save()
+    roll_projects_totals_windows()
+
+    project = Project.objects.get(id=project.id)
+    assert project.total_activity == 3
+    assert project.total_activity_last_week == 0
+    assert project.total_activity_last_month == 2
+    assert project.total_activity_last_year == 3
+
+
+def test_project_totals_windows_rolled_after_a_long_inactivity():
+    project = f.create_project()
+    now = timezone.now()
+
+    increment_project_totals(project.id, TOTALS_KIND_ACTIVITY, now)
+    project.refresh_totals()
+
+    # Two years later, without any execution of the periodic task
+    for bucket in ProjectTotalsBucket.objects.filter(project=project):
+        bucket.day = bucket.day - datetime.timedelta(days=730)
+        bucket.save()
+    roll_projects_totals_windows()
+
+    project = Project.objects.get(id=project.id)
+    assert project.total_activity == 1
+    assert project.total_activity_last_week == 0
+    assert project.total_activity_last_month == 0
+    assert project.total_activity_last_year == 0
+
+
+def test_rebuild_project_totals():
+    project = f.create_project()
+    now = timezone.now()
+    f.LikeFactory.create(content_object=project)
+    Timeline.objects.create(content_object=project, namespace="project:{}".format(project.id),
+                            event_type="projects.project.change", project=project, data={},
+                            data_content_type=ContentType.objects.get_for_model(project),
+                            created=now - datetime.timedelta(days=40))
+    ProjectTotalsBucket.objects.filter(project=project).delete()
+
+    rebuild_project_totals(project)
+
+    project = Project.objects.get(id=project.id)
+    assert project.total_fans == 1
+    assert project.total_fans_last_week == 1
+    assert project.total_activity == 1
+    assert project.total_activity_last_month == 0
+    assert project.total_activity_last_year == 1
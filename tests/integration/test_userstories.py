@@ -26,6 +26,8 @@ from urllib.parse import quote
 
 from unittest import mock
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from taiga.base.utils import json
 from taiga.permissions.choices import MEMBERS_PERMISSIONS, ANON_PERMISSIONS
@@ -776,6 +778,58 @@ def test_api_filter_by_milestone__estimated_start_and_end(client, field_name):
             assert response.data[0]["subject"] == userstory.subject
 
 
+def test_api_filter_by_custom_attributes(client):
+    project = f.ProjectFactory.create()
+    user = f.UserFactory(is_superuser=True)
+    f.MembershipFactory.create(user=user, project=project)
+    text_attr = f.UserStoryCustomAttributeFactory.create(project=project, type="text")
+    date_attr = f.UserStoryCustomAttributeFactory.create(project=project, type="date")
+
+    userstory1 = f.UserStoryFactory.create(project=project)
+    userstory1.custom_attributes_values.attributes_values = {str(text_attr.id): "Red 10",
+                                                             str(date_attr.id): "2017-03-01"}
+    userstory1.custom_attributes_values.save()
+    userstory2 = f.UserStoryFactory.create(project=project)
+    userstory2.custom_attributes_values.attributes_values = {str(text_attr.id): "20",
+                                                             str(date_attr.id): "2017-05-01"}
+    userstory2.custom_attributes_values.save()
+    f.UserStoryFactory.create(project=project)
+
+    client.login(user)
+
+    expections = {
+        "custom_attribute_{}=20".format(text_attr.id): [userstory2.id],
+        "custom_attribute_{}__contains=red".format(text_attr.id): [userstory1.id],
+        "custom_attribute_{}__gte=15".format(text_attr.id): [userstory2.id],
+        "custom_attribute_{}__lt=2017-04-01".format(date_attr.id): [userstory1.id],
+        "custom_attribute_{}__gte=2017-03-01".format(date_attr.id): [userstory1.id, userstory2.id],
+    }
+
+    for param, expection in expections.items():
+        url = reverse("userstories-list") + "?project={}&{}".format(project.id, param)
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert sorted(us["id"] for us in response.data) == expection, param
+
+    url = reverse("userstories-list") + "?custom_attribute_{}__gte=abc".format(text_attr.id)
+    response = client.get(url)
+    assert response.status_code == 400
+
+    url = reverse("userstories-filters-data") + "?project={}".format(project.id)
+    response = client.get(url)
+    assert response.status_code == 200
+    text_attr_data = next(filter(lambda i: i["id"] == text_attr.id, response.data["custom_attributes"]))
+    assert text_attr_data["values"] == [{"value": "20", "count": 1}, {"value": "Red 10", "count": 1}]
+
+    # The custom attributes facet is not counted with its own filter
+    url = reverse("userstories-filters-data") + "?project={}&custom_attribute_{}=20".format(project.id, text_attr.id)
+    response = client.get(url)
+    assert response.status_code == 200
+    text_attr_data = next(filter(lambda i: i["id"] == text_attr.id, response.data["custom_attributes"]))
+    assert text_attr_data["values"] == [{"value": "20", "count": 1}, {"value": "Red 10", "count": 1}]
+
+
 def test_api_filters_data(client):
     project = f.ProjectFactory.create()
     user1 = f.UserFactory.create(is_superuser=True)
@@ -1093,6 +1147,41 @@ def test_api_filters_data_roles_with_assigned_users(client):
                        response.data["roles"]))["count"] == 1
 
 
+def test_api_filters_data_is_cached_until_the_project_changes(client):
+    project = f.ProjectFactory.create()
+    user1 = f.UserFactory.create(is_superuser=True)
+    f.MembershipFactory.create(user=user1, project=project)
+    user2 = f.UserFactory.create(is_superuser=True)
+    f.MembershipFactory.create(user=user2, project=project)
+
+    status = f.UserStoryStatusFactory.create(project=project)
+    us = f.UserStoryFactory.create(project=project, status=status, assigned_to=None)
+
+    url = reverse("userstories-filters-data") + "?project={}".format(project.id)
+
+    client.login(user1)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert next(filter(lambda i: i['id'] == status.id, response.data["statuses"]))["count"] == 1
+
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert not any('"facet_rows"' in query["sql"] for query in captured.captured_queries)
+    assert next(filter(lambda i: i['id'] == status.id, response.data["statuses"]))["count"] == 1
+
+    f.UserStoryFactory.create(project=project, status=status, assigned_to=None)
+    response = client.get(url)
+    assert next(filter(lambda i: i['id'] == status.id, response.data["statuses"]))["count"] == 2
+    assert next(filter(lambda i: i['id'] is None, response.data["assigned_users"]))["count"] == 2
+
+    us.assigned_users.add(user2)
+    response = client.get(url)
+    assert next(filter(lambda i: i['id'] is None, response.data["assigned_users"]))["count"] == 1
+    assert next(filter(lambda i: i['id'] == user2.id, response.data["assigned_users"]))["count"] == 1
+
+
 def test_get_invalid_csv(client):
     url = reverse("userstories-csv")
 
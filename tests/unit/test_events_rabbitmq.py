@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014-2017 Andrey Antukh <niwi@niwi.nz>
+# Copyright (C) 2014-2017 Jesús Espino <jespinog@gmail.com>
+# Copyright (C) 2014-2017 David Barragán <bameda@dbarragan.com>
+# Copyright (C) 2014-2017 Alejandro Alonso <alejandro.alonso@kaleidos.net>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import pytest
+
+from taiga.base.utils import json
+from taiga.events.backends.base import get_multicast_messages
+from taiga.events.backends.rabbitmq import AmqpPublisher, ReconnectBackoffError
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.declared = []
+        self.published = []
+
+    def exchange_declare(self, exchange, **kwargs):
+        self.declared.append(exchange)
+
+    def basic_publish(self, message, routing_key, exchange):
+        if self.connection.broken:
+            raise IOError("Broken pipe")
+        self.published.append((routing_key, exchange))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    instances = []
+    refuse = False
+
+    def __init__(self, url, **kwargs):
+        self.kwargs = kwargs
+        self.broken = False
+        self.closed = False
+        self.channels = []
+        FakeConnection.instances.append(self)
+
+    def connect(self):
+        if FakeConnection.refuse:
+            raise ConnectionRefusedError()
+
+    def channel(self):
+        channel = FakeChannel(self)
+        self.channels.append(channel)
+        return channel
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def publisher():
+    FakeConnection.instances = []
+    FakeConnection.refuse = False
+    return AmqpPublisher("//guest:guest@localhost/", connection_factory=FakeConnection)
+
+
+def test_publisher_reuses_connection_and_exchange_declaration(publisher):
+    for i in range(10):
+        publisher.publish("{}", routing_key="changes.project.1.userstories", exchange="events")
+
+    assert len(FakeConnection.instances) == 1
+    connection = FakeConnection.instances[0]
+    assert connection.kwargs == {"confirm_publish": True}
+    assert connection.channels[0].declared == ["events"]
+    assert len(connection.channels[0].published) == 10
+
+
+def test_publisher_reconnects_on_broken_connection(publisher):
+    publisher.publish("{}", routing_key="changes.project.1.tasks", exchange="events")
+    FakeConnection.instances[0].broken = True
+
+    publisher.publish("{}", routing_key="changes.project.1.tasks", exchange="events")
+
+    assert len(FakeConnection.instances) == 2
+    assert FakeConnection.instances[0].closed
+    assert FakeConnection.instances[1].channels[0].declared == ["events"]
+    assert len(FakeConnection.instances[1].channels[0].published) == 1
+
+
+def test_publisher_backoff_after_connection_refused(publisher):
+    FakeConnection.refuse = True
+    with pytest.raises(ConnectionRefusedError):
+        publisher.publish("{}", routing_key="changes.project.1.issues", exchange="events")
+
+    FakeConnection.refuse = False
+    with pytest.raises(ReconnectBackoffError):
+        publisher.publish("{}", routing_key="changes.project.1.issues", exchange="events")
+
+    assert len(FakeConnection.instances) == 1
+
+
+def test_publisher_publishes_many_messages_with_one_channel(publisher):
+    messages = [("live_notifications.{}".format(user_id), "{}") for user_id in range(5)]
+    publisher.publish_many(messages, exchange="events")
+
+    assert len(FakeConnection.instances) == 1
+    channel = FakeConnection.instances[0].channels[0]
+    assert channel.published == [(routing_key, "events") for routing_key, message in messages]
+
+
+def test_multicast_messages_split_per_recipient(settings):
+    settings.EVENTS_PUSH_MULTICAST = False
+    messages = get_multicast_messages({"data": {"title": "test"}}, routing_key="live_notifications",
+                                      recipients=[1, 2])
+
+    assert [routing_key for routing_key, message in messages] == ["live_notifications.1", "live_notifications.2"]
+    assert json.loads(messages[0][1]) == {"data": {"title": "test"}}
+
+
+def test_multicast_messages_with_recipients_list(settings):
+    settings.EVENTS_PUSH_MULTICAST = True
+    settings.EVENTS_PUSH_MAX_MESSAGE_SIZE = 100
+    recipients = list(range(1000, 1030))
+    messages = get_multicast_messages({"data": {"title": "test"}}, routing_key="live_notifications",
+                                      recipients=recipients)
+
+    assert len(messages) > 1
+    assert all(routing_key == "live_notifications.multicast" for routing_key, message in messages)
+    assert all(len(message) <= 100 for routing_key, message in messages)
+    assert sum([json.loads(message)["recipients"] for routing_key, message in messages], []) == recipients
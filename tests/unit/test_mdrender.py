@@ -17,10 +17,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
+
 from unittest.mock import patch, MagicMock
 
 from taiga.mdrender.extensions import emojify
-from taiga.mdrender.service import render, cache_by_sha, get_diff_of_htmls, render_and_extract
+from taiga.mdrender.service import render, render_many, cache_by_sha, get_diff_of_htmls, render_and_extract, _LocalCache
 
 from datetime import datetime
 import pytz
@@ -41,86 +43,93 @@ def test_proccessor_invalid_emoji():
 
 
 def test_mentions_valid_username():
-    with patch("taiga.mdrender.extensions.mentions.get_user_model") as get_user_model_mock:
+    with patch("taiga.mdrender.service.get_user_model") as get_user_model_mock:
         dummy_uuser = MagicMock()
+        dummy_uuser.username = "hermione"
         dummy_uuser.get_full_name.return_value = "Hermione Granger"
-        get_user_model_mock.return_value.objects.get = MagicMock(return_value=dummy_uuser)
+        get_user_model_mock.return_value.objects.filter = MagicMock(return_value=[dummy_uuser])
 
         result = render(dummy_project, "text @hermione text")
 
-        get_user_model_mock.return_value.objects.get.assert_called_with(username="hermione")
+        get_user_model_mock.return_value.objects.filter.assert_called_with(username__in={"hermione"})
         assert result == ('<p>text <a class="mention" href="http://localhost:9001/profile/hermione" '
                           'title="Hermione Granger">@hermione</a> text</p>')
 
 
 def test_mentions_valid_username_with_points():
-    with patch("taiga.mdrender.extensions.mentions.get_user_model") as get_user_model_mock:
+    with patch("taiga.mdrender.service.get_user_model") as get_user_model_mock:
         dummy_uuser = MagicMock()
+        dummy_uuser.username = "luna.lovegood"
         dummy_uuser.get_full_name.return_value = "Luna Lovegood"
-        get_user_model_mock.return_value.objects.get = MagicMock(return_value=dummy_uuser)
+        get_user_model_mock.return_value.objects.filter = MagicMock(return_value=[dummy_uuser])
 
         result = render(dummy_project, "text @luna.lovegood text")
 
-        get_user_model_mock.return_value.objects.get.assert_called_with(username="luna.lovegood")
+        get_user_model_mock.return_value.objects.filter.assert_called_with(username__in={"luna.lovegood"})
         assert result == ('<p>text <a class="mention" href="http://localhost:9001/profile/luna.lovegood" '
                           'title="Luna Lovegood">@luna.lovegood</a> text</p>')
 
 
 def test_mentions_valid_username_with_dash():
-    with patch("taiga.mdrender.extensions.mentions.get_user_model") as get_user_model_mock:
+    with patch("taiga.mdrender.service.get_user_model") as get_user_model_mock:
         dummy_uuser = MagicMock()
+        dummy_uuser.username = "super-ginny"
         dummy_uuser.get_full_name.return_value = "Ginny Weasley"
-        get_user_model_mock.return_value.objects.get = MagicMock(return_value=dummy_uuser)
+        get_user_model_mock.return_value.objects.filter = MagicMock(return_value=[dummy_uuser])
 
         result = render(dummy_project, "text @super-ginny text")
 
-        get_user_model_mock.return_value.objects.get.assert_called_with(username="super-ginny")
+        get_user_model_mock.return_value.objects.filter.assert_called_with(username__in={"super-ginny"})
         assert result == ('<p>text <a class="mention" href="http://localhost:9001/profile/super-ginny" '
                           'title="Ginny Weasley">@super-ginny</a> text</p>')
 
 
 def test_proccessor_valid_us_reference():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        instance = mock.return_value
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        instance = MagicMock()
         instance.content_type.model = "userstory"
         instance.content_object.subject = "test"
+        mock.return_value = {1: instance}
         result = render(dummy_project, "**#1**")
         expected_result = '<p><strong><a class="reference user-story" href="http://localhost:9001/project/test/us/1" title="#1 test">#1</a></strong></p>'
         assert result == expected_result
 
 
 def test_proccessor_valid_issue_reference():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        instance = mock.return_value
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        instance = MagicMock()
         instance.content_type.model = "issue"
         instance.content_object.subject = "test"
+        mock.return_value = {2: instance}
         result = render(dummy_project, "**#2**")
         expected_result = '<p><strong><a class="reference issue" href="http://localhost:9001/project/test/issue/2" title="#2 test">#2</a></strong></p>'
         assert result == expected_result
 
 
 def test_proccessor_valid_task_reference():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        instance = mock.return_value
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        instance = MagicMock()
         instance.content_type.model = "task"
         instance.content_object.subject = "test"
+        mock.return_value = {3: instance}
         result = render(dummy_project, "**#3**")
         expected_result = '<p><strong><a class="reference task" href="http://localhost:9001/project/test/task/3" title="#3 test">#3</a></strong></p>'
         assert result == expected_result
 
 
 def test_proccessor_invalid_type_reference():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        instance = mock.return_value
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        instance = MagicMock()
         instance.content_type.model = "other"
         instance.content_object.subject = "test"
+        mock.return_value = {4: instance}
         result = render(dummy_project, "**#4**")
         assert result == "<p><strong>#4</strong></p>"
 
 
 def test_proccessor_invalid_reference():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        mock.return_value = None
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        mock.return_value = {}
         result = render(dummy_project, "**#5**")
         assert result == "<p><strong>#5</strong></p>"
 
@@ -180,6 +189,33 @@ def test_render_reference_links():
     assert render(dummy_project, source) == expected_result
 
 
+def test_render_reuses_markdown_instances_between_projects():
+    other_project = MagicMock()
+    other_project.id = 2
+    other_project.slug = "other"
+
+    (result, _) = render_and_extract(dummy_project, "[[test]] [example][id]\n  [id]: http://example.com/")
+    assert "http://localhost:9001/project/test/wiki/test" in result
+    assert "http://example.com/" in result
+
+    # Neither the project nor the reference links of the previous text are kept
+    (result, _) = render_and_extract(other_project, "[[test]] [example][id]")
+    assert "http://localhost:9001/project/other/wiki/test" in result
+    assert "http://example.com/" not in result
+
+
+def test_render_does_not_keep_abbreviations_between_projects():
+    other_project = MagicMock()
+    other_project.id = 2
+    other_project.slug = "other"
+
+    result = render(dummy_project, "The HTML spec\n\n*[HTML]: Hyper Text Markup Language")
+    assert "<abbr title=\"Hyper Text Markup Language\">HTML</abbr>" in result
+
+    result = render(other_project, "The HTML spec")
+    assert result == "<p>The HTML spec</p>"
+
+
 def test_render_url_autolinks():
     expected_result = "<p>Test the <a href=\"http://example.com/\" target=\"_blank\">http://example.com/</a> autolink</p>"
     source = "Test the http://example.com/ autolink"
@@ -230,6 +266,72 @@ def test_cache_by_sha():
     assert result1 == result3
 
 
+def test_render_many_renders_identical_texts_once():
+    texts = ["**many 1**", "**many 2**", "**many 1**"]
+    with patch("taiga.mdrender.service._render_text") as render_text_mock, \
+            patch("taiga.mdrender.service._get_mentioned_users") as mentioned_users_mock, \
+            patch("taiga.mdrender.service._get_referenced_objects") as referenced_objects_mock:
+        render_text_mock.side_effect = lambda project, text, *args: text.upper()
+        mentioned_users_mock.return_value = {}
+        referenced_objects_mock.return_value = {}
+
+        assert render_many(dummy_project, texts) == ["**MANY 1**", "**MANY 2**", "**MANY 1**"]
+        assert render_text_mock.call_count == 2
+        # The mentions and references of the batch are resolved at once
+        assert mentioned_users_mock.call_count == 1
+        assert referenced_objects_mock.call_count == 1
+
+
+def test_render_many_with_a_pool_of_processes(settings):
+    settings.MDRENDER_PROCESS_POOL_THRESHOLD = 2
+    texts = ["*pool {}*".format(i) for i in range(10)]
+    assert render_many(dummy_project, texts) == ["<p><em>pool {}</em></p>".format(i) for i in range(10)]
+
+
+def test_render_many_from_a_daemonic_process(settings):
+    settings.MDRENDER_PROCESS_POOL_THRESHOLD = 2
+    texts = ["*daemon {}*".format(i) for i in range(10)]
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def _render_many():
+        try:
+            results.put(render_many(dummy_project, texts))
+        except Exception as e:
+            results.put(repr(e))
+
+    process = context.Process(target=_render_many, daemon=True)
+    process.start()
+    result = results.get(timeout=30)
+    process.join()
+
+    assert result == ["<p><em>daemon {}</em></p>".format(i) for i in range(10)]
+
+
+def test_local_cache_evicts_least_recently_used_entries():
+    local_cache = _LocalCache(max_size=2, timeout=60)
+    local_cache.set("a", 1)
+    local_cache.set("b", 2)
+    assert local_cache.get("a") == 1
+
+    local_cache.set("c", 3)
+    assert local_cache.get("a") == 1
+    assert local_cache.get("b") is None
+    assert local_cache.get("c") == 3
+
+
+def test_local_cache_expires_entries():
+    local_cache = _LocalCache(max_size=2, timeout=60)
+    with patch("taiga.mdrender.service.time.monotonic") as monotonic_mock:
+        monotonic_mock.return_value = 100
+        local_cache.set("a", 1)
+        assert local_cache.get("a") == 1
+
+        monotonic_mock.return_value = 161
+        assert local_cache.get("a") is None
+
+
 def test_get_diff_of_htmls_insertions():
     result = get_diff_of_htmls("", "<p>test</p>")
     assert result == "<ins style=\"background:#e6ffe6;\">&lt;p&gt;test&lt;/p&gt;</ins>"
@@ -246,9 +348,10 @@ def test_get_diff_of_htmls_modifications():
 
 
 def test_render_and_extract_references():
-    with patch("taiga.mdrender.extensions.references.get_instance_by_ref") as mock:
-        instance = mock.return_value
+    with patch("taiga.mdrender.service._get_referenced_objects") as mock:
+        instance = MagicMock()
         instance.content_type.model = "issue"
         instance.content_object.subject = "test"
+        mock.return_value = {1: instance}
         (_, extracted) = render_and_extract(dummy_project, "**#1**")
         assert extracted['references'] == [instance.content_object]